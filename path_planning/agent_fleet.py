@@ -0,0 +1,288 @@
+from agent import *
+
+#================================================
+# DIRECTIONS
+
+# Direction symbols and their vectors (as in `Agent.direction_vectors`), indexed alike; index 4 stands for "no move":
+DIRECTION_SYMBOLS = ['w', 'a', 's', 'd']
+DIRECTION_ARRAY = np.array([(1, 0), (0, -1), (-1, 0), (0, 1), (0, 0)], dtype=np.int64)
+NO_MOVE = len(DIRECTION_SYMBOLS)
+
+def get_direction_indices(direction_symbols) -> np.ndarray:
+    '''
+    Converts direction symbols to indices into `DIRECTION_ARRAY`; unknown
+    symbols (as with `Agent.move`) mean no move.
+
+    ---
+
+    PARAMETERS:
+    - `direction_symbols` (str | list[str] | np.ndarray): 1 symbol, a sequence of symbols, or a string with 1 symbol per agent
+
+    RETURNS:
+    - (np.ndarray): Direction indices (0-dimensional for a single symbol)
+    '''
+
+    symbols = np.asarray(list(direction_symbols) if isinstance(direction_symbols, str) and len(direction_symbols) != 1 else direction_symbols, dtype="<U1")
+    indices = np.full(symbols.shape, NO_MOVE, dtype=np.int64)
+    for index, symbol in enumerate(DIRECTION_SYMBOLS):
+        indices[symbols == symbol] = index
+    return indices
+
+#================================================
+# MAIN: Structure-of-arrays agent fleet
+
+class AgentFleet:
+    '''
+    A fleet of basic unintelligent agents, stored as a structure of
+    arrays: row `i` of each array is agent `i`. Agents are moved all at
+    once by `move`, and `fleet[i]` (or `get_agents()`) gives `Agent`-like
+    views for the existing planners; since it is indexable and iterable
+    like a list of agents, a fleet can be given as is to
+    `MultiAgentManager`.
+
+    ---
+
+    PARAMETERS:
+    - `num_agents` (int): Number of agents
+    - `horizontal_movement_limit` (int | np.ndarray): Number of columns each agent may move within (1 for all agents, or 1 per agent)
+    - `vertical_movement_limit` (int | np.ndarray): Number of rows each agent may move within (likewise)
+    - `positions` (np.ndarray, optional): Start positions, of shape (`num_agents`, 2); defaults to (0, 0) for all agents
+    - `goal_positions` (np.ndarray, optional): Goal positions, of shape (`num_agents`, 2); defaults to (-1, -1) (no goal) for all agents
+    - `intended_wait_time_steps_at_destination` (int | np.ndarray, optional): Time steps each agent intends to wait at its goal
+
+    ---
+
+    NOTE ON MEMORY:
+    Each `Agent` holds its own attribute dictionary, position list and
+    `direction_vectors` dictionary, i.e. several small objects per agent,
+    scattered in memory. Here, a fleet of any size is 6 arrays, and
+    updating all positions is 1 vectorised operation instead of a Python
+    loop over agents.
+    '''
+
+    def __init__(self, num_agents:int, horizontal_movement_limit, vertical_movement_limit, positions:np.ndarray=None, goal_positions:np.ndarray=None, intended_wait_time_steps_at_destination=5):
+        self.num_agents = num_agents
+        self.positions = np.zeros((num_agents, 2), dtype=np.int64) if positions is None else np.array(positions, dtype=np.int64).reshape(num_agents, 2)
+        self.goal_positions = np.full((num_agents, 2), -1, dtype=np.int64) if goal_positions is None else np.array(goal_positions, dtype=np.int64).reshape(num_agents, 2)
+        self.horizontal_movement_limits = np.broadcast_to(np.asarray(horizontal_movement_limit, dtype=np.int64), (num_agents,)).copy()
+        self.vertical_movement_limits = np.broadcast_to(np.asarray(vertical_movement_limit, dtype=np.int64), (num_agents,)).copy()
+        self.intended_wait_time_steps_at_destination = np.broadcast_to(np.asarray(intended_wait_time_steps_at_destination, dtype=np.int64), (num_agents,)).copy()
+        self.current_wait_time_steps_at_destination = np.zeros(num_agents, dtype=np.int64)
+
+    @classmethod
+    def from_agents(cls, agents:list[Agent]):
+        '''Creates a fleet with the positions, limits and wait counters of existing `Agent` objects.'''
+
+        fleet = cls(len(agents), [agent.horizontal_movement_limit for agent in agents], [agent.vertical_movement_limit for agent in agents], positions=[agent.position[:2] for agent in agents], intended_wait_time_steps_at_destination=[agent.intended_wait_time_steps_at_destination for agent in agents])
+        fleet.current_wait_time_steps_at_destination[:] = [agent.current_wait_time_steps_at_destination for agent in agents]
+        return fleet
+
+    def __len__(self) -> int:
+        return self.num_agents
+
+    def __getitem__(self, agent_index:int):
+        if agent_index < 0:
+            agent_index += self.num_agents
+        if agent_index < 0 or agent_index >= self.num_agents:
+            raise IndexError(f"Agent index {agent_index} is out of range for a fleet of {self.num_agents} agents")
+        return AgentView(self, agent_index)
+
+    def __iter__(self):
+        return iter(self.get_agents())
+
+    def get_agents(self) -> list:
+        '''Gets `Agent`-like views of all agents (e.g. to give to `MultiAgentManager`).'''
+
+        return [AgentView(self, i) for i in range(self.num_agents)]
+
+    #================================================
+    def is_within_limits(self, positions:np.ndarray, agent_indices=None) -> np.ndarray:
+        '''Checks which positions (1 per agent, or per agent in `agent_indices`) are within the agents' movement limits.'''
+
+        agent_indices = slice(None) if agent_indices is None else agent_indices
+        return (positions[:, 0] >= 0) & (positions[:, 0] < self.vertical_movement_limits[agent_indices]) & (positions[:, 1] >= 0) & (positions[:, 1] < self.horizontal_movement_limits[agent_indices])
+
+    def move(self, direction_symbols, steps=1, agent_indices=None) -> np.ndarray:
+        '''
+        Moves all agents (or those in `agent_indices`) at once; as in
+        `Agent.move`, an agent whose move would leave its movement limits
+        stays where it is.
+
+        ---
+
+        PARAMETERS:
+        - `direction_symbols` (str | list[str] | np.ndarray): 1 direction symbol for all moved agents, or 1 per moved agent
+        - `steps` (int | np.ndarray, optional): Number of steps (for all moved agents, or 1 per moved agent)
+        - `agent_indices` (list[int] | np.ndarray, optional): Agents to be moved; defaults to all agents
+
+        RETURNS:
+        - (np.ndarray): Boolean array; has each moved agent changed its position or not
+        '''
+
+        agent_indices = np.arange(self.num_agents) if agent_indices is None else np.asarray(agent_indices, dtype=np.int64)
+        direction_indices = np.broadcast_to(get_direction_indices(direction_symbols), agent_indices.shape)
+        steps = np.broadcast_to(np.asarray(steps, dtype=np.int64), agent_indices.shape)
+        new_positions = self.positions[agent_indices] + DIRECTION_ARRAY[direction_indices] * steps[:, None]
+        has_moved = self.is_within_limits(new_positions, agent_indices) & (direction_indices != NO_MOVE) & (steps != 0)
+        self.positions[agent_indices[has_moved]] = new_positions[has_moved]
+        return has_moved
+
+    def set_positions(self, positions:np.ndarray, agent_indices=None):
+        '''Sets the positions of all agents (or those in `agent_indices`) at once, e.g. from precomputed paths.'''
+
+        agent_indices = slice(None) if agent_indices is None else agent_indices
+        self.positions[agent_indices] = np.asarray(positions, dtype=np.int64)[..., :2]
+
+    def is_at_goal(self) -> np.ndarray:
+        '''Checks which agents are at their goal positions.'''
+
+        return np.all(self.positions == self.goal_positions, axis=1)
+
+    def update_wait_counters(self) -> np.ndarray:
+        '''
+        Advances the wait counters by 1 time step: agents at their goal
+        positions count up, and all others are reset to 0.
+
+        ---
+
+        RETURNS:
+        - (np.ndarray): Boolean array; has each agent finished waiting at its goal or not
+        '''
+
+        is_at_goal = self.is_at_goal()
+        self.current_wait_time_steps_at_destination = np.where(is_at_goal, self.current_wait_time_steps_at_destination + 1, 0)
+        return is_at_goal & (self.current_wait_time_steps_at_destination >= self.intended_wait_time_steps_at_destination)
+
+#================================================
+# COMPATIBILITY: Agent view into a fleet
+
+class AgentView(Agent):
+    '''
+    A thin view of 1 agent of an `AgentFleet`, with the attributes and
+    `move` method of `Agent`, all read from and written to the fleet's
+    arrays (so changes either way are seen by both).
+
+    ---
+
+    PARAMETERS:
+    - `fleet` (AgentFleet): Fleet the agent belongs to
+    - `agent_index` (int): Index of the agent in the fleet
+
+    ---
+
+    NOTE ON POSITIONS:
+    `position` gives a new list on each access (as the planners expect),
+    so it should be assigned as a whole (`view.position = (r, c)`, as is
+    done with `Agent`); changing an item of the list in place does not
+    change the fleet.
+    '''
+
+    direction_vectors = dict(zip(DIRECTION_SYMBOLS, map(tuple, DIRECTION_ARRAY[:NO_MOVE].tolist())))
+    # NOTE: Shared by all views, instead of 1 dictionary per agent
+
+    def __init__(self, fleet:AgentFleet, agent_index:int):
+        self.fleet = fleet
+        self.agent_index = agent_index
+
+    @property
+    def position(self) -> list[int]:
+        return self.fleet.positions[self.agent_index].tolist()
+
+    @position.setter
+    def position(self, position):
+        self.fleet.positions[self.agent_index] = position[:2]
+
+    @property
+    def goal_position(self) -> list[int]:
+        return self.fleet.goal_positions[self.agent_index].tolist()
+
+    @goal_position.setter
+    def goal_position(self, goal_position):
+        self.fleet.goal_positions[self.agent_index] = goal_position[:2]
+
+    @property
+    def horizontal_movement_limit(self) -> int:
+        return int(self.fleet.horizontal_movement_limits[self.agent_index])
+
+    @property
+    def vertical_movement_limit(self) -> int:
+        return int(self.fleet.vertical_movement_limits[self.agent_index])
+
+    @property
+    def intended_wait_time_steps_at_destination(self) -> int:
+        return int(self.fleet.intended_wait_time_steps_at_destination[self.agent_index])
+
+    @intended_wait_time_steps_at_destination.setter
+    def intended_wait_time_steps_at_destination(self, value:int):
+        self.fleet.intended_wait_time_steps_at_destination[self.agent_index] = value
+
+    @property
+    def current_wait_time_steps_at_destination(self) -> int:
+        return int(self.fleet.current_wait_time_steps_at_destination[self.agent_index])
+
+    @current_wait_time_steps_at_destination.setter
+    def current_wait_time_steps_at_destination(self, value:int):
+        self.fleet.current_wait_time_steps_at_destination[self.agent_index] = value
+
+    def move(self, direction_symbol:str, steps=1):
+        self.fleet.move(direction_symbol, steps, [self.agent_index])
+
+#############################################################
+# BENCHMARKING
+#############################################################
+
+if __name__ == "__main__":
+    import tracemalloc
+    from time import perf_counter
+    from algorithm_a_star import a_star
+    from multi_agent_manager import MultiAgentManager
+
+    # Compatibility: views work with the existing planners and stay in sync with the fleet
+    environment = BasicGridEnvironment(10, 20, prng_seed=3)
+    environment.generate_random_grid()
+    fleet = AgentFleet(3, 20, 20, positions=[(0, 0), (5, 5), (19, 19)])
+    agents = fleet.get_agents()
+    print(f"a_star from agents[1]: {a_star((10, 11), tuple(agents[1].position), agents[1], environment)}")
+    agents[1].move('d', 2)
+    agents[2].move('w')
+    # NOTE: Out of limits, so agent 2 does not move
+    assert fleet.positions[1].tolist() == [5, 7] and agents[2].position == [19, 19]
+    fleet.move("wdw")
+    manager = MultiAgentManager(fleet, environment)
+    paths, _ = manager.fixed_priority_equal_speed_ca_star([(10, 11), (0, 0)], [tuple(fleet.positions[0]), tuple(fleet.positions[1])], [0, 1])
+    print(f"CA* paths lengths from the fleet: {[len(path) for path in paths]}")
+    assert fleet.positions.tolist() == [[1, 0], [5, 8], [19, 19]]
+
+    # Wait counters:
+    fleet.goal_positions[:] = fleet.positions
+    fleet.intended_wait_time_steps_at_destination[:] = 2
+    assert not fleet.update_wait_counters().any() and fleet.update_wait_counters().all() and agents[0].current_wait_time_steps_at_destination == 2
+
+    # Moving many agents: fleet vs. Agent objects
+    num_agents, num_time_steps = 10000, 100
+    prng = np.random.RandomState(seed=0)
+    start_positions = prng.randint(0, 1000, size=(num_agents, 2))
+    moves = prng.choice(DIRECTION_SYMBOLS, size=(num_time_steps, num_agents))
+
+    tracemalloc.start()
+    agents = [Agent(1000, 1000, position) for position in start_positions.tolist()]
+    agents_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracemalloc.start()
+    fleet = AgentFleet(num_agents, 1000, 1000, positions=start_positions)
+    fleet_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start_time = perf_counter()
+    for t in range(num_time_steps):
+        for agent, direction_symbol in zip(agents, moves[t]):
+            agent.move(direction_symbol)
+    agents_time = perf_counter() - start_time
+    start_time = perf_counter()
+    for t in range(num_time_steps):
+        fleet.move(moves[t])
+    fleet_time = perf_counter() - start_time
+
+    print(f"\n{num_agents} agents, {num_time_steps} time steps")
+    print(f"Agent objects: {agents_time * 1e3:.1f} ms, {agents_memory / 2 ** 20:.2f} MiB")
+    print(f"AgentFleet: {fleet_time * 1e3:.1f} ms, {fleet_memory / 2 ** 20:.2f} MiB")
@@ -1,4 +1,5 @@
 from queue import PriorityQueue
+from bucket_priority_queue import BucketPriorityQueue, is_integral_heuristic
 from helpers import *
 
 #================================================
@@ -64,7 +65,7 @@ def detect_direction_change(next_position, current_position, previous_position)
 #================================================
 # MAIN: A* algorithm
 
-def a_star(end_position:tuple[int, int], start_position:tuple[int, int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True) -> list[tuple[int, int]]:
+def a_star(end_position:tuple[int, int], start_position:tuple[int, int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True, use_bucket_queue:bool=None) -> list[tuple[int, int]]:
     '''
     A* pathfinding function.
     
@@ -80,6 +81,7 @@ def a_star(end_position:tuple[int, int], start_position:tuple[int, int], agent:A
     - `environment` (BasicGridEnvironment): Environment to navigate within
     - `heuristic` (function, optional): Heuristic cost function used
     - `penalise_turns` (bool, optional): Add turning cost or not
+    - `use_bucket_queue` (bool, optional): Use a `BucketPriorityQueue` as the frontier; if `None`, it is used whenever `heuristic_cost` is known to always return integers (transition costs always are)
 
     RETURNS:
     - (list[tuple[int, int]]): Path
@@ -129,7 +131,9 @@ def a_star(end_position:tuple[int, int], start_position:tuple[int, int], agent:A
 
     #------------------------------------
     # Initialising the frontier data structure:
-    frontier = PriorityQueue()
+    if use_bucket_queue is None:
+        use_bucket_queue = is_integral_heuristic(heuristic_cost)
+    frontier = BucketPriorityQueue() if use_bucket_queue else PriorityQueue()
     frontier.put((h, start_position, 0))
     '''
     INTENDED FORMAT OF ELEMENTS:
@@ -151,6 +155,11 @@ def a_star(end_position:tuple[int, int], start_position:tuple[int, int], agent:A
     Items are ordered (by default in ascending order) based on the
     values or (in case of tuple items) the value of the item's first
     element of the tuple.
+
+    NOTE ON BucketPriorityQueue:
+
+    When all costs are small integers, a bucket queue (one list per
+    priority value) gives O(1) pushes and pops instead of O(log n).
     '''
 
     #------------------------------------
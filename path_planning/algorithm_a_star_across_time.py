@@ -1,4 +1,6 @@
 from queue import PriorityQueue
+from time import perf_counter
+from bucket_priority_queue import BucketPriorityQueue, is_integral_heuristic
 from helpers import *
 from algorithm_a_star import a_star
 
@@ -62,10 +64,77 @@ def detect_direction_change(next_position, current_position, previous_position)
 
     return not (current_to_next_direction == previous_to_current_direction)
 
+#================================================
+# HELPER: Spatial path along a distance field
+
+def descend_distance_field(position:tuple[int], previous_position:tuple[int], distance_field:np.ndarray) -> list[tuple[int]]:
+    '''
+    Gets a shortest spatial path to the goal of a distance field by
+    repeatedly stepping to a neighbour one step closer to the goal,
+    keeping the current direction whenever possible (to avoid turns).
+
+    ---
+
+    PARAMETERS:
+    - `position` (tuple[int]): Start position
+    - `previous_position` (tuple[int]): Position before the start position (defines the initial direction)
+    - `distance_field` (np.ndarray): Distance from the goal to every cell, as given by `get_distance_fields`
+
+    RETURNS:
+    - (list[tuple[int]]): Path from `position` to the goal; empty if the goal is unreachable
+    '''
+
+    num_rows, num_columns = distance_field.shape
+    distance = int(distance_field[position[0], position[1]])
+    if distance < 0:
+        return []
+    path = [tuple(position[:2])]
+    direction = (position[0] - previous_position[0], position[1] - previous_position[1])
+    while distance > 0:
+        for candidate_direction in [direction, (1, 0), (0, -1), (-1, 0), (0, 1)]:
+            r, c = path[-1][0] + candidate_direction[0], path[-1][1] + candidate_direction[1]
+            if candidate_direction != (0, 0) and 0 <= r < num_rows and 0 <= c < num_columns and distance_field[r, c] == distance - 1:
+                break
+        path.append((r, c))
+        direction = candidate_direction
+        distance -= 1
+    return path
+
+#================================================
+# HELPER: Cost of finishing with a spatial path beyond the reservation horizon
+
+def get_completion_cost(completion:list[tuple[int]], previous_position:tuple[int], penalise_turns=True) -> int:
+    '''
+    Gets the cost of following a spatial path with the transition costs
+    of `a_star_across_time` (no waiting is needed beyond the reservation
+    horizon, so each transition is a move).
+
+    ---
+
+    PARAMETERS:
+    - `completion` (list[tuple[int]]): Spatial path, starting at the current position
+    - `previous_position` (tuple[int]): Position before the current position (same as the current position if the agent waited or just started)
+    - `penalise_turns` (bool, optional): Add turning cost or not
+
+    RETURNS:
+    - (int): Cost of the path
+    '''
+
+    cost = 0
+    for i in range(1, len(completion)):
+        previous_position, current_position, next_position = (completion[i - 2] if i > 1 else previous_position), completion[i - 1], completion[i]
+        if penalise_turns and previous_position[:2] != current_position[:2] and not detect_direction_change(next_position, current_position, previous_position):
+            cost += 2
+        elif is_adjacent(current_position, next_position):
+            cost += 3
+        else:
+            cost += 4
+    return cost
+
 #================================================
 # MAIN: A* algorithm
 
-def a_star_across_time(end_position:tuple[int], start_position:tuple[int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True, reservation_table:dict={}) -> list[tuple[int, int, int]]:
+def a_star_across_time(end_position:tuple[int], start_position:tuple[int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True, reservation_table:ReservationTable=None, start_time_stamp:int=0, min_goal_time_stamp:int=0, use_bucket_queue:bool=None, max_expansions:int=None, time_budget:float=None) -> list[tuple[int, int, int]]:
     '''
     A* pathfinding function that accounts for dynamic obstacles across
     time (usually, these dynamic obstacles are other agents in the grid).
@@ -82,12 +151,39 @@ def a_star_across_time(end_position:tuple[int], start_position:tuple[int], agent
     - `environment` (BasicGridEnvironment): Environment to navigate within
     - `heuristic` (function, optional): Heuristic cost function used
     - `penalise_turns` (bool, optional): Add turning cost or not
-    - `reservation_table` (dict): Table indicating reserved cells across time stamps; must be in the format:
+    - `use_bucket_queue` (bool, optional): Use a `BucketPriorityQueue` as the frontier; if `None`, it is used whenever `heuristic_cost` is known to always return integers (transition costs always are)
+    - `reservation_table` (ReservationTable, optional): Table indicating reserved cells across time stamps (a plain dictionary is converted, and nothing is reserved if `None`); must be in the format:
         - Keys: (row index, column index, time stamp)
         - Items: Index of the agent which has reserved the above position in the above time stamp
+    - `start_time_stamp` (int, optional): Time stamp at which the agent is at `start_position`
+    - `min_goal_time_stamp` (int, optional): Earliest time stamp at which reaching `end_position` counts as reaching the goal \n
+      NOTE: Useful when the agent stays at its end position afterwards, and the end position is reserved by other agents until some time stamp
+    - `max_expansions` (int, optional): Maximum number of nodes to expand; if exceeded, a partial path is returned
+    - `time_budget` (float, optional): Maximum search time in seconds; if exceeded, a partial path is returned
     
     RETURNS:
-    - (list[tuple[int, int, int]]): Path
+    - (list[tuple[int, int, int]]): Path \n
+      NOTE: If a budget runs out, this is the path to the expanded node closest to `end_position` (by heuristic cost), so it may not end at `end_position`
+    
+    ---
+
+    NOTE ON THE RESERVATION HORIZON:
+    Beyond the latest reserved time stamp (and `min_goal_time_stamp`),
+    nothing is reserved, so the problem is purely spatial again; each
+    further time layer would only repeat the spatial search. Hence, a
+    distance field to `end_position` is used, and a node beyond this
+    horizon is finished with a shortest spatial path along it, then
+    pushed back into the frontier with its finished cost; the search
+    ends when such a finished node is popped. The distance field also
+    gives a tighter heuristic beyond the horizon. It is fetched only
+    once a node beyond the horizon is reached, from the environment's
+    shared `DistanceFieldCache` (see `get_shared_distance_field_cache`),
+    so repeated searches to the same goal (e.g. with an empty
+    reservation table, where every node is beyond the horizon) compute
+    it only once per grid version. Positions that stay reserved beyond
+    the horizon (`ReservationTable.get_static_obstacles`, e.g. endpoint
+    reservations) are obstacles of this distance field, which is keyed
+    on them too.
     
     ---
 
@@ -100,16 +196,17 @@ def a_star_across_time(end_position:tuple[int], start_position:tuple[int], agent
     #------------------------------------
     # Assigning start position if not already given:
     if start_position == "agent":
-        start_position = (agent.position[0], agent.position[1], 0)
+        start_position = (agent.position[0], agent.position[1], start_time_stamp)
+    reservation_table = as_reservation_table(reservation_table)
     
     #------------------------------------
     # Goal test, in case we have already fulfilled the pathfinding requirements:
-    if start_position == end_position:
-        return [(start_position[0], start_position[1], 0)]
+    if start_position == end_position and start_time_stamp >= min_goal_time_stamp:
+        return [(start_position[0], start_position[1], start_time_stamp)]
 
     #------------------------------------
     # Adding the time dimension:
-    start_position_with_time_stamp = (start_position[0], start_position[1], 0)
+    start_position_with_time_stamp = (start_position[0], start_position[1], start_time_stamp)
 
     #------------------------------------
     # Initialising the data storage of visited nodes:
@@ -145,7 +242,9 @@ def a_star_across_time(end_position:tuple[int], start_position:tuple[int], agent
 
     #------------------------------------
     # Initialising the frontier data structure:
-    frontier = PriorityQueue()
+    if use_bucket_queue is None:
+        use_bucket_queue = is_integral_heuristic(heuristic_cost)
+    frontier = BucketPriorityQueue() if use_bucket_queue else PriorityQueue()
     frontier.put((h, start_position_with_time_stamp, 0))
     '''
     INTENDED FORMAT OF ELEMENTS:
@@ -171,21 +270,67 @@ def a_star_across_time(end_position:tuple[int], start_position:tuple[int], agent
 
     #------------------------------------
     # Checking if the goal is even reachable:
-    abstract_path = a_star(end_position, start_position, agent, environment, heuristic_cost, penalise_turns)
+    abstract_path = a_star(end_position, start_position, agent, environment, heuristic_cost, penalise_turns, use_bucket_queue)
     if abstract_path == []:
         return []
 
+    #------------------------------------
+    # Preparing to finish with spatial paths beyond the reservation horizon:
+    reservation_horizon = max(get_reservation_horizon(reservation_table), min_goal_time_stamp - 1)
+    static_obstacles = reservation_table.get_static_obstacles()
+    distance_field = None
+    # NOTE: Fetched (once) only when a node beyond the horizon is reached
+    min_move_cost = 2 if penalise_turns else 3
+    finished = {}
+    # NOTE: Keys: Node beyond the horizon; Items: (total cost when finished, spatial path used to finish)
+
+    #------------------------------------
+    # Preparing the search budget:
+    num_expansions = 0
+    budget_start_time = perf_counter()
+    closest_position_with_time_stamp = start_position_with_time_stamp
+    # Small helper for reconstructing paths that may end at the start position:
+    def get_path_to(position_with_time_stamp:tuple[int]) -> list[tuple[int]]:
+        if position_with_time_stamp == start_position_with_time_stamp:
+            return [start_position_with_time_stamp]
+        return reconstruct_path(position_with_time_stamp, visited)
+
     #------------------------------------
     # Exploring the frontier until it is empty...
     
     while not frontier.empty():
         # Get highest priority path to explore next:
-        _, current_position_with_time_stamp, path_cost = frontier.get()
+        priority, current_position_with_time_stamp, path_cost = frontier.get()
         
         # Goal test:
-        if current_position_with_time_stamp[:2] == end_position:
+        if current_position_with_time_stamp[:2] == end_position and current_position_with_time_stamp[2] >= min_goal_time_stamp:
             return reconstruct_path(current_position_with_time_stamp, visited)
         
+        # Beyond the reservation horizon, finish with a spatial path:
+        if current_position_with_time_stamp[2] > reservation_horizon:
+            finished_entry = finished.get(current_position_with_time_stamp, None)
+            if finished_entry is not None and finished_entry[0] == priority:
+                t = current_position_with_time_stamp[2]
+                return get_path_to(current_position_with_time_stamp) + [(position[0], position[1], t + i) for i, position in enumerate(finished_entry[1]) if i > 0]
+            if distance_field is None:
+                distance_field = get_shared_distance_field_cache(environment).get([end_position], static_obstacles)[0]
+            previous_position_with_time_stamp = visited[current_position_with_time_stamp][PREVIOUS_POSITION]
+            spatial_path = descend_distance_field(current_position_with_time_stamp[:2], previous_position_with_time_stamp[:2], distance_field)
+            if spatial_path == []:
+                # The goal is cut off by static obstacles from here:
+                continue
+            total_cost = path_cost + get_completion_cost(spatial_path, previous_position_with_time_stamp, penalise_turns)
+            finished[current_position_with_time_stamp] = (total_cost, spatial_path)
+            frontier.put((total_cost, current_position_with_time_stamp, path_cost))
+            continue
+
+        # Budget check (returning a partial path if the budget has run out):
+        num_expansions += 1
+        if heuristic_cost(current_position_with_time_stamp[:2], end_position) < heuristic_cost(closest_position_with_time_stamp[:2], end_position):
+            closest_position_with_time_stamp = current_position_with_time_stamp
+        if (max_expansions is not None and num_expansions > max_expansions) or (time_budget is not None and perf_counter() - budget_start_time > time_budget):
+            return get_path_to(closest_position_with_time_stamp)
+        
         # If goal not reached, explore neighbours:
         open_neighbour_positions_with_time_stamp = get_open_neighbours_at_time_stamp(current_position_with_time_stamp, [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol], environment.grid, reservation_table)
         for neighbour_position_with_time_stamp in open_neighbour_positions_with_time_stamp:
@@ -194,7 +339,11 @@ def a_star_across_time(end_position:tuple[int], start_position:tuple[int], agent
             try:
                 h = visited[neighbour_position_with_time_stamp][HEURISTIC]
             except KeyError:
-                h = heuristic_cost(neighbour_position_with_time_stamp[:2], end_position)
+                if neighbour_position_with_time_stamp[2] > reservation_horizon and distance_field is not None:
+                    # NOTE: Every move costs at least `min_move_cost`, so this is a tighter (still consistent) heuristic
+                    h = max(min_move_cost * int(distance_field[neighbour_position_with_time_stamp[:2]]), heuristic_cost(neighbour_position_with_time_stamp[:2], end_position))
+                else:
+                    h = heuristic_cost(neighbour_position_with_time_stamp[:2], end_position)
 
             #____________
             # Define the transition cost:
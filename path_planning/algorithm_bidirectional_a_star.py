@@ -0,0 +1,217 @@
+from heapq import heappush, heappop
+from helpers import *
+from algorithm_a_star_with_headings import DIRECTION_VECTORS, NO_HEADING, NUM_HEADINGS
+
+#================================================
+# MAIN: Bidirectional A* over (cell, heading) states
+
+def bidirectional_a_star(end_position:tuple[int, int], start_position:tuple[int, int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True, do_get_statistics=False) -> list[tuple[int, int]] | tuple[list[tuple[int, int]], dict]:
+    '''
+    Bidirectional A* pathfinding function: one A* search from the start
+    and one (over reversed moves) from the end, which stop once the best
+    path through a state reached by both cannot be improved; same
+    interface, transition costs and return format as `a_star`.
+
+    ---
+
+    PARAMETERS:
+    - `end_position` (tuple[int, int]): Position to be reached/approached
+    - `start_position` (tuple[int, int]): Agent start position; if given as "agent", defaults to `agent.position`
+    - `agent` (Agent): Navigating agent
+    - `environment` (BasicGridEnvironment): Environment to navigate within
+    - `heuristic` (function, optional): Heuristic cost function used (consistent; towards both `end_position` and `start_position`)
+    - `penalise_turns` (bool, optional): Add turning cost or not
+    - `do_get_statistics` (bool, optional): Get search statistics or not
+
+    RETURNS:
+    - (list[tuple[int, int]]): Path
+    - (dict, optional): Statistics; "num_expansions" (both directions) and "path_cost"
+
+    ---
+
+    NOTE ON STATES:
+    As in `a_star_with_headings`, states are (cell, heading of entry)
+    pairs packed into integer keys, so turning costs are exact edge
+    costs. The reverse search runs over the same states: the reverse
+    successors of (cell, heading) are the states (cell - heading vector,
+    any entry heading), at the cost of the move from them into the cell.
+    Path costs and parents of both directions are kept in dictionaries
+    keyed by the state key, so only the states that either search
+    reaches are stored (flat arrays over all states would cost O(grid
+    size) to allocate on every query, which dominates short queries on
+    large grids).
+
+    NOTE ON STOPPING:
+    Both searches use the average potential p(v) = (h(v, end) - h(v,
+    start)) / 2 (and -p(v) from the end side), so that the priorities of
+    both sides are consistent with the same reduced edge costs. Hence,
+    once the sum of the lowest priorities of the 2 queues reaches the
+    best meeting cost found so far, no undiscovered path can be cheaper,
+    and the search stops; with the plain heuristics of 2 separate A*
+    searches, this only holds much later (once either lowest priority
+    alone reaches it). This requires a consistent heuristic, such as the
+    Manhattan distance or `LandmarkHeuristic`. The direction with fewer
+    queued states is expanded next, which keeps the 2 searches balanced
+    around narrow passages.
+    '''
+
+    #------------------------------------
+    # Assigning start position if not already given:
+    if start_position == "agent":
+        start_position = tuple(agent.position)
+    start_position, end_position = tuple(start_position), tuple(end_position)
+    statistics = {"num_expansions": 0, "path_cost": 0}
+
+    #------------------------------------
+    # Goal test, in case we have already fulfilled the pathfinding requirements:
+    if start_position == end_position:
+        return ([start_position], statistics) if do_get_statistics else [start_position]
+
+    #------------------------------------
+    # Initialising packed state storage (index 0: from the start; index 1: from the end):
+    grid = environment.grid
+    num_rows, num_columns = grid.shape
+    obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+    path_costs = [{}, {}]
+    parent_keys = [{}, {}]
+    expanded_keys = [set(), set()]
+    frontiers = [[], []]
+    # NOTE: Every move costs at least `min_move_cost`, and the heuristic counts moves, so scaling it keeps it consistent
+    min_move_cost = 1 if penalise_turns else 2
+    def get_potential(side:int, position:tuple[int, int]) -> float:
+        potential = min_move_cost * (heuristic_cost(position, end_position) - heuristic_cost(position, start_position)) / 2
+        return potential if side == 0 else -potential
+    start_cell_index = start_position[0] * num_columns + start_position[1]
+
+    def get_cell_index(row:int, column:int) -> int:
+        # Gets the cell index of a free cell within the grid, or -1:
+        if row < 0 or row >= num_rows or column < 0 or column >= num_columns:
+            return -1
+        return -1 if grid[row, column] in obstacle_symbols else row * num_columns + column
+
+    def get_transition_cost(from_heading:int, to_heading:int) -> int:
+        return 1 if penalise_turns and from_heading == to_heading else 2
+
+    # Start side: the start state
+    start_key = start_cell_index * NUM_HEADINGS + NO_HEADING
+    path_costs[0][start_key] = 0
+    parent_keys[0][start_key] = -1
+    heappush(frontiers[0], (get_potential(0, start_position), 0, start_key))
+    # End side: the end cell entered from each free neighbour
+    for heading, (dr, dc) in enumerate(DIRECTION_VECTORS):
+        if get_cell_index(end_position[0] - dr, end_position[1] - dc) >= 0:
+            end_key = (end_position[0] * num_columns + end_position[1]) * NUM_HEADINGS + heading
+            path_costs[1][end_key] = 0
+            parent_keys[1][end_key] = -1
+            heappush(frontiers[1], (get_potential(1, end_position), 0, end_key))
+
+    #------------------------------------
+    # Exploring both frontiers...
+    best_cost, meeting_key = np.inf, -1
+    while True:
+        # Discarding stale entries and checking the stopping criterion:
+        for side in range(2):
+            while frontiers[side] and frontiers[side][0][2] in expanded_keys[side]:
+                heappop(frontiers[side])
+        if not (frontiers[0] and frontiers[1]):
+            break
+        if best_cost <= frontiers[0][0][0] + frontiers[1][0][0]:
+            break
+
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        _, path_cost, current_key = heappop(frontiers[side])
+        expanded_keys[side].add(current_key)
+        statistics["num_expansions"] += 1
+        current_cell_index, current_heading = divmod(current_key, NUM_HEADINGS)
+        row, column = divmod(current_cell_index, num_columns)
+
+        # Successors (from the start side) or predecessors (from the end side) with their transition costs:
+        transitions = []
+        if side == 0:
+            for heading, (dr, dc) in enumerate(DIRECTION_VECTORS):
+                neighbour_cell_index = get_cell_index(row + dr, column + dc)
+                if neighbour_cell_index >= 0:
+                    transitions.append((neighbour_cell_index * NUM_HEADINGS + heading, get_transition_cost(current_heading, heading)))
+        elif current_heading != NO_HEADING:
+            dr, dc = DIRECTION_VECTORS[current_heading]
+            previous_row, previous_column = row - dr, column - dc
+            previous_cell_index = get_cell_index(previous_row, previous_column)
+            if previous_cell_index >= 0:
+                for heading, (dr, dc) in enumerate(DIRECTION_VECTORS):
+                    if get_cell_index(previous_row - dr, previous_column - dc) >= 0:
+                        transitions.append((previous_cell_index * NUM_HEADINGS + heading, get_transition_cost(heading, current_heading)))
+                if previous_cell_index == start_cell_index:
+                    transitions.append((start_key, get_transition_cost(NO_HEADING, current_heading)))
+
+        for neighbour_key, transition_cost in transitions:
+            new_path_cost = path_cost + transition_cost
+            if new_path_cost < path_costs[side].get(neighbour_key, np.inf):
+                path_costs[side][neighbour_key] = new_path_cost
+                parent_keys[side][neighbour_key] = current_key
+                neighbour_position = divmod(neighbour_key // NUM_HEADINGS, num_columns)
+                heappush(frontiers[side], (new_path_cost + get_potential(side, neighbour_position), new_path_cost, neighbour_key))
+                # Meeting the other search:
+                meeting_cost = new_path_cost + path_costs[1 - side].get(neighbour_key, np.inf)
+                if meeting_cost < best_cost:
+                    best_cost, meeting_key = meeting_cost, neighbour_key
+
+    if meeting_key < 0:
+        return ([], statistics) if do_get_statistics else []
+
+    #------------------------------------
+    # Joining the 2 half paths at the meeting state:
+    path = []
+    key = meeting_key
+    while key >= 0:
+        path.append(divmod(key // NUM_HEADINGS, num_columns))
+        key = parent_keys[0][key]
+    path.reverse()
+    key = parent_keys[1][meeting_key]
+    while key >= 0:
+        path.append(divmod(key // NUM_HEADINGS, num_columns))
+        key = parent_keys[1][key]
+    statistics["path_cost"] = int(best_cost) if best_cost == int(best_cost) else best_cost
+    return (path, statistics) if do_get_statistics else path
+
+#############################################################
+# BENCHMARKING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from algorithm_a_star import a_star
+    from algorithm_a_star_with_headings import a_star_with_headings, get_heading
+
+    def get_path_cost(path:list[tuple[int, int]], penalise_turns:bool) -> int:
+        headings = [get_heading(a, b) for a, b in zip(path[:-1], path[1:])]
+        return sum(1 if penalise_turns and i > 0 and headings[i - 1] == heading else 2 for i, heading in enumerate(headings))
+
+    print("Map size | Turning cost | a_star (ms per query) | a_star_with_headings (ms per query) | bidirectional_a_star (ms per query) | Expansions (bidirectional) | Costs equal")
+    for grid_length_in_cells in [50, 100, 200]:
+        # Warehouse-like layout (shelves with 1-cell aisles and a cross aisle every 15 rows):
+        environment = BasicGridEnvironment(10, grid_length_in_cells, prng_seed=3)
+        grid = np.full(environment.grid.shape, environment.free_space_symbol)
+        for r in range(1, grid_length_in_cells - 1):
+            if r % 15 != 0:
+                grid[r, 1:grid_length_in_cells - 2:3] = environment.permanent_obstacle_symbol
+                grid[r, 2:grid_length_in_cells - 2:3] = environment.permanent_obstacle_symbol
+        environment.set_grid(grid)
+        agent = Agent(grid_length_in_cells, grid_length_in_cells)
+        # Cross-facility queries (between opposite sides):
+        prng = np.random.RandomState(seed=0)
+        free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+        near_positions = [tuple(position) for position in free_space_positions if position[1] < grid_length_in_cells // 5]
+        far_positions = [tuple(position) for position in free_space_positions if position[1] >= grid_length_in_cells - grid_length_in_cells // 5]
+        queries = [(near_positions[prng.randint(len(near_positions))], far_positions[prng.randint(len(far_positions))]) for _ in range(5)]
+
+        for penalise_turns in [True, False]:
+            timings, costs = [], []
+            for search_function in [a_star, a_star_with_headings, bidirectional_a_star]:
+                start_time = perf_counter()
+                paths = [search_function(end_position, start_position, agent, environment, penalise_turns=penalise_turns) for start_position, end_position in queries]
+                timings.append((perf_counter() - start_time) / len(queries))
+                costs.append([get_path_cost(path, penalise_turns) for path in paths])
+            num_expansions = sum(bidirectional_a_star(end_position, start_position, agent, environment, penalise_turns=penalise_turns, do_get_statistics=True)[1]["num_expansions"] for start_position, end_position in queries)
+            for path, (start_position, end_position) in zip(paths, queries):
+                assert path[0] == start_position and path[-1] == end_position and all(get_manhattan_distance(a, b) == 1 for a, b in zip(path[:-1], path[1:]))
+            print(f"{grid_length_in_cells} x {grid_length_in_cells} | {penalise_turns} | {timings[0] * 1e3:.1f} | {timings[1] * 1e3:.1f} | {timings[2] * 1e3:.1f} | {num_expansions} | {costs[1] == costs[2]}")
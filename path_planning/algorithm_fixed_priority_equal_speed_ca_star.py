@@ -41,7 +41,7 @@ def fixed_priority_equal_speed_ca_star(end_positions:list[tuple[int]], start_pos
     paths = []
     
     # Initialisation:
-    reservation_table = {}
+    reservation_table = ReservationTable()
     max_path_length = 0
     
     # Running the CA* algorithm:
@@ -49,8 +49,7 @@ def fixed_priority_equal_speed_ca_star(end_positions:list[tuple[int]], start_pos
         path = a_star_across_time(end_positions[i], start_positions[i], agents[i], environment, heuristic_cost, penalise_turns, reservation_table)
         max_path_length = max(max_path_length, len(path))
         paths.append(path)
-        for position_with_time_stamp in path:
-            reservation_table[position_with_time_stamp] = i
+        reservation_table.reserve_path(path, i)
     
     # If reservation table must also be returned (for reference):
     if do_get_reservation_table:
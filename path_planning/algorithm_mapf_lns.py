@@ -0,0 +1,229 @@
+from time import perf_counter
+from algorithm_a_star_across_time import a_star_across_time, a_star
+from helpers import *
+
+#================================================
+# HELPER: Sum of costs
+
+def get_sum_of_costs(paths:list[list[tuple[int, int, int]]]) -> int:
+    '''
+    Gets the sum of costs of a multi-agent solution.
+
+    NOTE: Cost of a path => Number of time steps taken to reach its end (waits included)
+
+    ---
+
+    PARAMETERS:
+    - `paths` (list[list[tuple[int, int, int]]]): List of paths, each corresponding to an agent
+
+    RETURNS:
+    - (int): Sum of costs (empty paths, i.e. failed agents, are ignored)
+    '''
+
+    return sum(len(path) - 1 for path in paths if path != [])
+
+#================================================
+# HELPER: Reservation of paths
+
+def unreserve_path(path:list[tuple[int, int, int]], agent_index:int, reservation_table:ReservationTable):
+    '''
+    Removes a path's positions across time stamps from the reservation
+    table (only where they are still reserved by the same agent).
+
+    ---
+
+    PARAMETERS:
+    - `path` (list[tuple[int, int, int]]): Path with time stamps
+    - `agent_index` (int): Index of the agent following the path
+    - `reservation_table` (ReservationTable): Reservation table to update in-place
+    '''
+
+    for position_with_time_stamp in path:
+        if reservation_table.get(position_with_time_stamp, None) == agent_index:
+            del reservation_table[position_with_time_stamp]
+
+#================================================
+# HELPER: Neighbourhood selection
+
+VALID_NEIGHBOURHOOD_APPROACHES = ["random", "agent_based", "map_based"]
+
+def select_neighbourhood(paths:list[list[tuple[int, int, int]]], delays:list[int], neighbourhood_approach:str, neighbourhood_size:int, prng:np.random.RandomState) -> list[int]:
+    '''
+    Selects a small set of agents (a "neighbourhood") whose paths are to
+    be replanned against the fixed paths of the remaining agents.
+
+    ---
+
+    PARAMETERS:
+    - `paths` (list[list[tuple[int, int, int]]]): Current paths, each corresponding to an agent
+    - `delays` (list[int]): Delay of each agent (path cost minus abstract path cost)
+    - `neighbourhood_approach` (str): Neighbourhood selection method
+        - "random": Uniformly random agents
+        - "agent_based": The most delayed agent (randomly chosen among delayed agents) and the agents occupying cells along its path
+        - "map_based": Agents passing through a small square region around a randomly chosen visited cell
+    - `neighbourhood_size` (int): Maximum number of agents in the neighbourhood
+    - `prng` (np.random.RandomState): PRNG used for random choices
+
+    RETURNS:
+    - (list[int]): Indices of the agents in the neighbourhood
+    '''
+
+    candidate_indices = [i for i in range(len(paths)) if paths[i] != []]
+    if len(candidate_indices) <= neighbourhood_size:
+        return candidate_indices
+
+    if neighbourhood_approach == "random":
+        return [int(i) for i in prng.choice(candidate_indices, size=neighbourhood_size, replace=False)]
+
+    elif neighbourhood_approach == "agent_based":
+        # Choosing a delayed agent, favouring more delayed agents:
+        weights = np.array([delays[i] + 1 for i in candidate_indices], dtype=float)
+        seed_agent_index = int(prng.choice(candidate_indices, p=weights / weights.sum()))
+        # Finding agents occupying cells along the chosen agent's path (these are the agents likely to have delayed it):
+        seed_cells = set(position_with_time_stamp[:2] for position_with_time_stamp in paths[seed_agent_index])
+        blocking_agent_indices = [i for i in candidate_indices if i != seed_agent_index and any(p[:2] in seed_cells for p in paths[i])]
+        prng.shuffle(blocking_agent_indices)
+        return [seed_agent_index] + blocking_agent_indices[:neighbourhood_size - 1]
+
+    elif neighbourhood_approach == "map_based":
+        # Choosing a random visited cell as the centre of the region:
+        path = paths[prng.choice(candidate_indices)]
+        centre = path[prng.randint(0, len(path))]
+        radius = max(1, neighbourhood_size // 2)
+        region_agent_indices = [i for i in candidate_indices if any(abs(p[0] - centre[0]) <= radius and abs(p[1] - centre[1]) <= radius for p in paths[i])]
+        prng.shuffle(region_agent_indices)
+        return region_agent_indices[:neighbourhood_size]
+
+    raise Exception(f"Neighbourhood approach \"{neighbourhood_approach}\" is invalid: should be one of {VALID_NEIGHBOURHOOD_APPROACHES}")
+
+#================================================
+# MAIN: MAPF-LNS post-optimiser
+
+def mapf_lns(paths:list[list[tuple[int]]], end_positions:list[tuple[int]], agents:list[Agent], environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns:bool=True, time_budget:float=1.0, neighbourhood_size:int=4, neighbourhood_approach:str="random", prng_seed=None, do_get_cost_history=False) -> list[list[tuple[int, int, int]]] | tuple[list[list[tuple[int, int, int]]], list[tuple[float, int]]]:
+    '''
+    Large Neighbourhood Search (LNS) that improves an existing multi-agent
+    solution (e.g. from `fixed_priority_equal_speed_ca_star` or
+    `windowed_equal_speed_ca_star_v2`) until a time budget runs out.
+
+    In each iteration, a small neighbourhood of agents is chosen, their
+    paths are removed from the reservation table and they are replanned
+    (in a random order) against the fixed paths of the other agents.
+    The new paths are kept only if they reduce the sum of costs.
+
+    ---
+
+    PARAMETERS:
+    - `paths` (list[list[tuple[int]]]): Existing paths, each corresponding to an agent; the i-th position in a path is taken to be at time stamp i
+    - `end_positions` (list[tuple[int]]): List of end positions; end position i corresponds to agent i
+    - `agents` (list[Agent]): Navigating agents
+    - `environment` (BasicGridEnvironment): Environment to navigate within
+    - `heuristic` (function, optional): Heuristic cost function used
+    - `penalise_turns` (bool, optional): Add turning cost or not
+    - `time_budget` (float, optional): Time (in seconds) to keep optimising for
+    - `neighbourhood_size` (int, optional): Maximum number of agents replanned per iteration
+    - `neighbourhood_approach` (str, optional): Neighbourhood selection method; one of `VALID_NEIGHBOURHOOD_APPROACHES`
+    - `prng_seed` (int, optional): Seed for the PRNG used for neighbourhood selection and replanning order
+    - `do_get_cost_history` (bool, optional): Also return the sum of costs across time
+
+    RETURNS:
+    - (list[list[tuple[int, int, int]]]): List of improved paths, each corresponding to an agent
+    - (list[tuple[float, int]], optional): Cost history as (seconds elapsed, sum of costs), recorded at the start and at each improvement
+
+    ---
+
+    NOTE ON THE SEMANTICS OF THE SOLUTION:
+
+    As in the CA* functions, an agent that has reached its end position
+    disappears; hence, only the positions along each path are reserved.
+    Windowed CA* paths restart their time stamps every window, so the
+    given paths are re-stamped by their indices before optimising.
+    '''
+
+    if neighbourhood_approach not in VALID_NEIGHBOURHOOD_APPROACHES:
+        raise Exception(f"Neighbourhood approach \"{neighbourhood_approach}\" is invalid: should be one of {VALID_NEIGHBOURHOOD_APPROACHES}")
+
+    start_time = perf_counter()
+    prng = np.random.RandomState(seed=prng_seed)
+
+    #------------------------------------
+    # Initialisation:
+    paths = [[(position[0], position[1], t) for t, position in enumerate(path)] for path in paths]
+    reservation_table = ReservationTable()
+    for i, path in enumerate(paths):
+        reservation_table.reserve_path(path, i)
+
+    # Delays (relative to abstract paths) guide agent-based neighbourhood selection:
+    delays = [0] * len(paths)
+    if neighbourhood_approach == "agent_based":
+        for i, path in enumerate(paths):
+            if path != []:
+                abstract_path = a_star(tuple(end_positions[i]), path[0][:2], agents[i], environment, heuristic_cost, penalise_turns)
+                delays[i] = max(0, len(path) - len(abstract_path))
+
+    sum_of_costs = get_sum_of_costs(paths)
+    cost_history = [(perf_counter() - start_time, sum_of_costs)]
+
+    #------------------------------------
+    # Replanning neighbourhoods until the time budget runs out:
+    while perf_counter() - start_time < time_budget:
+        neighbourhood = select_neighbourhood(paths, delays, neighbourhood_approach, neighbourhood_size, prng)
+        if neighbourhood == []:
+            break
+        old_cost = get_sum_of_costs([paths[i] for i in neighbourhood])
+
+        for i in neighbourhood:
+            unreserve_path(paths[i], i, reservation_table)
+
+        #________________________
+        # Replanning the neighbourhood in a random order:
+        new_paths = {}
+        for i in prng.permutation(neighbourhood):
+            i = int(i)
+            path = a_star_across_time(tuple(end_positions[i]), paths[i][0][:2], agents[i], environment, heuristic_cost, penalise_turns, reservation_table)
+            if path == []:
+                break
+            new_paths[i] = path
+            reservation_table.reserve_path(path, i)
+
+        #________________________
+        # Accepting the new paths only if all agents were replanned and the sum of costs improved:
+        if len(new_paths) == len(neighbourhood) and get_sum_of_costs(list(new_paths.values())) < old_cost:
+            for i, path in new_paths.items():
+                delays[i] = max(0, delays[i] - (len(paths[i]) - len(path)))
+                paths[i] = path
+            sum_of_costs = get_sum_of_costs(paths)
+            cost_history.append((perf_counter() - start_time, sum_of_costs))
+        # Otherwise, restoring the old paths:
+        else:
+            for i, path in new_paths.items():
+                unreserve_path(path, i, reservation_table)
+            for i in neighbourhood:
+                reservation_table.reserve_path(paths[i], i)
+
+    #------------------------------------
+    if do_get_cost_history:
+        return paths, cost_history
+    return paths
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from algorithm_fixed_priority_equal_speed_ca_star import fixed_priority_equal_speed_ca_star
+    environment = BasicGridEnvironment(prng_seed=3)
+    environment.generate_random_grid()
+    a, b = environment.grid.shape
+    free_space_positions = [tuple(position) for position in get_free_space_positions(environment.free_space_symbol, environment.grid)]
+    prng = np.random.RandomState(seed=5)
+    chosen_indices = prng.choice(len(free_space_positions), size=20, replace=False)
+    start_positions = [free_space_positions[k] for k in chosen_indices[:10]]
+    end_positions = [free_space_positions[k] for k in chosen_indices[10:]]
+    agents = [Agent(a, b) for _ in range(len(start_positions))]
+
+    paths = fixed_priority_equal_speed_ca_star(end_positions, start_positions, agents, environment)
+    for neighbourhood_approach in VALID_NEIGHBOURHOOD_APPROACHES:
+        _, cost_history = mapf_lns(paths, end_positions, agents, environment, time_budget=2, neighbourhood_approach=neighbourhood_approach, prng_seed=1, do_get_cost_history=True)
+        print(f"\n{neighbourhood_approach.upper()} NEIGHBOURHOODS\n")
+        for seconds_elapsed, sum_of_costs in cost_history:
+            print(f"{seconds_elapsed:.3f} s: sum of costs = {sum_of_costs}")
@@ -0,0 +1,722 @@
+from array import array
+from helpers import *
+from algorithm_a_star_with_headings import DIRECTION_VECTORS, NO_HEADING, NUM_HEADINGS, get_heading
+
+#================================================
+# HELPER: Binary heap without duplicate entries
+
+class IndexedHeap:
+    '''
+    Binary heap of node indices in which each index appears at most once;
+    the position of each index is tracked, so an index can be removed,
+    or moved after its key changed, in O(log n) time (instead of pushing
+    a new entry and skipping the outdated one when popped, which would
+    let outdated entries take up memory).
+
+    Indices are ordered by a primary key (lowest first), then by a
+    secondary key (highest first), both read from typed arrays by node
+    index. The keys are compared inline rather than through a Python
+    function, since comparisons dominate the cost of sifting.
+
+    ---
+
+    PARAMETERS:
+    - `primary_keys` (array): Primary key of each node index
+    - `secondary_keys` (array): Secondary key of each node index, to break ties
+    - `is_reversed` (bool, optional): Reverse the order, i.e. highest primary key first, then lowest secondary key
+    '''
+
+    def __init__(self, primary_keys:array, secondary_keys:array, is_reversed:bool=False):
+        self.primary_keys = primary_keys
+        self.secondary_keys = secondary_keys
+        self.sign = -1 if is_reversed else 1
+        self.indices = array('i')
+        self.positions = array('i')
+        # NOTE: Position of each node index within `.indices`; -1 if not in the heap
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __contains__(self, index:int) -> bool:
+        return index < len(self.positions) and self.positions[index] >= 0
+
+    def peek(self) -> int:
+        return self.indices[0]
+
+    def pop(self) -> int:
+        indices = self.indices
+        index = indices[0]
+        self.positions[index] = -1
+        last_index = indices.pop()
+        if len(indices) > 0:
+            indices[0] = last_index
+            self.sift(0)
+        return index
+
+    def push_or_update(self, index:int):
+        '''Adds an index, or restores the heap order around it if already in the heap (e.g. after its key changed).'''
+
+        if index >= len(self.positions):
+            # Growing geometrically, since new node indices are mostly pushed in increasing order:
+            self.positions.extend([-1] * max(index + 1 - len(self.positions), len(self.positions)))
+        position = self.positions[index]
+        if position < 0:
+            self.indices.append(index)
+            position = len(self.indices) - 1
+        self.sift(position)
+
+    def remove(self, index:int):
+        if not (index in self):
+            return
+        position = self.positions[index]
+        self.positions[index] = -1
+        last_index = self.indices.pop()
+        if position < len(self.indices):
+            self.indices[position] = last_index
+            self.sift(position)
+
+    def sift(self, position:int):
+        indices, positions, primary_keys, secondary_keys, sign = self.indices, self.positions, self.primary_keys, self.secondary_keys, self.sign
+        index = indices[position]
+        primary_key, secondary_key = sign * primary_keys[index], sign * secondary_keys[index]
+        # Moving up past the parents it is to be popped before:
+        while position > 0:
+            parent_position = (position - 1) >> 1
+            parent_index = indices[parent_position]
+            parent_primary_key = sign * primary_keys[parent_index]
+            if parent_primary_key < primary_key or (parent_primary_key == primary_key and sign * secondary_keys[parent_index] >= secondary_key):
+                break
+            indices[position] = parent_index
+            positions[parent_index] = position
+            position = parent_position
+        # Moving down past the children to be popped before it:
+        num_indices = len(indices)
+        while True:
+            child_position = 2 * position + 1
+            if child_position >= num_indices:
+                break
+            child_index = indices[child_position]
+            child_primary_key, child_secondary_key = sign * primary_keys[child_index], sign * secondary_keys[child_index]
+            if child_position + 1 < num_indices:
+                other_child_index = indices[child_position + 1]
+                other_child_primary_key, other_child_secondary_key = sign * primary_keys[other_child_index], sign * secondary_keys[other_child_index]
+                if other_child_primary_key < child_primary_key or (other_child_primary_key == child_primary_key and other_child_secondary_key > child_secondary_key):
+                    child_position, child_index, child_primary_key, child_secondary_key = child_position + 1, other_child_index, other_child_primary_key, other_child_secondary_key
+            if not (child_primary_key < primary_key or (child_primary_key == primary_key and child_secondary_key > secondary_key)):
+                break
+            indices[position] = child_index
+            positions[child_index] = position
+            position = child_position
+        indices[position] = index
+        positions[index] = position
+
+#================================================
+# HELPER: Compact lookup of nodes by state
+
+class StateIndex:
+    '''
+    Hash table from (non-negative integer) states to node indices, with
+    open addressing (linear probing) over 2 typed arrays. An entry takes
+    about 24 bytes (the table is kept at most half full), against about
+    100 bytes in a `dict`, where keys and values are boxed integers.
+    '''
+
+    def __init__(self, capacity:int=16):
+        self.size = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity:int):
+        self.states = array('q', [0]) * capacity
+        self.nodes = array('i', [-1]) * capacity
+        # NOTE: A node index of -1 marks an empty entry
+        self.mask = capacity - 1
+        self.shift = 64 - (capacity.bit_length() - 1)
+
+    def get_home(self, state:int) -> int:
+        # Fibonacci hashing (the top bits of a 64-bit multiplicative hash), so that consecutive states spread out:
+        return ((state * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+
+    def find(self, state:int) -> int:
+        # Gets the entry holding `state`, or the empty entry where it would be inserted:
+        states, nodes, mask = self.states, self.nodes, self.mask
+        i = ((state * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+        while nodes[i] >= 0 and states[i] != state:
+            i = (i + 1) & mask
+        return i
+
+    def get(self, state:int, default:int=-1) -> int:
+        # NOTE: Same probing as `.find`, inlined, since this is the most frequent lookup
+        states, nodes, mask = self.states, self.nodes, self.mask
+        i = ((state * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+        while True:
+            node = nodes[i]
+            if node < 0:
+                return default
+            if states[i] == state:
+                return node
+            i = (i + 1) & mask
+
+    def __setitem__(self, state:int, node:int):
+        i = self.find(state)
+        if self.nodes[i] < 0:
+            self.size += 1
+        self.states[i] = state
+        self.nodes[i] = node
+        if 2 * self.size > len(self.nodes):
+            entries = [(self.states[j], self.nodes[j]) for j in range(len(self.nodes)) if self.nodes[j] >= 0]
+            self.allocate(2 * len(self.nodes))
+            for entry_state, entry_node in entries:
+                j = self.find(entry_state)
+                self.states[j], self.nodes[j] = entry_state, entry_node
+
+    def __delitem__(self, state:int):
+        states, nodes, mask = self.states, self.nodes, self.mask
+        i = self.find(state)
+        if nodes[i] < 0:
+            raise KeyError(state)
+        nodes[i] = -1
+        self.size -= 1
+        # Shifting back the following entries of the probe run, which would otherwise no longer be found:
+        j = i
+        while True:
+            j = (j + 1) & mask
+            if nodes[j] < 0:
+                return
+            if (j - self.get_home(states[j])) & mask >= (j - i) & mask:
+                states[i], nodes[i] = states[j], nodes[j]
+                nodes[j] = -1
+                i = j
+
+#================================================
+# MAIN: Simplified memory-bounded A* (SMA*)
+
+VALID_MEMORY_BOUNDING_APPROACHES = ["sma_star", "beam"]
+
+def sma_star(start_state:int, get_successors, is_goal, get_heuristic_cost, max_num_nodes:int=100000, memory_bounding_approach="sma_star", do_get_statistics=False, max_num_successors:int=5):
+    '''
+    Simplified memory-bounded A* (SMA*) over an implicit state graph,
+    keeping at most `max_num_nodes` search tree nodes in memory.
+
+    ---
+
+    PARAMETERS:
+    - `start_state` (int): Start state, packed into an integer (e.g. as in `a_star_with_headings`)
+    - `get_successors` (function): Takes a state and gives a list of (successor state, transition cost) pairs, always in the same order
+    - `is_goal` (function): Takes a state and gives whether it is a goal state
+    - `get_heuristic_cost` (function): Takes a state and gives an admissible estimate of its cost to a goal state
+    - `max_num_nodes` (int, optional): Maximum number of search tree nodes kept in memory (at least 2)
+    - `memory_bounding_approach` (str, optional): What happens to forgotten leaves; must be one of the following:
+        - "sma_star": Their total costs are backed up, so they may be regenerated later
+        - "beam": They are pruned for good, so the frontier acts as a beam of the best `max_num_nodes` nodes \n
+          NOTE: This never re-expands nodes, but it may miss the optimal path (or any path)
+    - `do_get_statistics` (bool, optional): Get search statistics or not
+    - `max_num_successors` (int, optional): Largest number of successors of any state
+
+    RETURNS:
+    - (list[int]): States from `start_state` to a goal state; empty if none is found within the memory bound
+    - (dict, optional): Statistics; "num_expansions", "num_forgotten_nodes" and "max_num_nodes_in_memory"
+
+    ---
+
+    NOTE ON FORGETTING:
+    Whenever memory is full and a new node is to be added, the leaf with
+    the highest total cost (the shallowest among ties) is forgotten, and
+    its total cost is stored in its parent's successor slot. A node's
+    total cost is backed up to the lowest total cost among its successors
+    (in memory or forgotten), and so on for its ancestors. Hence, the
+    search returns to a forgotten subtree (by regenerating it, 1
+    successor at a time) only when it becomes the best option. Nodes
+    whose successors are all dead ends or duplicates get an infinite
+    total cost, but stay in memory (so that duplicates of them are still
+    pruned) until they are the first leaves to be forgotten.
+
+    NOTE ON COST WHILE MEMORY IS NOT FULL:
+    Until memory is first full, the search is plain A* over a tree: each
+    node is expanded once, with 1 call to `get_successors` for all its
+    successors, and nothing is ever forgotten or re-expanded. Backed-up
+    total costs and the leaf queue are only needed to choose what to
+    forget, so they are not maintained until then; when memory first
+    fills up, the total costs are backed up over the whole tree in one
+    pass, and the leaves are queued. Both queues are `IndexedHeap`s,
+    which compare total costs and depths inline and hold each node at
+    most once (4 bytes per entry), so that they never outgrow the memory
+    bound. In the benchmark below, a query then takes about 4 times as
+    long as with `a_star_with_headings` (the rest is the cost of keeping
+    nodes in typed arrays rather than dictionaries).
+
+    NOTE ON STORAGE:
+    Nodes are indices into flat typed arrays (`array.array`) of their
+    fields and successor slots, and the indices of forgotten nodes are
+    reused. Successors are not stored: only a slot's child index or
+    forgotten total cost is kept, and a forgotten successor is
+    regenerated with `get_successors`. Nodes are looked up by state (to
+    prune duplicates) in a `StateIndex`. Hence, the peak memory of a
+    query grows with `max_num_nodes` only: in the benchmark below, where
+    A* keeps 2300 to 4100 nodes per query, a cap of 2000 still finds the
+    optimal paths with less than half the peak memory of
+    `a_star_with_headings`.
+
+    NOTE ON OPTIMALITY:
+    As in SMA*, the returned path is optimal if the optimal path has
+    fewer than `max_num_nodes` states; otherwise, the best path that fits
+    in memory is returned (and none if no path fits). Paths are searched
+    as a tree, so duplicate states are pruned only against the node of
+    the same state currently in memory (if its path cost is not higher),
+    which does not affect the above guarantee.
+
+    NOTE ON THRASHING:
+    When the memory bound is well below the number of nodes A* would
+    store, SMA* may keep forgetting and regenerating the same subtrees,
+    especially on open grids with many equally costly paths (in the
+    benchmark below, a cap of 1500 already makes 1 query thrash);
+    "beam" is the fast (but inexact) alternative in such cases.
+    '''
+
+    if memory_bounding_approach not in VALID_MEMORY_BOUNDING_APPROACHES:
+        raise Exception(f"Memory bounding approach \"{memory_bounding_approach}\" is invalid: should be one of {VALID_MEMORY_BOUNDING_APPROACHES}")
+    do_remember_forgotten_costs = memory_bounding_approach == "sma_star"
+
+    statistics = {"num_expansions": 0, "num_forgotten_nodes": 0, "max_num_nodes_in_memory": 1}
+    max_num_nodes = max(max_num_nodes, 2)
+    max_depth = max_num_nodes - 1
+    num_slots = max_num_successors
+
+    #------------------------------------
+    # Initialising node storage (node i's fields are at index i of each array):
+    states = array('q')
+    parents = array('i')
+    # NOTE: -1 for the root
+    slot_indices = array('b')
+    depths = array('i')
+    path_costs = array('d')
+    total_costs = array('d')
+    num_successors = array('b')
+    # NOTE: -1 until the node is first expanded
+    num_children_in_memory = array('b')
+    slot_children = array('i')
+    slot_costs = array('d')
+    '''
+    Successor slot j of node i is at index `i * max_num_successors + j`
+    of `slot_children` and `slot_costs`, and is in one of these states:
+    - In memory: `slot_children` holds the child's index
+    - Not generated yet: `slot_children` holds -1, and `slot_costs` holds NaN
+    - Forgotten: `slot_children` holds -1, and `slot_costs` holds the child's last (backed-up) total cost \n
+      NOTE: A forgotten total cost of infinity means the child is a dead end, a duplicate or too deep, and is never regenerated
+    '''
+    empty_slot_children, empty_slot_costs = array('i', [-1] * num_slots), array('d', [np.nan] * num_slots)
+    free_nodes = []
+    nodes_by_state = StateIndex()
+    num_nodes_in_memory = 0
+
+    def allocate(state:int, parent:int, slot_index:int, path_cost:float, total_cost:float) -> int:
+        nonlocal num_nodes_in_memory
+        num_nodes_in_memory += 1
+        if free_nodes:
+            node = free_nodes.pop()
+            states[node], parents[node], slot_indices[node], depths[node] = state, parent, slot_index, 0 if parent < 0 else depths[parent] + 1
+            path_costs[node], total_costs[node], num_successors[node], num_children_in_memory[node] = path_cost, total_cost, -1, 0
+            slot_children[node * num_slots:(node + 1) * num_slots] = empty_slot_children
+            slot_costs[node * num_slots:(node + 1) * num_slots] = empty_slot_costs
+            return node
+        node = len(states)
+        states.append(state)
+        parents.append(parent)
+        slot_indices.append(slot_index)
+        depths.append(0 if parent < 0 else depths[parent] + 1)
+        path_costs.append(path_cost)
+        total_costs.append(total_cost)
+        num_successors.append(-1)
+        num_children_in_memory.append(0)
+        slot_children.extend(empty_slot_children)
+        slot_costs.extend(empty_slot_costs)
+        return node
+
+    #------------------------------------
+    # Initialising the queues:
+    open_queue = IndexedHeap(total_costs, depths)
+    # NOTE: Open nodes (which may still generate successors), ordered by lowest total cost, then deepest
+    leaf_queue = None
+    # NOTE: Leaves (nodes without children in memory), ordered by highest total cost, then shallowest; only built once memory is first full
+
+    root = allocate(start_state, -1, -1, 0, get_heuristic_cost(start_state))
+    nodes_by_state[start_state] = root
+    open_queue.push_or_update(root)
+
+    #------------------------------------
+    # Small helpers for maintaining the search tree:
+    def get_best_forgotten_slot_index(node:int) -> int:
+        # Gets the forgotten slot with the lowest (finite) total cost; -1 if there is none:
+        best_slot_index, lowest_forgotten_cost = -1, np.inf
+        for slot_index in range(num_successors[node]):
+            k = node * num_slots + slot_index
+            if slot_children[k] < 0 and slot_costs[k] < lowest_forgotten_cost:
+                best_slot_index, lowest_forgotten_cost = slot_index, slot_costs[k]
+        return best_slot_index
+
+    def get_backed_up_cost(node:int) -> float | None:
+        # Gets the lowest total cost among the node's successors (in memory or forgotten); `None` if not all are generated yet:
+        if num_successors[node] < 0:
+            return None
+        backed_up_cost = np.inf
+        for k in range(node * num_slots, node * num_slots + num_successors[node]):
+            child = slot_children[k]
+            cost = total_costs[child] if child >= 0 else slot_costs[k]
+            if cost != cost:
+                return None
+            if cost < backed_up_cost:
+                backed_up_cost = cost
+        return backed_up_cost
+
+    def forget(node:int, cost:float):
+        # Removes the node from memory, storing its total cost in its parent's slot:
+        nonlocal num_nodes_in_memory
+        num_nodes_in_memory -= 1
+        if nodes_by_state.get(states[node], -1) == node:
+            del nodes_by_state[states[node]]
+        open_queue.remove(node)
+        leaf_queue.remove(node)
+        free_nodes.append(node)
+        parent = parents[node]
+        k = parent * num_slots + slot_indices[node]
+        slot_children[k] = -1
+        slot_costs[k] = cost
+        num_children_in_memory[parent] -= 1
+        if num_children_in_memory[parent] == 0:
+            leaf_queue.push_or_update(parent)
+        if cost < np.inf and not (parent in open_queue):
+            open_queue.push_or_update(parent)
+
+    def back_up(node:int):
+        # Backs up total costs towards the root:
+        while node >= 0:
+            backed_up_cost = get_backed_up_cost(node)
+            if backed_up_cost is None or backed_up_cost == total_costs[node]:
+                return
+            total_costs[node] = backed_up_cost
+            if node in open_queue:
+                open_queue.push_or_update(node)
+            if num_children_in_memory[node] == 0:
+                leaf_queue.push_or_update(node)
+            node = parents[node]
+
+    #------------------------------------
+    # Exploring the search tree...
+    while len(open_queue) > 0:
+        node = open_queue.peek()
+        if total_costs[node] == np.inf:
+            break
+
+        # Goal test:
+        if is_goal(states[node]):
+            path = []
+            while node >= 0:
+                path.append(states[node])
+                node = parents[node]
+            return (path[::-1], statistics) if do_get_statistics else path[::-1]
+
+        # Generating all successors on the 1st expansion, else regenerating the forgotten one with the lowest total cost:
+        open_queue.pop()
+        successors = get_successors(states[node])
+        is_reexpansion = num_successors[node] >= 0
+        if is_reexpansion:
+            slot_index = get_best_forgotten_slot_index(node)
+            if slot_index < 0:
+                continue
+            generated_slot_indices = (slot_index,)
+        else:
+            if len(successors) > num_slots:
+                raise Exception(f"State {states[node]} has {len(successors)} successors: should have at most `max_num_successors` = {num_slots}")
+            num_successors[node] = len(successors)
+            statistics["num_expansions"] += 1
+            generated_slot_indices = range(len(successors))
+
+        for slot_index in generated_slot_indices:
+            successor_state, transition_cost = successors[slot_index]
+            path_cost = path_costs[node] + transition_cost
+            k = node * num_slots + slot_index
+            existing_node = nodes_by_state.get(successor_state, -1)
+            if existing_node >= 0 and path_costs[existing_node] <= path_cost:
+                # Duplicate (or cycle) no better than the node in memory:
+                slot_costs[k] = np.inf
+                continue
+            if depths[node] + 1 >= max_depth and not is_goal(successor_state):
+                # Too deep to ever reach a goal within the memory bound:
+                slot_costs[k] = np.inf
+                continue
+
+            # Making room by forgetting the worst leaf (other than the expanding node and the root):
+            if num_nodes_in_memory >= max_num_nodes:
+                if leaf_queue is None:
+                    # Memory is full for the 1st time, so the total costs are backed up over the whole tree, and the leaves are queued:
+                    # NOTE: No node has been forgotten yet, so every child has a higher index than its parent, and children are backed up first; open nodes are not expanded yet, so their total costs (and the open queue) do not change
+                    for i in range(len(states) - 1, -1, -1):
+                        backed_up_cost = get_backed_up_cost(i)
+                        if backed_up_cost is not None:
+                            total_costs[i] = backed_up_cost
+                    leaf_queue = IndexedHeap(total_costs, depths, is_reversed=True)
+                    for i in range(len(states)):
+                        if num_children_in_memory[i] == 0:
+                            leaf_queue.push_or_update(i)
+                skipped_leaves = []
+                while num_nodes_in_memory >= max_num_nodes and len(leaf_queue) > 0:
+                    leaf = leaf_queue.pop()
+                    if leaf == node or parents[leaf] < 0:
+                        skipped_leaves.append(leaf)
+                        continue
+                    leaf_parent = parents[leaf]
+                    forget(leaf, total_costs[leaf] if do_remember_forgotten_costs else np.inf)
+                    statistics["num_forgotten_nodes"] += 1
+                    if not do_remember_forgotten_costs:
+                        back_up(leaf_parent)
+                for leaf in skipped_leaves:
+                    leaf_queue.push_or_update(leaf)
+
+            child = allocate(successor_state, node, slot_index, path_cost, max(total_costs[node], path_cost + get_heuristic_cost(successor_state)))
+            slot_children[k] = child
+            if num_children_in_memory[node] == 0 and leaf_queue is not None:
+                leaf_queue.remove(node)
+            num_children_in_memory[node] += 1
+            nodes_by_state[successor_state] = child
+            if num_nodes_in_memory > statistics["max_num_nodes_in_memory"]:
+                statistics["max_num_nodes_in_memory"] = num_nodes_in_memory
+            open_queue.push_or_update(child)
+            if leaf_queue is not None:
+                leaf_queue.push_or_update(child)
+
+        # Reopening the node if forgotten successors remain, and backing up its total cost (only needed once memory has been full):
+        if is_reexpansion and not (node in open_queue) and get_best_forgotten_slot_index(node) >= 0:
+            open_queue.push_or_update(node)
+        if leaf_queue is not None:
+            back_up(node)
+
+    return ([], statistics) if do_get_statistics else []
+
+#================================================
+# MAIN: Bounded-memory A* (spatial and across time)
+
+def bounded_memory_a_star(end_position:tuple[int, int], start_position:tuple[int, int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True, max_num_nodes:int=100000, memory_bounding_approach="sma_star", do_get_statistics=False) -> list[tuple[int, int]]:
+    '''
+    SMA* pathfinding function with at most `max_num_nodes` nodes in
+    memory; same interface, transition costs and return format as
+    `a_star`.
+
+    ---
+
+    PARAMETERS:
+    - `end_position` (tuple[int, int]): Position to be reached/approached
+    - `start_position` (tuple[int, int]): Agent start position; if given as "agent", defaults to `agent.position`
+    - `agent` (Agent): Navigating agent
+    - `environment` (BasicGridEnvironment): Environment to navigate within
+    - `heuristic` (function, optional): Heuristic cost function used
+    - `penalise_turns` (bool, optional): Add turning cost or not
+    - `max_num_nodes` (int, optional): Maximum number of search tree nodes kept in memory
+    - `memory_bounding_approach` (str, optional): Either "sma_star" or "beam" (see `sma_star`)
+    - `do_get_statistics` (bool, optional): Get search statistics (as given by `sma_star`) or not
+
+    RETURNS:
+    - (list[tuple[int, int]]): Path; empty if no path fits within the memory bound
+    - (dict, optional): Statistics
+
+    ---
+
+    NOTE: States are (cell, heading) pairs packed into integers, as in `a_star_with_headings`, so that turning costs are exact edge costs.
+    '''
+
+    #------------------------------------
+    # Assigning start position if not already given:
+    if start_position == "agent":
+        start_position = tuple(agent.position)
+    start_position, end_position = tuple(start_position), tuple(end_position)
+    obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+    num_columns = environment.grid.shape[1]
+    end_cell_index = end_position[0] * num_columns + end_position[1]
+
+    #------------------------------------
+    # Defining the state graph (over keys `cell_index * NUM_HEADINGS + heading`):
+    grid = environment.grid
+    num_rows = grid.shape[0]
+
+    def get_successors(key:int) -> list[tuple[int, int]]:
+        cell_index, current_heading = divmod(key, NUM_HEADINGS)
+        row, column = divmod(cell_index, num_columns)
+        successors = []
+        for heading, (dr, dc) in enumerate(DIRECTION_VECTORS):
+            neighbour_row, neighbour_column = row + dr, column + dc
+            if neighbour_row < 0 or neighbour_row >= num_rows or neighbour_column < 0 or neighbour_column >= num_columns:
+                continue
+            if grid[neighbour_row, neighbour_column] in obstacle_symbols:
+                continue
+            # NOTE: Same transition costs as in `a_star`
+            if penalise_turns:
+                successors.append(((neighbour_row * num_columns + neighbour_column) * NUM_HEADINGS + heading, 1 if heading == current_heading else 2))
+            else:
+                successors.append(((neighbour_row * num_columns + neighbour_column) * NUM_HEADINGS + NO_HEADING, 2))
+        return successors
+
+    start_key = (start_position[0] * num_columns + start_position[1]) * NUM_HEADINGS + NO_HEADING
+    path, statistics = sma_star(start_key, get_successors, lambda key: key // NUM_HEADINGS == end_cell_index, lambda key: heuristic_cost(divmod(key // NUM_HEADINGS, num_columns), end_position), max_num_nodes, memory_bounding_approach, do_get_statistics=True, max_num_successors=len(DIRECTION_VECTORS))
+    path = [divmod(key // NUM_HEADINGS, num_columns) for key in path]
+    return (path, statistics) if do_get_statistics else path
+
+def bounded_memory_a_star_across_time(end_position:tuple[int], start_position:tuple[int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True, reservation_table:ReservationTable=None, start_time_stamp:int=0, min_goal_time_stamp:int=0, max_num_nodes:int=100000, memory_bounding_approach="sma_star", do_get_statistics=False) -> list[tuple[int, int, int]]:
+    '''
+    SMA* pathfinding function across time with at most `max_num_nodes`
+    nodes in memory; same interface, transition costs and return format
+    as `a_star_across_time`.
+
+    ---
+
+    PARAMETERS:
+    - `end_position` (tuple[int]): Position to be reached/approached
+    - `start_position` (tuple[int]): Agent start position; if given as "agent", defaults to `agent.position`
+    - `agent` (Agent): Navigating agent
+    - `environment` (BasicGridEnvironment): Environment to navigate within
+    - `heuristic` (function, optional): Heuristic cost function used
+    - `penalise_turns` (bool, optional): Add turning cost or not
+    - `reservation_table` (ReservationTable, optional): Table indicating reserved cells across time stamps (see `a_star_across_time`)
+    - `start_time_stamp` (int, optional): Time stamp at which the agent is at `start_position`
+    - `min_goal_time_stamp` (int, optional): Earliest time stamp at which reaching `end_position` counts as reaching the goal
+    - `max_num_nodes` (int, optional): Maximum number of search tree nodes kept in memory
+    - `memory_bounding_approach` (str, optional): Either "sma_star" or "beam" (see `sma_star`)
+    - `do_get_statistics` (bool, optional): Get search statistics (as given by `sma_star`) or not
+
+    RETURNS:
+    - (list[tuple[int, int, int]]): Path; empty if no path fits within the memory bound
+    - (dict, optional): Statistics
+
+    ---
+
+    NOTE: States are (cell, heading, time stamp) triples packed into integers, as in `a_star_across_time_with_headings`; waiting resets the heading.
+
+    ---
+
+    NOTE ON TERMINATION:
+    Beyond the reservation horizon (and `min_goal_time_stamp`), nothing
+    is reserved but static obstacles (see
+    `ReservationTable.get_static_obstacles`), so the problem is purely
+    spatial again: waiting is no longer needed, and states only differ
+    by their cell and heading. Hence, waits are not generated there, and
+    time stamps beyond the horizon are all packed as the 1st one (the
+    time stamps of a path are recovered from its length, since every
+    transition takes 1 time step). The state graph is thus finite, and
+    duplicates beyond the horizon are pruned as in `bounded_memory_a_star`,
+    so the search ends even if `end_position` is unreachable, without a
+    separate reachability check or any array over the whole grid. Paths
+    are also at most `max_num_nodes` states long (see `sma_star`), which
+    bounds their time stamps. The search may still regenerate forgotten
+    nodes for long when far more states than `max_num_nodes` are cheaper
+    than the optimal path (e.g. when a long wait is needed, or when
+    `end_position` is unreachable and `max_num_nodes` is well below the
+    number of reachable states).
+    '''
+
+    #------------------------------------
+    # Assigning start position if not already given:
+    if start_position == "agent":
+        start_position = tuple(agent.position)
+    start_position, end_position = tuple(start_position[:2]), tuple(end_position)
+    reservation_table = as_reservation_table(reservation_table)
+    obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+    reservation_horizon = max(get_reservation_horizon(reservation_table), min_goal_time_stamp - 1, start_time_stamp)
+    # NOTE: Time stamps beyond the horizon are packed as `reservation_horizon + 1`
+
+    #------------------------------------
+    # Defining the state graph (over keys `(time stamp * number of cells + cell_index) * NUM_HEADINGS + heading`):
+    num_columns = environment.grid.shape[1]
+    num_cells = environment.grid.shape[0] * num_columns
+
+    def unpack(key:int) -> tuple[int, int, int, int]:
+        rest, heading = divmod(key, NUM_HEADINGS)
+        time_stamp, cell_index = divmod(rest, num_cells)
+        return cell_index // num_columns, cell_index % num_columns, time_stamp, heading
+
+    def get_successors(key:int) -> list[tuple[int, int]]:
+        row, column, time_stamp, current_heading = unpack(key)
+        is_beyond_horizon = time_stamp > reservation_horizon
+        next_time_stamp = min(time_stamp + 1, reservation_horizon + 1)
+        successors = []
+        for neighbour in get_open_neighbours_at_time_stamp((row, column, time_stamp), obstacle_symbols, environment.grid, reservation_table):
+            heading = get_heading((row, column), neighbour[:2])
+            # NOTE: Same transition costs as in `a_star_across_time`
+            if heading == NO_HEADING:
+                if is_beyond_horizon:
+                    continue
+                transition_cost = 1
+            elif penalise_turns and heading == current_heading:
+                transition_cost = 2
+            else:
+                transition_cost = 3
+            successors.append((((next_time_stamp * num_cells + neighbour[0] * num_columns + neighbour[1]) * NUM_HEADINGS + (heading if penalise_turns else NO_HEADING)), transition_cost))
+        return successors
+
+    def is_goal(key:int) -> bool:
+        row, column, time_stamp, _ = unpack(key)
+        return (row, column) == end_position and time_stamp >= min_goal_time_stamp
+
+    start_key = (start_time_stamp * num_cells + start_position[0] * num_columns + start_position[1]) * NUM_HEADINGS + NO_HEADING
+    path, statistics = sma_star(start_key, get_successors, is_goal, lambda key: heuristic_cost(unpack(key)[:2], end_position), max_num_nodes, memory_bounding_approach, do_get_statistics=True, max_num_successors=len(DIRECTION_VECTORS) + 1)
+    path = [unpack(key)[:2] + (start_time_stamp + i,) for i, key in enumerate(path)]
+    return (path, statistics) if do_get_statistics else path
+
+#############################################################
+# BENCHMARKING
+#############################################################
+
+if __name__ == "__main__":
+    import tracemalloc
+    from time import perf_counter
+    from algorithm_a_star import a_star
+    from algorithm_a_star_with_headings import a_star_with_headings
+
+    def get_path_cost(path:list[tuple[int, int]]) -> int:
+        # Cost under the transition costs of `a_star` (1 for going straight, else 2):
+        return sum(1 if i > 1 and get_heading(path[i - 2], path[i - 1]) == get_heading(path[i - 1], path[i]) else 2 for i in range(1, len(path)))
+
+    def run_with_peak_memory(search_function, *args, **kwargs):
+        start_time = perf_counter()
+        search_function(*args, **kwargs)
+        duration = perf_counter() - start_time
+        tracemalloc.start()
+        result = search_function(*args, **kwargs)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, duration, peak_memory
+
+    grid_length_in_cells = 100
+    environment = BasicGridEnvironment(10, grid_length_in_cells, prng_seed=3)
+    environment.generate_random_grid(p=0.01)
+    agent = Agent(grid_length_in_cells, grid_length_in_cells)
+    free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+    prng = np.random.RandomState(seed=0)
+    queries = []
+    while len(queries) < 3:
+        start_position, end_position = (tuple(free_space_positions[k]) for k in prng.choice(len(free_space_positions), size=2, replace=False))
+        if a_star_with_headings(end_position, start_position, agent, environment) != []:
+            queries.append((start_position, end_position))
+
+    # Number of nodes that A* (over the same states) keeps in memory for each query, i.e. SMA* without a cap:
+    num_nodes_without_cap = [bounded_memory_a_star(end_position, start_position, agent, environment, max_num_nodes=10**7, do_get_statistics=True)[1]["max_num_nodes_in_memory"] for start_position, end_position in queries]
+    print(f"Nodes kept by A* over (cell, heading) states per query: {num_nodes_without_cap}")
+    node_caps = [2000, 1000, 500, 200]
+    # NOTE: All below the nodes kept by A* for every query (so every capped search forgets nodes); SMA* caps much lower than 2000 thrash here (see `sma_star`)
+    print(f"All node caps below are under the smallest of these: {max(node_caps) < min(num_nodes_without_cap)}\n")
+
+    print("Search | Node cap | Time (s) | Peak memory (KiB) | Total path cost | Optimality (optimal / found cost)")
+    # NOTE: Times are measured without `tracemalloc`, which slows down Python code unevenly
+    optimal_cost = sum(get_path_cost(a_star_with_headings(end_position, start_position, agent, environment)) for start_position, end_position in queries)
+    for label, memory_bounding_approach, max_num_nodes in [("a_star", None, None), ("a_star_with_headings", None, None), ("bounded_memory_a_star", "sma_star", 10**7), ("bounded_memory_a_star", "sma_star", node_caps[0])] + [("bounded_memory_a_star", "beam", node_cap) for node_cap in node_caps]:
+        total_cost, total_duration, peak_memory, num_failures = 0, 0, 0, 0
+        for start_position, end_position in queries:
+            if label == "a_star":
+                path, duration, memory = run_with_peak_memory(a_star, end_position, start_position, agent, environment)
+            elif label == "a_star_with_headings":
+                path, duration, memory = run_with_peak_memory(a_star_with_headings, end_position, start_position, agent, environment)
+            else:
+                path, duration, memory = run_with_peak_memory(bounded_memory_a_star, end_position, start_position, agent, environment, max_num_nodes=max_num_nodes, memory_bounding_approach=memory_bounding_approach)
+            total_duration += duration
+            peak_memory = max(peak_memory, memory)
+            if path == []:
+                num_failures += 1
+            else:
+                total_cost += get_path_cost(path)
+        print(f"{label}{'' if memory_bounding_approach is None else f' ({memory_bounding_approach})'} | {max_num_nodes} | {total_duration:.3f} | {peak_memory / 1024:.0f} | {total_cost} ({num_failures} failed) | {optimal_cost / total_cost if num_failures == 0 else float('nan'):.3f}")
@@ -0,0 +1,439 @@
+from time import perf_counter
+from algorithm_a_star_across_time import a_star_across_time
+from helpers import *
+from scenario_generator import get_connected_components
+
+#================================================
+# HELPER: Reservation table with endpoint reservations
+
+class TokenReservationTable(ReservationTable):
+    '''
+    Reservation table held in the token; a `ReservationTable` (as used by
+    the CA* functions) that additionally holds endpoint reservations.
+
+    ---
+
+    ENDPOINT RESERVATIONS:
+    In lifelong navigation, agents do not disappear at the end of their
+    paths but stay there until they are given a new path. Hence, the end
+    position of each path is reserved from its last time stamp onwards
+    (without storing an entry per time stamp).
+    - Keys: (row index, column index)
+    - Items: (index of the reserving agent, first reserved time stamp)
+
+    NOTE: Only `.get` accounts for endpoint reservations, since it is the only lookup used in `get_open_neighbours_at_time_stamp`; beyond the horizon, they are given by `.get_static_obstacles`.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.endpoints = {}
+
+    def get(self, key, default=None):
+        reserving_agent_index = dict.get(self, key, None)
+        if reserving_agent_index is not None:
+            return reserving_agent_index
+        endpoint = self.endpoints.get(key[:2], None)
+        if endpoint is not None and key[2] >= endpoint[1]:
+            return endpoint[0]
+        return default
+
+    def copy(self):
+        reservation_table = super().copy()
+        reservation_table.endpoints = dict(self.endpoints)
+        return reservation_table
+
+    def get_horizon(self) -> float:
+        # NOTE: Endpoint reservations never end, so they are static obstacles beyond the horizon rather than pushing it to infinity
+        return max(self.horizon, max((endpoint[1] - 1 for endpoint in self.endpoints.values()), default=-1))
+
+    def get_static_obstacles(self) -> frozenset:
+        return frozenset(self.endpoints)
+
+#================================================
+# HELPER: Task representation
+
+class Task:
+    '''A pickup-and-delivery task arriving at some time stamp.'''
+
+    def __init__(self, task_id:int, pickup_position:tuple[int, int], delivery_position:tuple[int, int], release_time_stamp:int):
+        self.task_id = task_id
+        self.pickup_position = tuple(pickup_position)
+        self.delivery_position = tuple(delivery_position)
+        self.release_time_stamp = release_time_stamp
+        self.agent_index = None
+        self.pickup_time_stamp = None
+        self.completion_time_stamp = None
+
+#================================================
+# MAIN: Token passing for lifelong multi-agent pickup and delivery
+
+class TokenPassing:
+    '''
+    Token Passing (TP) engine for lifelong multi-agent pickup and delivery.
+
+    The token is the shared data held by the engine: the task set, the
+    agents' current paths and the reservation table of those paths. Only
+    idle agents request the token; each is assigned the unassigned task
+    with the nearest pickup position (among the tasks whose pickup and
+    delivery positions are not the endpoints of other agents' paths)
+    and is planned against the reservation table using
+    `a_star_across_time`. Paths of other agents are never replanned.
+
+    ---
+
+    PARAMETERS:
+    - `agents` (list[Agent]): Navigating agents; their current positions are their start positions
+    - `environment` (BasicGridEnvironment): Environment to navigate within
+    - `heuristic` (function, optional): Heuristic cost function used for pathfinding and task assignment
+    - `penalise_turns` (bool, optional): Add turning cost or not
+
+    ---
+
+    EVENTS:
+    - Task arrival (`add_task`): Idle agents request the token
+    - Task completion (detected in `step`): The agent that completed its task requests the token \n
+      NOTE: Each event's planning latency is recorded in `.event_log`
+
+    ---
+
+    NOTE ON WELL-FORMEDNESS:
+    An agent is only assigned a task if neither its pickup nor delivery
+    position is the endpoint of another agent's path, and it only ends its
+    path at a position after every other path has passed through it.
+    Idle agents resting on a pickup or delivery position of an
+    unassigned task move to a free parking position. Endpoint
+    reservations never end, so a position can only be reached for good
+    if it is reachable around the endpoints of other paths; this is
+    checked (spatially, with these endpoints as static obstacles) before
+    each search across time, which would otherwise only find this out
+    after expanding every node up to the reservation horizon (beyond
+    it, the endpoints are static obstacles). The check is conservative: a path that
+    could slip through a position before another path ends there is not
+    searched for. It compares connected component labels of the free
+    space without the endpoints, which are only relabelled when the set
+    of endpoints (or the grid) changes.
+    '''
+
+    def __init__(self, agents:list[Agent], environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns:bool=True):
+        self.agents = agents
+        self.environment = environment
+        self.heuristic_cost = heuristic_cost
+        self.penalise_turns = penalise_turns
+        self.obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+
+        # Token:
+        self.time_stamp = 0
+        self.tasks = {}
+        self.unassigned_task_ids = []
+        self.reservation_table = TokenReservationTable()
+        self.paths = [[(agent.position[0], agent.position[1], 0)] for agent in agents]
+        self.agent_task_ids = [None] * len(agents)
+        for i, path in enumerate(self.paths):
+            self.reservation_table.endpoints[path[-1][:2]] = (i, 0)
+
+        # Latest time stamp at which each position is reserved by a path (needed to end paths safely):
+        self.last_reserved_time_stamps = {}
+
+        # Connected component labels of the free space with the endpoints as obstacles (see `is_reachable`):
+        self.component_labels = None
+        self.component_labels_key = None
+        # NOTE: (grid version, endpoint positions) that the labels were computed for
+
+        # Statistics:
+        self.completed_task_ids = []
+        self.event_log = []
+        '''
+        INTENDED FORMAT OF ELEMENTS:
+        (
+            event type ("arrival" or "completion"),
+            time stamp,
+            number of agents planned,
+            planning latency in seconds
+        )
+        '''
+
+    #================================================
+    # RESERVATIONS
+
+    def reserve_path(self, agent_index:int, path:list[tuple[int, int, int]]):
+        self.reservation_table.reserve_path(path, agent_index)
+        for position_with_time_stamp in path:
+            position = position_with_time_stamp[:2]
+            self.last_reserved_time_stamps[position] = max(self.last_reserved_time_stamps.get(position, 0), position_with_time_stamp[2])
+        self.reservation_table.endpoints[path[-1][:2]] = (agent_index, path[-1][2])
+
+    def is_idle(self, agent_index:int) -> bool:
+        return self.agent_task_ids[agent_index] is None and self.paths[agent_index][-1][2] <= self.time_stamp
+
+    #================================================
+    # PLANNING (ONLY FOR AGENTS REQUESTING THE TOKEN)
+
+    def plan_path(self, end_position:tuple[int, int], start_position_with_time_stamp:tuple[int, int, int], agent_index:int, do_stay_at_end:bool=True) -> list[tuple[int, int, int]]:
+        '''
+        Plans a path against the token's reservation table; if the agent is
+        to stay at `end_position`, the path ends there only after all other
+        paths have passed through it.
+        '''
+
+        if not self.is_reachable(end_position, start_position_with_time_stamp[:2]):
+            return []
+
+        min_goal_time_stamp = 0
+        if do_stay_at_end:
+            min_goal_time_stamp = self.last_reserved_time_stamps.get(end_position, -1) + 1
+
+        return a_star_across_time(
+            end_position,
+            start_position_with_time_stamp[:2],
+            self.agents[agent_index],
+            self.environment,
+            self.heuristic_cost,
+            self.penalise_turns,
+            self.reservation_table,
+            start_time_stamp=start_position_with_time_stamp[2],
+            min_goal_time_stamp=min_goal_time_stamp
+        )
+
+    def get_component_labels(self) -> np.ndarray:
+        '''
+        Gets the connected component labels of the free space with the
+        endpoints of the current paths as obstacles; they are relabelled
+        only when the set of endpoints or the grid has changed.
+        '''
+
+        key = (self.environment.grid_version, frozenset(self.reservation_table.endpoints))
+        if key != self.component_labels_key:
+            grid = self.environment.grid.copy()
+            for position in key[1]:
+                grid[position] = self.environment.permanent_obstacle_symbol
+            self.component_labels = get_connected_components(self.obstacle_symbols, grid)
+            self.component_labels_key = key
+        return self.component_labels
+
+    def is_reachable(self, end_position:tuple[int, int], start_position:tuple[int, int]) -> bool:
+        '''
+        Checks if `end_position` is reachable from `start_position` with the
+        endpoints of other paths as obstacles, by comparing their connected
+        component labels.
+        '''
+
+        if end_position in self.reservation_table.endpoints:
+            return False
+        component_labels = self.get_component_labels()
+        end_label = component_labels[end_position]
+        if end_label < 0:
+            return False
+        if start_position == end_position or component_labels[start_position] == end_label:
+            return True
+        # NOTE: The start position may itself be labelled as an obstacle (when it is another path's endpoint), so its neighbours are checked too
+        return component_labels[start_position] < 0 and any(component_labels[neighbour] == end_label for neighbour in get_open_neighbours(start_position, self.obstacle_symbols, self.environment.grid))
+
+    def get_parking_position(self, position:tuple[int, int], blocked_positions:set) -> tuple[int, int] | None:
+        '''
+        Gets the nearest (breadth-first) free position that is neither an
+        endpoint of another path nor a task's pickup or delivery position.
+        '''
+
+        queue, explored = [position], {position}
+        k = 0
+        while k < len(queue):
+            current_position = queue[k]
+            k += 1
+            if not (current_position in blocked_positions):
+                return current_position
+            for neighbour in get_open_neighbours(current_position, self.obstacle_symbols, self.environment.grid):
+                if not (neighbour in explored):
+                    explored.add(neighbour)
+                    queue.append(neighbour)
+        return None
+
+    def request_token(self, agent_index:int) -> bool:
+        '''
+        Lets an idle agent request the token: it is either assigned a task
+        (and planned for it), moved to a parking position or left resting.
+
+        ---
+
+        PARAMETERS:
+        - `agent_index` (int): Index of the idle agent
+
+        RETURNS:
+        - (bool): Whether a new path was planned
+        '''
+
+        start = (self.paths[agent_index][-1][0], self.paths[agent_index][-1][1], self.time_stamp)
+        # The agent is leaving its endpoint, so its endpoint reservation is removed while it plans:
+        del self.reservation_table.endpoints[start[:2]]
+        other_endpoints = self.reservation_table.endpoints
+
+        #------------------------------------
+        # Trying unassigned tasks in order of pickup distance:
+        candidate_task_ids = [task_id for task_id in self.unassigned_task_ids if not (self.tasks[task_id].pickup_position in other_endpoints or self.tasks[task_id].delivery_position in other_endpoints)]
+        candidate_task_ids.sort(key=lambda task_id: self.heuristic_cost(start[:2], self.tasks[task_id].pickup_position))
+        for task_id in candidate_task_ids:
+            task = self.tasks[task_id]
+            # The agent does not stay at its pickup position, so it does not need to wait for other paths to pass through it:
+            path_to_pickup = self.plan_path(task.pickup_position, start, agent_index, do_stay_at_end=False)
+            if path_to_pickup == []:
+                continue
+            # NOTE: Reserving the 1st leg before planning the 2nd leg prevents the 2nd leg from colliding with the 1st
+            last_reserved_snapshot = {position_with_time_stamp[:2]: self.last_reserved_time_stamps.get(position_with_time_stamp[:2], None) for position_with_time_stamp in path_to_pickup}
+            reservation_snapshot = {position_with_time_stamp: dict.get(self.reservation_table, position_with_time_stamp, None) for position_with_time_stamp in path_to_pickup}
+            endpoint_snapshot = self.reservation_table.endpoints.get(task.pickup_position, None)
+            self.reserve_path(agent_index, path_to_pickup)
+            del self.reservation_table.endpoints[task.pickup_position]
+            path_to_delivery = self.plan_path(task.delivery_position, path_to_pickup[-1], agent_index)
+            if path_to_delivery == []:
+                # Rolling back everything that reserving the 1st leg changed (e.g. the start position may already have been reserved by the previous path):
+                for position_with_time_stamp, reserving_agent_index in reservation_snapshot.items():
+                    if reserving_agent_index is None:
+                        del self.reservation_table[position_with_time_stamp]
+                    else:
+                        self.reservation_table[position_with_time_stamp] = reserving_agent_index
+                for position, time_stamp in last_reserved_snapshot.items():
+                    if time_stamp is None:
+                        del self.last_reserved_time_stamps[position]
+                    else:
+                        self.last_reserved_time_stamps[position] = time_stamp
+                if endpoint_snapshot is not None:
+                    self.reservation_table.endpoints[task.pickup_position] = endpoint_snapshot
+                continue
+            self.reserve_path(agent_index, path_to_delivery)
+            self.paths[agent_index] = path_to_pickup + path_to_delivery[1:]
+            self.unassigned_task_ids.remove(task_id)
+            self.agent_task_ids[agent_index] = task_id
+            task.agent_index = agent_index
+            task.pickup_time_stamp = path_to_pickup[-1][2]
+            task.completion_time_stamp = path_to_delivery[-1][2]
+            return True
+
+        #------------------------------------
+        # Moving out of the way if resting on a pickup or delivery position of an unassigned task:
+        task_positions = set()
+        for task_id in self.unassigned_task_ids:
+            task_positions.add(self.tasks[task_id].pickup_position)
+            task_positions.add(self.tasks[task_id].delivery_position)
+        if start[:2] in task_positions:
+            parking_position = self.get_parking_position(start[:2], task_positions | set(other_endpoints.keys()))
+            if parking_position is not None:
+                path = self.plan_path(parking_position, start, agent_index)
+                if path != []:
+                    self.reserve_path(agent_index, path)
+                    self.paths[agent_index] = path
+                    return True
+
+        #------------------------------------
+        # Resting at the current position:
+        self.paths[agent_index] = [start]
+        self.reserve_path(agent_index, [start])
+        return False
+
+    def handle_event(self, event_type:str):
+        # Letting all idle agents request the token (in order of agent index):
+        start_time = perf_counter()
+        num_agents_planned = 0
+        for i in range(len(self.agents)):
+            if self.is_idle(i) and len(self.unassigned_task_ids) > 0:
+                num_agents_planned += self.request_token(i)
+        self.event_log.append((event_type, self.time_stamp, num_agents_planned, perf_counter() - start_time))
+
+    #================================================
+    # EVENTS
+
+    def add_task(self, pickup_position:tuple[int, int], delivery_position:tuple[int, int]) -> int:
+        '''
+        Adds a task arriving at the current time stamp (task arrival event).
+
+        ---
+
+        PARAMETERS:
+        - `pickup_position` (tuple[int, int]): Pickup position
+        - `delivery_position` (tuple[int, int]): Delivery position
+
+        RETURNS:
+        - (int): ID of the added task
+        '''
+
+        task_id = len(self.tasks)
+        self.tasks[task_id] = Task(task_id, pickup_position, delivery_position, self.time_stamp)
+        self.unassigned_task_ids.append(task_id)
+        self.handle_event("arrival")
+        return task_id
+
+    def step(self):
+        '''
+        Advances the token by 1 time stamp, moving agents along their paths
+        and handling task completion events.
+        '''
+
+        self.time_stamp += 1
+        is_completion_event = False
+        for i, path in enumerate(self.paths):
+            k = min(self.time_stamp - path[0][2], len(path) - 1)
+            self.agents[i].position = list(path[k][:2])
+
+            # Forgetting the agent's past reservation (the table only needs to hold the present and future):
+            if k >= 1 and path[k - 1] in self.reservation_table and self.reservation_table[path[k - 1]] == i:
+                del self.reservation_table[path[k - 1]]
+
+            # Checking for task completion:
+            task_id = self.agent_task_ids[i]
+            if task_id is not None and self.tasks[task_id].completion_time_stamp <= self.time_stamp:
+                self.agent_task_ids[i] = None
+                self.completed_task_ids.append(task_id)
+                is_completion_event = True
+
+        if is_completion_event:
+            self.handle_event("completion")
+
+    #================================================
+    # STATISTICS
+
+    def get_statistics(self, time_step_size:float=0.5) -> dict:
+        '''
+        Gets throughput and planning latency statistics.
+
+        ---
+
+        PARAMETERS:
+        - `time_step_size` (float, optional): Real time (in seconds) per time step
+
+        RETURNS:
+        - (dict): Statistics
+        '''
+
+        hours_elapsed = self.time_stamp * time_step_size / 3600
+        latencies = [event[3] for event in self.event_log]
+        service_times = [self.tasks[task_id].completion_time_stamp - self.tasks[task_id].release_time_stamp for task_id in self.completed_task_ids]
+        return {
+            "num_completed_tasks": len(self.completed_task_ids),
+            "tasks_per_hour": len(self.completed_task_ids) / hours_elapsed if hours_elapsed > 0 else 0,
+            "mean_service_time_in_time_steps": float(np.mean(service_times)) if service_times else None,
+            "mean_planning_latency_in_seconds": float(np.mean(latencies)) if latencies else None,
+            "max_planning_latency_in_seconds": max(latencies) if latencies else None,
+        }
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    environment = BasicGridEnvironment(prng_seed=3)
+    environment.generate_random_grid()
+    a, b = environment.grid.shape
+    free_space_positions = [tuple(position) for position in get_free_space_positions(environment.free_space_symbol, environment.grid)]
+    prng = np.random.RandomState(seed=5)
+
+    start_positions = [free_space_positions[k] for k in prng.choice(len(free_space_positions), size=8, replace=False)]
+    agents = [Agent(a, b, position) for position in start_positions]
+    token_passing = TokenPassing(agents, environment)
+
+    for t in range(200):
+        # A new task arrives every 2 time steps on average:
+        if prng.rand() < 0.5:
+            pickup_position, delivery_position = (free_space_positions[k] for k in prng.choice(len(free_space_positions), size=2, replace=False))
+            token_passing.add_task(pickup_position, delivery_position)
+        token_passing.step()
+
+    for key, value in token_passing.get_statistics().items():
+        print(f"{key}: {value}")
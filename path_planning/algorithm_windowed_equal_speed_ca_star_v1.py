@@ -142,7 +142,7 @@ def windowed_equal_speed_ca_star_v1(end_positions:list[tuple[int]], start_positi
     while len(agent_indices) > 0:
 
         # Reservation table and counters reset every window:
-        reservation_table = {}
+        reservation_table = ReservationTable()
 
         # Reprioritise:
         indices = reprioritise(agent_indices, reprioritisation_approach, end_positions, start_positions, agents, environment)
@@ -1,10 +1,97 @@
+from time import perf_counter
 from algorithm_a_star_across_time import a_star_across_time
 from helpers import *
 
+#================================================
+# HELPER: Adaptive window sizing
+
+class AdaptiveWindowSizeController:
+    '''
+    Chooses the window size for each planning iteration of windowed CA*
+    based on the conflict rate and planning latency of the previous one.
+
+    - Conflicts are rare and latency is within budget: the window grows (fewer replanning iterations)
+    - Conflicts are frequent or latency is over budget: the window shrinks (cheaper, more reactive replanning)
+
+    ---
+
+    PARAMETERS:
+    - `initial_window_size` (int, optional): Window size of the 1st planning iteration
+    - `min_window_size` (int, optional): Smallest allowed window size (at least 2)
+    - `max_window_size` (int, optional): Largest allowed window size
+    - `low_conflict_rate` (float, optional): Conflict rate below which the window grows
+    - `high_conflict_rate` (float, optional): Conflict rate above which the window shrinks
+    - `planning_latency_budget` (float, optional): Planning time (in seconds) allowed per window; not enforced if `None`
+    - `growth_step` (int, optional): Number of time steps added when growing \n
+      NOTE: Shrinking halves the window size, i.e. the window grows additively and shrinks multiplicatively
+
+    ---
+
+    NOTE ON CONFLICT RATE:
+    `a_star_across_time` only lets an agent wait when a neighbouring
+    position is reserved, so the fraction of moving agents that wait
+    within the window is used as the conflict rate.
+
+    ---
+
+    LOGGED DATA (`.log`):
+    A list with an entry per planning iteration in the format:
+    ```
+    (
+        planned window size,
+        effective window size (after shrinking for agents reaching their goals),
+        conflict rate,
+        planning latency in seconds,
+        number of agents that reached their goals in the window,
+        throughput = number of agents that reached their goals per time step
+    )
+    ```
+    '''
+
+    def __init__(self, initial_window_size:int=10, min_window_size:int=2, max_window_size:int=64, low_conflict_rate:float=0.1, high_conflict_rate:float=0.3, planning_latency_budget:float=None, growth_step:int=2):
+        if not (2 <= min_window_size <= initial_window_size <= max_window_size):
+            raise Exception(f"Window sizes (min {min_window_size}, initial {initial_window_size}, max {max_window_size}) are invalid: should satisfy 2 <= min <= initial <= max")
+        if growth_step < 1:
+            raise Exception(f"Growth step {growth_step} is invalid: should be at least 1")
+        self.window_size = initial_window_size
+        self.min_window_size = min_window_size
+        self.max_window_size = max_window_size
+        self.low_conflict_rate = low_conflict_rate
+        self.high_conflict_rate = high_conflict_rate
+        self.planning_latency_budget = planning_latency_budget
+        self.growth_step = growth_step
+        self.log = []
+
+    def update(self, effective_window_size:int, conflict_rate:float, planning_latency:float, num_completed_agents:int) -> int:
+        '''
+        Records a finished planning iteration and chooses the next window size.
+
+        ---
+
+        PARAMETERS:
+        - `effective_window_size` (int): Window size actually used (after shrinking for agents reaching their goals)
+        - `conflict_rate` (float): Fraction of moving agents that had to wait within the window
+        - `planning_latency` (float): Time (in seconds) taken to plan the window
+        - `num_completed_agents` (int): Number of agents that reached their goals in the window
+
+        RETURNS:
+        - (int): Next window size
+        '''
+
+        throughput = num_completed_agents / max(1, effective_window_size - 1)
+        self.log.append((self.window_size, effective_window_size, conflict_rate, planning_latency, num_completed_agents, throughput))
+
+        is_over_budget = self.planning_latency_budget is not None and planning_latency > self.planning_latency_budget
+        if is_over_budget or conflict_rate > self.high_conflict_rate:
+            self.window_size = max(self.min_window_size, self.window_size // 2)
+        elif conflict_rate < self.low_conflict_rate:
+            self.window_size = min(self.max_window_size, self.window_size + self.growth_step)
+        return self.window_size
+
 #================================================
 # MAIN: Windowed equal speed CA* (one path per agent)
 
-def windowed_equal_speed_ca_star_v2(end_positions:list[tuple[int]], start_positions:list[tuple[int]], agents:list[Agent], environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns:bool=True, window_size:int=10) -> list[tuple[int, int, int]]:
+def windowed_equal_speed_ca_star_v2(end_positions:list[tuple[int]], start_positions:list[tuple[int]], agents:list[Agent], environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns:bool=True, window_size:int=10, window_size_controller:AdaptiveWindowSizeController=None) -> list[tuple[int, int, int]]:
     '''
     CA* that cooperatively navigates `agents` under these constraints:
     - Priorities are set per time window (we can either reorder them or keep them fixed)
@@ -22,6 +109,8 @@ def windowed_equal_speed_ca_star_v2(end_positions:list[tuple[int]], start_positi
     - `environment` (BasicGridEnvironment): Environment to navigate within
     - `heuristic` (function, optional): Heuristic cost function used
     - `penalise_turns` (bool, optional): Add turning cost or not
+    - `window_size` (int, optional): Number of time steps per planning window
+    - `window_size_controller` (AdaptiveWindowSizeController, optional): If given, chooses the window size per planning iteration instead of `window_size` (and logs the chosen sizes)
         
     RETURNS:
     - (list[list[tuple[int, int, int]]]): List of cooperative paths, each corresponding to an agent
@@ -44,6 +133,9 @@ def windowed_equal_speed_ca_star_v2(end_positions:list[tuple[int]], start_positi
     planning iteration by setting it as the size of the smallest path
     length among the agents who have not yet reached their goals. But
     for simplicity, this optimisation is avoided in this implementation.
+
+    Instead, `window_size_controller` can be used to resize the window
+    per planning iteration based on congestion and planning latency.
     '''
 
     paths = []
@@ -62,13 +154,15 @@ def windowed_equal_speed_ca_star_v2(end_positions:list[tuple[int]], start_positi
     # Running the CA* algorithm:
     while len(completed_agents) < len(agents):
         # Reservation table and counters reset every window:
-        reservation_table = {}
+        reservation_table = ReservationTable()
         sort_values(agent_indices, path_lengths)
         previous_indices = []
         path_lengths = []
         paths_in_window = []
-        window_size = initial_window_size
+        window_size = initial_window_size if window_size_controller is None else window_size_controller.window_size
         just_completed_agents = []
+        num_moving_agents, num_waiting_agents = 0, 0
+        window_start_time = perf_counter()
         
         #________________________
         # Loop through the agents for the next time window:
@@ -89,6 +183,11 @@ def windowed_equal_speed_ca_star_v2(end_positions:list[tuple[int]], start_positi
             
             # Storing the path length for sorting the agents accordingly next time:
             path_lengths.append(len(path))
+
+            # Counting agents that had to wait within the window (for adaptive window sizing):
+            if len(path) > 1:
+                num_moving_agents += 1
+                num_waiting_agents += any(path[j][:2] == path[j - 1][:2] for j in range(1, min(len(path), window_size)))
             
             #............
             # SETTING NEXT STARTING POINT AND ADJUSTING WINDOW SIZE IF NECESSARY
@@ -171,6 +270,12 @@ def windowed_equal_speed_ca_star_v2(end_positions:list[tuple[int]], start_positi
             paths_in_window.append(path)
             previous_indices.append(i)
         
+        #________________________
+        # Choosing the next window size (if adaptive):
+        if window_size_controller is not None:
+            conflict_rate = num_waiting_agents / num_moving_agents if num_moving_agents > 0 else 0
+            window_size_controller.update(window_size, conflict_rate, perf_counter() - window_start_time, len(just_completed_agents))
+
         #________________________
         # Append the window-specific paths to the overall paths of the agents:
         for k, path_in_window in enumerate(paths_in_window):
@@ -225,3 +330,17 @@ if __name__ == "__main__":
     paths, reservation_table = windowed_equal_speed_ca_star_v2(start_positions, end_positions, agents, environment)
     for i, path in enumerate(paths):
         print(f"\nPATH {i + 1}\n{path}\n")
+
+
+    # Adaptive window sizing on a more congested case:
+    free_space_positions = [tuple(position) for position in get_free_space_positions(environment.free_space_symbol, environment.grid)]
+    prng = np.random.RandomState(seed=6)
+    chosen_indices = prng.choice(len(free_space_positions), size=30, replace=False)
+    start_positions = [free_space_positions[k] for k in chosen_indices[:15]]
+    end_positions = [free_space_positions[k] for k in chosen_indices[15:]]
+    agents = [Agent(a, b) for _ in range(len(start_positions))]
+    window_size_controller = AdaptiveWindowSizeController(initial_window_size=10, planning_latency_budget=0.5)
+    paths = windowed_equal_speed_ca_star_v2(end_positions, start_positions, agents, environment, window_size_controller=window_size_controller)
+    print("\nWINDOW SIZE LOG (planned, effective, conflict rate, latency, completed agents, throughput)\n")
+    for entry in window_size_controller.log:
+        print(entry[:2], f"{entry[2]:.2f}", f"{entry[3]:.3f} s", entry[4], f"{entry[5]:.3f}")
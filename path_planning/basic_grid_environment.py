@@ -1,4 +1,6 @@
 import numpy as np
+from contextlib import contextmanager
+from tiled_grid import TiledGrid
 
 # EXTRA FEATURE: ANSI escape codes for better grid presentation
 COLORS = {
@@ -21,16 +23,65 @@ COLORS = {
     "reset": "\033[0m" # Resets color back to default
 }
 
+def get_grid_as_text(grid:np.ndarray, color_map:dict={}) -> str:
+    '''
+    Gets the text of a grid as displayed by `display_grid_as_text` (rows
+    backwards, each cell colored and followed by a space), as 1 string.
+
+    ---
+
+    PARAMETERS:
+    - `grid` (np.ndarray): Grid
+    - `color_map` (dict, optional): Color (ANSI escape code) of each symbol; other symbols are yellow
+
+    RETURNS:
+    - (str): Text of the grid, 1 line per row
+    '''
+
+    # Coloring each distinct symbol once, then looking up the cells' strings:
+    grid = np.asarray(grid)
+    symbols, inverse = np.unique(grid, return_inverse=True)
+    cell_strings = np.array([f"{color_map.get(symbol, COLORS["yellow"])}{symbol}{COLORS["reset"]} " for symbol in symbols], dtype=object)
+    cell_strings = cell_strings[inverse.reshape(grid.shape)]
+    return "".join("".join(row) + "\n" for row in cell_strings[::-1])
+
+class GridChangeEvent:
+    '''
+    Event published by `BasicGridEnvironment` after its grid changes.
+
+    ---
+
+    ATTRIBUTES:
+    - `grid_version` (int): Grid version after the change
+    - `dirty_regions` (list[tuple[int, int, int, int]]): Bounding boxes (start row, end row, start column, end column; ends exclusive, as in `query_obstacles`) of the changed cells
+    '''
+
+    def __init__(self, grid_version:int, dirty_regions:list[tuple[int, int, int, int]]):
+        self.grid_version = grid_version
+        self.dirty_regions = dirty_regions
+
+    def touches(self, i_1:int, i_2:int, j_1:int, j_2:int) -> bool:
+        '''Checks whether any dirty region overlaps the given region (ends exclusive).'''
+
+        return any(a_1 < i_2 and i_1 < a_2 and b_1 < j_2 and j_1 < b_2 for a_1, a_2, b_1, b_2 in self.dirty_regions)
+
 class BasicGridEnvironment:
     '''
     Basic grid environment for testing multi-agent pathfinding
     functions; this is strictly a square-celled grid, for simplicity.
+    The grid itself may be rectangular (e.g. when loaded from a map).
 
     ---
     
     PARAMETERS:
-    - `grid_length_in_meters`: Length of the square grid in meters
-    - `grid_length_in_cells`: Number of cells making a side of the square grid
+    - `grid_length_in_meters`: Length of the grid in meters (along the x-axis, i.e. across columns)
+    - `grid_length_in_cells`: Number of cells making a side of the grid (i.e. the number of columns)
+    - `prng_seed`: Seed of the PRNG used for random grids
+    - `num_rows`: Number of rows; if `None`, equals `grid_length_in_cells` (making the grid square)
+    - `grid`: Existing 2D grid of symbols (e.g. loaded from a file) to use as `.grid`; if given, the numbers of rows and columns are taken from it
+    - `grid_backend`: Storage of a new `.grid`; must be one of the following:
+        - "dense": `np.ndarray`
+        - "tiled": `TiledGrid` (only allocates tiles with obstacles, for huge, mostly free layouts)
 
     DEFAULT VALUES:
     - 10 m x 10 m warehouse
@@ -39,9 +90,17 @@ class BasicGridEnvironment:
     NOTE: Why 20? To make the minimum obstacle-forming unit 1/2 meter, which seems reasonable.
     '''
     
-    def __init__(self, grid_length_in_meters=10, grid_length_in_cells=20, prng_seed=None):
+    VALID_GRID_BACKENDS = ["dense", "tiled"]
+
+    def __init__(self, grid_length_in_meters=10, grid_length_in_cells=20, prng_seed=None, num_rows:int=None, grid:np.ndarray=None, grid_backend:str="dense"):
+        if grid_backend not in self.VALID_GRID_BACKENDS:
+            raise Exception(f"Grid backend \"{grid_backend}\" is invalid: should be one of {self.VALID_GRID_BACKENDS}")
+        if not (grid is None):
+            num_rows, grid_length_in_cells = grid.shape
         self.grid_length_in_meters = grid_length_in_meters
         self.grid_length_in_cells = grid_length_in_cells
+        self.num_rows = grid_length_in_cells if num_rows is None else num_rows
+        self.num_columns = grid_length_in_cells
         self.cell_length_in_meters = grid_length_in_meters / grid_length_in_cells
 
         '''
@@ -54,7 +113,12 @@ class BasicGridEnvironment:
         self.free_space_symbol = '.'
         self.permanent_obstacle_symbol = '#'
         self.temporary_obstacle_symbol = '+'
-        self.grid = np.array([[self.free_space_symbol] * self.grid_length_in_cells] * self.grid_length_in_cells)
+        if grid is None and grid_backend == "tiled":
+            self.grid = TiledGrid((self.num_rows, self.num_columns), self.free_space_symbol)
+        elif grid is None:
+            self.grid = np.array([[self.free_space_symbol] * self.num_columns] * self.num_rows)
+        else:
+            self.grid = grid
 
         # Creating a PRNG with the specified seed (if any) for ensuring replicability of randomised grid:
         self.prng = np.random.RandomState(seed=prng_seed)
@@ -62,6 +126,11 @@ class BasicGridEnvironment:
         # Convenience attribute (may go unused):
         self.free_space_positions = []
 
+        # Versioning of the grid (see "GRID MUTATIONS"):
+        self.grid_version = 0
+        self.subscribers = []
+        self.batched_dirty_regions = None
+
     #================================================
     def generate_random_grid(self, p:float=0.05):
         '''
@@ -73,22 +142,115 @@ class BasicGridEnvironment:
         - `p` (float): Probability of creating an obstacle at a given position
         '''
 
-        for i in range(self.grid_length_in_cells):
-            for j in range(self.grid_length_in_cells):
-                if self.grid[i, j] == self.permanent_obstacle_symbol: # This may be encountered, since we are creating obstacles that stretch beyond the current position
-                    continue
+        with self.batched_changes():
+            for i in range(self.num_rows):
+                for j in range(self.num_columns):
+                    if self.grid[i, j] == self.permanent_obstacle_symbol: # This may be encountered, since we are creating obstacles that stretch beyond the current position
+                        continue
+
+                    # Creating an obstacle with a chance of `p`:
+                    if self.prng.rand() < p:
+                        # Generating a boxy obstacle of a random size:
+                        k, K = i, i + self.prng.randint(self.num_rows // 10, self.num_rows // 5)
+                        l, L = j, j + self.prng.randint(self.num_columns // 10, self.num_columns // 5)
+                        self.set_region(k, K, l, L, self.permanent_obstacle_symbol)
+
+    #================================================
+    # GRID MUTATIONS
+    # NOTE: All changes to `.grid` should go through these methods, which bump `.grid_version` and notify subscribers of the changed regions, so caches over the grid can be invalidated (only where needed)
+
+    def subscribe(self, callback):
+        '''
+        Subscribes a function to grid changes.
+
+        ---
+
+        PARAMETERS:
+        - `callback` (function): Takes a `GridChangeEvent`; called after each change (or batch of changes)
+        '''
+
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def publish_change(self, dirty_region:tuple[int, int, int, int]):
+        if not (self.batched_dirty_regions is None):
+            self.batched_dirty_regions.append(dirty_region)
+            return
+        self.grid_version += 1
+        event = GridChangeEvent(self.grid_version, [dirty_region])
+        for callback in list(self.subscribers):
+            callback(event)
+
+    @contextmanager
+    def batched_changes(self):
+        '''
+        Context manager within which changes are collected, and then
+        published as one event with one version bump (nested batches are
+        part of the outermost one).
+        '''
+
+        if not (self.batched_dirty_regions is None):
+            yield
+            return
+        self.batched_dirty_regions = []
+        try:
+            yield
+        finally:
+            dirty_regions, self.batched_dirty_regions = self.batched_dirty_regions, None
+            if len(dirty_regions) > 0:
+                self.grid_version += 1
+                event = GridChangeEvent(self.grid_version, dirty_regions)
+                for callback in list(self.subscribers):
+                    callback(event)
+
+    def set_cell(self, cell:tuple[int, int], symbol):
+        '''Sets the symbol of a cell; publishes a change only if the symbol differs.'''
+
+        r, c = cell
+        if self.grid[r, c] != symbol:
+            self.grid[r, c] = symbol
+            self.publish_change((r, r + 1, c, c + 1))
+
+    def set_region(self, i_1:int, i_2:int, j_1:int, j_2:int, symbol):
+        '''
+        Sets the symbol of all cells in a region (clipped to the grid);
+        publishes the bounding box of the cells that actually changed.
+
+        ---
+
+        PARAMETERS:
+        - `i_1` (int): Start row index (inclusive)
+        - `i_2` (int): End row index (exclusive)
+        - `j_1` (int): Start column index (inclusive)
+        - `j_2` (int): End column index (exclusive)
+        - `symbol` (Any): Symbol to be set
+        '''
+
+        i_1, i_2 = max(i_1, 0), min(i_2, self.num_rows)
+        j_1, j_2 = max(j_1, 0), min(j_2, self.num_columns)
+        if i_1 >= i_2 or j_1 >= j_2:
+            return
+        is_changed = self.grid[i_1:i_2, j_1:j_2] != symbol
+        if not is_changed.any():
+            return
+        self.grid[i_1:i_2, j_1:j_2] = symbol
+        changed_rows, changed_columns = np.flatnonzero(is_changed.any(axis=1)), np.flatnonzero(is_changed.any(axis=0))
+        self.publish_change((i_1 + int(changed_rows[0]), i_1 + int(changed_rows[-1]) + 1, j_1 + int(changed_columns[0]), j_1 + int(changed_columns[-1]) + 1))
+
+    def set_grid(self, grid:np.ndarray):
+        '''Replaces the whole grid (of the same shape); publishes the bounding box of the changed cells.'''
 
-                # Creating an obstacle with a chance of `p`:
-                if self.prng.rand() < p:
-                    # Generating a boxy obstacle of a random size:
-                    k, K = i, i + self.prng.randint(self.grid_length_in_cells // 10, self.grid_length_in_cells // 5)
-                    l, L = j, j + self.prng.randint(self.grid_length_in_cells // 10, self.grid_length_in_cells // 5)
-                    while l < L and l < self.grid_length_in_cells:
-                        while k < K and k < self.grid_length_in_cells:
-                            self.grid[k, l] = self.permanent_obstacle_symbol
-                            k += 1
-                        k = i
-                        l += 1
+        if tuple(grid.shape) != tuple(self.grid.shape):
+            raise Exception(f"Grid shape {tuple(grid.shape)} is invalid: should be {tuple(self.grid.shape)}")
+        is_changed = np.asarray(self.grid) != np.asarray(grid)
+        if not is_changed.any():
+            return
+        self.grid[:, :] = grid
+        changed_rows, changed_columns = np.flatnonzero(is_changed.any(axis=1)), np.flatnonzero(is_changed.any(axis=0))
+        self.publish_change((int(changed_rows[0]), int(changed_rows[-1]) + 1, int(changed_columns[0]), int(changed_columns[-1]) + 1))
 
     #================================================
     # GRID DISPLAY
@@ -121,12 +283,8 @@ class BasicGridEnvironment:
         if grid is None:
             grid = self.grid
 
-        for i in range(grid.shape[0] - 1, -1, -1):
-            for j in range(grid.shape[1]):
-                key = grid[i, j]
-                color = color_map.get(key, COLORS["yellow"])
-                print(f"{color}{key}{COLORS["reset"]}", end=' ')
-            print()
+        # Building the whole text first, so that it is written at once:
+        print(get_grid_as_text(grid, color_map), end='')
     
     #================================================
     # COORDINATES AND GRID POSITION MAPPING
@@ -0,0 +1,136 @@
+import numpy as np
+from helpers import get_manhattan_distance
+
+#================================================
+# HELPER: Integrality check
+
+def is_integral(value) -> bool:
+    '''
+    Checks if a cost value is an integer (Python or NumPy integer).
+
+    ---
+
+    PARAMETERS:
+    - `value` (Any): Cost value
+
+    RETURNS:
+    - (bool): Integral or not
+    '''
+
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+def is_integral_heuristic(heuristic_cost) -> bool:
+    '''
+    Checks if a heuristic cost function is known to always return
+    integers (currently, only Manhattan distance), i.e. if the bucket
+    queue can be used by default with it.
+
+    ---
+
+    PARAMETERS:
+    - `heuristic_cost` (function): Heuristic cost function
+
+    RETURNS:
+    - (bool): Known to be integral or not
+
+    ---
+
+    NOTE: Checking the heuristic cost at the start position only is not enough, since a heuristic may return an integer there and floats elsewhere.
+    '''
+
+    return heuristic_cost is get_manhattan_distance
+
+#================================================
+# MAIN: Bucket priority queue (Dial's algorithm)
+
+class BucketPriorityQueue:
+    '''
+    Priority queue for small non-negative integer priorities, with O(1)
+    push and amortised O(1) pop-min (Dial's algorithm); a drop-in
+    replacement for the `PriorityQueue` frontiers in `a_star` and
+    `a_star_across_time`.
+
+    Items are tuples whose first element is the (integer) priority. Item
+    i is stored in bucket `priority - offset`, and a cursor marks the
+    lowest bucket that may be non-empty. Non-integer priorities are
+    rejected by `put` with an exception.
+
+    ---
+
+    NOTE ON MONOTONICITY:
+    With a consistent heuristic (e.g. Manhattan distance with transition
+    costs of at least 1), A* never pushes a priority below the last
+    popped one, so the cursor only moves forward and each bucket is
+    scanned once. Lower priorities are still handled correctly (the
+    cursor moves back), only less efficiently.
+
+    NOTE ON TIES:
+    Items of equal priority are popped last-in-first-out, which favours
+    the most recently expanded (deeper) nodes; `PriorityQueue` instead
+    breaks ties by comparing the rest of the tuples.
+    '''
+
+    def __init__(self):
+        self.buckets = []
+        self.offset = 0
+        self.cursor = 0
+        self.size = 0
+
+    def put(self, item:tuple):
+        if type(item[0]) is not int and not is_integral(item[0]):
+            raise Exception(f"Priority {item[0]!r} is invalid: should be an integer (use a `PriorityQueue` for non-integer costs, e.g. with `use_bucket_queue=False`)")
+        index = item[0] - self.offset
+        if len(self.buckets) == 0:
+            self.offset, index = item[0], 0
+        elif index < 0:
+            # Making room for a priority lower than the offset (rare):
+            self.buckets[0:0] = [[] for _ in range(-index)]
+            self.cursor -= index
+            self.offset, index = item[0], 0
+        if index >= len(self.buckets):
+            self.buckets.extend([] for _ in range(index - len(self.buckets) + 1))
+        self.buckets[index].append(item)
+        if index < self.cursor:
+            self.cursor = index
+        self.size += 1
+
+    def get(self) -> tuple:
+        buckets = self.buckets
+        cursor = self.cursor
+        while not buckets[cursor]:
+            cursor += 1
+        self.cursor = cursor
+        self.size -= 1
+        return buckets[cursor].pop()
+
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def qsize(self) -> int:
+        return self.size
+
+#############################################################
+# BENCHMARKING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from algorithm_a_star import a_star
+    from basic_grid_environment import BasicGridEnvironment
+    from agent import Agent
+
+    print("Map size | PriorityQueue (s) | BucketPriorityQueue (s) | Speed-up | Total path lengths")
+    for grid_length_in_cells in [20, 50, 100, 200]:
+        environment = BasicGridEnvironment(10, grid_length_in_cells, prng_seed=3)
+        environment.generate_random_grid(p=0.01)
+        agent = Agent(grid_length_in_cells, grid_length_in_cells)
+        free_space_positions = np.argwhere(environment.grid == environment.free_space_symbol)
+        prng = np.random.RandomState(seed=0)
+        queries = [tuple(tuple(int(x) for x in free_space_positions[k]) for k in prng.choice(len(free_space_positions), size=2, replace=False)) for _ in range(5)]
+
+        timings, path_lengths = [], []
+        for use_bucket_queue in [False, True]:
+            start_time = perf_counter()
+            path_lengths.append(sum(len(a_star(end_position, start_position, agent, environment, use_bucket_queue=use_bucket_queue)) for start_position, end_position in queries))
+            timings.append(perf_counter() - start_time)
+        print(f"{grid_length_in_cells} x {grid_length_in_cells} | {timings[0]:.4f} | {timings[1]:.4f} | {timings[0] / timings[1]:.2f}x | {path_lengths[0]}, {path_lengths[1]}")
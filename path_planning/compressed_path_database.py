@@ -0,0 +1,393 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from time import perf_counter
+from helpers import *
+from algorithm_a_star_with_headings import DIRECTION_VECTORS, NO_HEADING
+
+#================================================
+# HELPER: Free cell indexing
+
+def get_neighbour_indices(is_free:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Indexes the free cells of a grid (in row-major order) and gets the
+    index of each free cell's neighbour in each direction.
+
+    ---
+
+    PARAMETERS:
+    - `is_free` (np.ndarray): 2D boolean array marking free cells
+
+    RETURNS:
+    - (np.ndarray): Flat grid indices of the free cells (in row-major order), of the shape (number of free cells,)
+    - (np.ndarray): Neighbour indices of the shape (number of free cells, 4), ordered as in `DIRECTION_VECTORS`; -1 marks obstacles and the grid boundary
+    '''
+
+    num_rows, num_columns = is_free.shape
+    free_cell_indices = np.flatnonzero(is_free)
+    cell_to_index = np.full(num_rows * num_columns, -1, dtype=np.int64)
+    cell_to_index[free_cell_indices] = np.arange(len(free_cell_indices))
+    rows, columns = np.divmod(free_cell_indices, num_columns)
+
+    neighbour_indices = np.full((len(free_cell_indices), len(DIRECTION_VECTORS)), -1, dtype=np.int64)
+    for k, (dr, dc) in enumerate(DIRECTION_VECTORS):
+        neighbour_rows, neighbour_columns = rows + dr, columns + dc
+        is_inside = (neighbour_rows >= 0) & (neighbour_rows < num_rows) & (neighbour_columns >= 0) & (neighbour_columns < num_columns)
+        neighbour_indices[is_inside, k] = cell_to_index[neighbour_rows[is_inside] * num_columns + neighbour_columns[is_inside]]
+    return free_cell_indices, neighbour_indices
+
+def get_depth_first_order(neighbour_indices:np.ndarray) -> np.ndarray:
+    '''
+    Orders free cells by a depth-first traversal (of each connected
+    component in turn), so that cells that are consecutive in the order
+    are mostly close to each other.
+
+    ---
+
+    PARAMETERS:
+    - `neighbour_indices` (np.ndarray): Neighbour indices, as given by `get_neighbour_indices`
+
+    RETURNS:
+    - (np.ndarray): Free cell indices in depth-first order
+    '''
+
+    num_cells = len(neighbour_indices)
+    order, is_visited = [], np.zeros(num_cells, dtype=bool)
+    neighbour_lists = neighbour_indices[:, ::-1].tolist()
+    for root in range(num_cells):
+        stack = [root]
+        while stack:
+            i = stack.pop()
+            if is_visited[i]:
+                continue
+            is_visited[i] = True
+            order.append(i)
+            stack.extend(j for j in neighbour_lists[i] if j >= 0 and not is_visited[j])
+    return np.array(order, dtype=np.int64)
+
+def reorder_cells(free_cell_indices:np.ndarray, neighbour_indices:np.ndarray, order:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''Reindexes free cells (and their neighbour indices) so that cell `order[i]` becomes cell i.'''
+
+    new_indices = np.empty(len(order), dtype=np.int64)
+    new_indices[order] = np.arange(len(order))
+    reordered_neighbour_indices = np.where(neighbour_indices >= 0, new_indices[np.maximum(neighbour_indices, 0)], -1)[order]
+    return free_cell_indices[order], reordered_neighbour_indices
+
+#================================================
+# HELPER: First-move rows (the unit of work of the process pool)
+
+def get_compressed_first_move_rows(neighbour_indices:np.ndarray, source_indices:np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Computes the first-move rows of a batch of source cells and
+    compresses each row into runs of equal moves.
+
+    Row i holds, for every target cell (in free cell order), the index
+    in `DIRECTION_VECTORS` of the first move of a shortest path from
+    source i to the target; `NO_HEADING` if the target is the source
+    itself or is unreachable.
+
+    ---
+
+    PARAMETERS:
+    - `neighbour_indices` (np.ndarray): Neighbour indices, as given by `get_neighbour_indices`
+    - `source_indices` (np.ndarray): Free cell indices of the sources
+
+    RETURNS:
+    - (np.ndarray): Number of runs in each row
+    - (np.ndarray): Target index at which each run starts (all rows concatenated)
+    - (np.ndarray): Move of each run (all rows concatenated)
+
+    ---
+
+    NOTE ON BATCHING:
+    Breadth-first searches from all sources in the batch are run
+    together, one distance level per iteration. In each level, every
+    unvisited cell "pulls" the first move of a neighbour on the frontier
+    (or, next to the source, the move from the source to itself). The
+    number of Python-level iterations is hence only the largest distance,
+    regardless of the number of sources.
+    '''
+
+    num_sources, num_cells = len(source_indices), len(neighbour_indices)
+    batch_indices = np.arange(num_sources)
+    first_moves = np.full((num_sources, num_cells), -1, dtype=np.int8)
+    first_moves[batch_indices, source_indices] = NO_HEADING
+    frontier = np.zeros((num_sources, num_cells), dtype=bool)
+    frontier[batch_indices, source_indices] = True
+    is_source = frontier.copy()
+
+    while frontier.any():
+        next_frontier = np.zeros_like(frontier)
+        for k in range(len(DIRECTION_VECTORS)):
+            # The neighbour in direction k moves in the opposite direction to reach the cell:
+            neighbours = neighbour_indices[:, k]
+            has_neighbour = neighbours >= 0
+            is_pulled = np.zeros_like(frontier)
+            is_pulled[:, has_neighbour] = frontier[:, neighbours[has_neighbour]]
+            is_pulled &= (first_moves == -1)
+            if not is_pulled.any():
+                continue
+            opposite_direction = (k + 2) % len(DIRECTION_VECTORS)
+            pulled_moves = np.full(first_moves.shape, opposite_direction, dtype=np.int8)
+            pulled_moves[:, has_neighbour] = np.where(is_source[:, neighbours[has_neighbour]], opposite_direction, first_moves[:, neighbours[has_neighbour]])
+            first_moves[is_pulled] = pulled_moves[is_pulled]
+            next_frontier |= is_pulled
+        frontier = next_frontier
+    first_moves[first_moves == -1] = NO_HEADING
+
+    # Run-length compression of each row:
+    is_run_start = np.ones(first_moves.shape, dtype=bool)
+    is_run_start[:, 1:] = first_moves[:, 1:] != first_moves[:, :-1]
+    row_ids, run_starts = np.nonzero(is_run_start)
+    return np.bincount(row_ids, minlength=num_sources), run_starts.astype(np.int32), first_moves[row_ids, run_starts].astype(np.uint8)
+
+#================================================
+# MAIN: Compressed Path Database (CPD)
+
+class CompressedPathDatabase:
+    '''
+    Compressed Path Database (CPD) of a static map: for every (source,
+    target) pair of free cells, the first move of a shortest path,
+    stored as one run-length compressed row per source. Next moves and
+    full paths are then served without any search.
+
+    ---
+
+    PARAMETERS:
+    - `grid_shape` (tuple[int, int]): Shape of the grid
+    - `free_cell_indices` (np.ndarray): Flat grid indices of the free cells, in target order
+    - `row_offsets` (np.ndarray): Index of the first run of each source row, with the total number of runs appended
+    - `run_starts` (np.ndarray): Target index at which each run starts
+    - `run_moves` (np.ndarray): Move of each run (index in `DIRECTION_VECTORS`, or `NO_HEADING`)
+    - `build_time` (float, optional): Time taken to build the database (in seconds)
+
+    ---
+
+    NOTE ON COMPRESSION:
+    Targets are ordered depth-first (see `get_depth_first_order`) rather
+    than row by row, so that consecutive targets are mostly close to each
+    other and share first moves; on random maps, this cuts the number of
+    runs per row several times over.
+
+    NOTE ON QUERIES:
+    A next-move query is a constant-time lookup of the source row plus
+    a binary search over its runs (which are few in practice).
+
+    NOTE ON COSTS:
+    Paths are shortest in the number of moves (4-connected, unit
+    costs); turns are not penalised, unlike in `a_star`. Among equally
+    short paths, the ones found first in `DIRECTION_VECTORS` order win.
+    The database only holds for the static map it was built for; any
+    change in obstacles requires a rebuild.
+
+    NOTE ON GRID CHANGES:
+    A database built from an environment (or loaded for one) subscribes
+    to its grid changes, and its queries raise once any free cell turns
+    into an obstacle or vice versa, rather than return stale moves.
+    '''
+
+    def __init__(self, grid_shape:tuple[int, int], free_cell_indices:np.ndarray, row_offsets:np.ndarray, run_starts:np.ndarray, run_moves:np.ndarray, build_time:float=None):
+        self.grid_shape = tuple(int(x) for x in grid_shape)
+        self.free_cell_indices = free_cell_indices
+        self.row_offsets = row_offsets
+        self.run_starts = run_starts
+        self.run_moves = run_moves
+        self.build_time = build_time
+        self.cell_to_index = np.full(self.grid_shape[0] * self.grid_shape[1], -1, dtype=np.int64)
+        self.cell_to_index[free_cell_indices] = np.arange(len(free_cell_indices))
+        self.is_free = (self.cell_to_index >= 0).reshape(self.grid_shape)
+        self.is_stale = False
+
+    #------------------------------------
+    # Building, saving and loading:
+
+    @classmethod
+    def build(cls, environment:BasicGridEnvironment, num_workers:int=None, num_sources_per_task:int=64):
+        '''
+        Builds the database of an environment, in parallel across sources.
+
+        ---
+
+        PARAMETERS:
+        - `environment` (BasicGridEnvironment): Environment (with a static grid)
+        - `num_workers` (int, optional): Number of worker processes; if `None`, the number of CPUs; if 1, no process pool is used
+        - `num_sources_per_task` (int, optional): Number of source rows computed per task (memory per task grows with it)
+
+        RETURNS:
+        - (CompressedPathDatabase): Database
+        '''
+
+        start_time = perf_counter()
+        is_free = ~np.isin(environment.grid, [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol])
+        free_cell_indices, neighbour_indices = get_neighbour_indices(is_free)
+        free_cell_indices, neighbour_indices = reorder_cells(free_cell_indices, neighbour_indices, get_depth_first_order(neighbour_indices))
+        source_batches = np.array_split(np.arange(len(free_cell_indices)), max(1, int(np.ceil(len(free_cell_indices) / num_sources_per_task))))
+        compute_rows = partial(get_compressed_first_move_rows, neighbour_indices)
+
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        if num_workers == 1 or len(source_batches) == 1:
+            results = list(map(compute_rows, source_batches))
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                results = list(executor.map(compute_rows, source_batches))
+
+        row_lengths = np.concatenate([result[0] for result in results])
+        row_offsets = np.zeros(len(free_cell_indices) + 1, dtype=np.int64)
+        np.cumsum(row_lengths, out=row_offsets[1:])
+        run_starts = np.concatenate([result[1] for result in results])
+        run_moves = np.concatenate([result[2] for result in results])
+        database = cls(is_free.shape, free_cell_indices, row_offsets, run_starts, run_moves, build_time=perf_counter() - start_time)
+        database.subscribe_to(environment)
+        return database
+
+    def save(self, file_path:str):
+        '''Saves the database as an uncompressed `.npz` file (the rows are already compressed).'''
+
+        np.savez(file_path, grid_shape=np.array(self.grid_shape), free_cell_indices=self.free_cell_indices, row_offsets=self.row_offsets, run_starts=self.run_starts, run_moves=self.run_moves)
+
+    @classmethod
+    def load(cls, file_path:str, environment:BasicGridEnvironment=None):
+        '''Loads a database saved by `.save`; if an environment is given, checks that the database was built for it, and subscribes to its grid changes.'''
+
+        with np.load(file_path) as data:
+            database = cls(data["grid_shape"], data["free_cell_indices"], data["row_offsets"], data["run_starts"], data["run_moves"])
+        if not (environment is None):
+            if not database.is_built_for(environment):
+                raise Exception(f"Database \"{file_path}\" is invalid: it was not built for the free space of the given environment")
+            database.subscribe_to(environment)
+        return database
+
+    def is_built_for(self, environment:BasicGridEnvironment) -> bool:
+        '''Checks if the database was built for the current free space of an environment.'''
+
+        is_free = ~np.isin(environment.grid, [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol])
+        return is_free.shape == self.grid_shape and np.array_equal(np.flatnonzero(is_free), np.sort(self.free_cell_indices))
+
+    def subscribe_to(self, environment:BasicGridEnvironment):
+        '''Makes the database stale (see the note on grid changes) once the free space of an environment changes.'''
+
+        self.environment = environment
+        environment.subscribe(self.on_grid_change)
+
+    def on_grid_change(self, event:GridChangeEvent):
+        if not self.is_stale and has_free_space_changed(event, self.environment, self.is_free):
+            self.is_stale = True
+
+    #------------------------------------
+    # Queries:
+
+    def get_first_move(self, source_index:int, target_index:int) -> int:
+        row_start, row_end = self.row_offsets[source_index], self.row_offsets[source_index + 1]
+        run_index = row_start + np.searchsorted(self.run_starts[row_start:row_end], target_index, side="right") - 1
+        return int(self.run_moves[run_index])
+
+    def next_move(self, start_position:tuple[int, int], end_position:tuple[int, int]) -> tuple[int, int]:
+        '''
+        Gets the next position along a shortest path, without any search.
+
+        ---
+
+        PARAMETERS:
+        - `start_position` (tuple[int, int]): Current position
+        - `end_position` (tuple[int, int]): Position to be reached
+
+        RETURNS:
+        - (tuple[int, int]): Next position; `None` if `start_position` is `end_position`, or if `end_position` is unreachable (or not free)
+        '''
+
+        if self.is_stale:
+            raise Exception("Database is stale: the free space of its environment changed after it was built (rebuild it with `CompressedPathDatabase.build`)")
+        source_index = self.cell_to_index[start_position[0] * self.grid_shape[1] + start_position[1]]
+        target_index = self.cell_to_index[end_position[0] * self.grid_shape[1] + end_position[1]]
+        if source_index < 0 or target_index < 0:
+            return None
+        move = self.get_first_move(source_index, target_index)
+        if move == NO_HEADING:
+            return None
+        return (start_position[0] + DIRECTION_VECTORS[move][0], start_position[1] + DIRECTION_VECTORS[move][1])
+
+    def get_path(self, start_position:tuple[int, int], end_position:tuple[int, int]) -> list[tuple[int, int]]:
+        '''
+        Extracts a full shortest path by following next moves.
+
+        ---
+
+        PARAMETERS:
+        - `start_position` (tuple[int, int]): Start position
+        - `end_position` (tuple[int, int]): End position
+
+        RETURNS:
+        - (list[tuple[int, int]]): Path (in the same format as `a_star`); empty if `end_position` is unreachable
+        '''
+
+        position, end_position = tuple(start_position), tuple(end_position)
+        path = [position]
+        while position != end_position:
+            position = self.next_move(position, end_position)
+            if position is None:
+                return []
+            path.append(position)
+        return path
+
+    #------------------------------------
+    # Reporting:
+
+    def get_report(self) -> dict:
+        '''
+        Gets the build time and size of the database.
+
+        ---
+
+        RETURNS:
+        - (dict): Report with the following keys:
+            - "num_free_cells": Number of free cells (sources and targets)
+            - "num_runs": Total number of runs
+            - "mean_runs_per_row": Mean number of runs per source row
+            - "compressed_size_in_bytes": Size of the stored arrays
+            - "uncompressed_size_in_bytes": Size of the full first-move table (1 byte per pair)
+            - "compression_ratio": Uncompressed size divided by compressed size
+            - "build_time_in_seconds": Build time (`None` if loaded from disk)
+        '''
+
+        num_free_cells = len(self.free_cell_indices)
+        compressed_size = self.free_cell_indices.nbytes + self.row_offsets.nbytes + self.run_starts.nbytes + self.run_moves.nbytes
+        uncompressed_size = num_free_cells * num_free_cells
+        return {
+            "num_free_cells": num_free_cells,
+            "num_runs": len(self.run_starts),
+            "mean_runs_per_row": len(self.run_starts) / max(num_free_cells, 1),
+            "compressed_size_in_bytes": compressed_size,
+            "uncompressed_size_in_bytes": uncompressed_size,
+            "compression_ratio": uncompressed_size / compressed_size,
+            "build_time_in_seconds": self.build_time
+        }
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    import tempfile
+
+    print("Map size | Free cells | Build time (s) | Compressed size (KiB) | Uncompressed size (KiB) | Ratio | Mean runs per row")
+    for grid_length_in_cells in [20, 50, 100]:
+        environment = BasicGridEnvironment(10, grid_length_in_cells, prng_seed=3)
+        environment.generate_random_grid()
+        compressed_path_database = CompressedPathDatabase.build(environment)
+        report = compressed_path_database.get_report()
+        print(f"{grid_length_in_cells} x {grid_length_in_cells} | {report['num_free_cells']} | {report['build_time_in_seconds']:.3f} | {report['compressed_size_in_bytes'] / 1024:.1f} | {report['uncompressed_size_in_bytes'] / 1024:.1f} | {report['compression_ratio']:.1f} | {report['mean_runs_per_row']:.1f}")
+
+        # Round trip through the disk, and checking path lengths against exact distances:
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "cpd.npz")
+            compressed_path_database.save(file_path)
+            compressed_path_database = CompressedPathDatabase.load(file_path)
+        assert compressed_path_database.is_built_for(environment)
+        free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+        prng = np.random.RandomState(seed=0)
+        queries = [tuple(tuple(free_space_positions[k]) for k in prng.choice(len(free_space_positions), size=2, replace=False)) for _ in range(50)]
+        distance_fields = get_distance_fields([end_position for _, end_position in queries], [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol], environment.grid)
+        for (start_position, end_position), distance_field in zip(queries, distance_fields):
+            path = compressed_path_database.get_path(start_position, end_position)
+            assert len(path) - 1 == distance_field[start_position] or (path == [] and distance_field[start_position] == -1)
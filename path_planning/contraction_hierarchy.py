@@ -0,0 +1,385 @@
+from heapq import heappush, heappop
+from time import perf_counter
+from helpers import *
+from compressed_path_database import get_neighbour_indices
+
+#================================================
+# HELPER: Witness search
+
+def get_witness_distances(adjacency:list[dict], source:int, excluded_node:int, targets:dict, max_cost:int, max_num_settled_nodes:int) -> dict:
+    '''
+    Bounded Dijkstra search from `source` that avoids `excluded_node`,
+    used to check whether a shortcut through `excluded_node` is needed.
+
+    ---
+
+    PARAMETERS:
+    - `adjacency` (list[dict]): Remaining (not yet contracted) graph; item i maps each neighbour of node i to the edge weight
+    - `source` (int): Node to search from
+    - `excluded_node` (int): Node being contracted
+    - `targets` (dict): Nodes to be reached, mapped to the cost through `excluded_node`
+    - `max_cost` (int): Cost beyond which the search stops
+    - `max_num_settled_nodes` (int): Number of settled nodes beyond which the search stops
+
+    RETURNS:
+    - (dict): Distances of the nodes found from `source` (without passing through `excluded_node`)
+    '''
+
+    distances = {source: 0}
+    frontier = [(0, source)]
+    num_targets_left, num_settled_nodes = len(targets), 0
+    while frontier and num_targets_left > 0 and num_settled_nodes < max_num_settled_nodes:
+        distance, node = heappop(frontier)
+        if distance > distances[node]:
+            continue
+        if distance > max_cost:
+            break
+        num_settled_nodes += 1
+        if node in targets:
+            num_targets_left -= 1
+        for neighbour, weight in adjacency[node].items():
+            if neighbour == excluded_node:
+                continue
+            new_distance = distance + weight
+            if new_distance < distances.get(neighbour, np.inf):
+                distances[neighbour] = new_distance
+                heappush(frontier, (new_distance, neighbour))
+    return distances
+
+def get_shortcuts(adjacency:list[dict], node:int, max_num_settled_nodes:int) -> list[tuple[int, int, int]]:
+    '''
+    Gets the shortcuts needed to contract a node: one per pair of its
+    neighbours whose shortest connection passes through it.
+
+    ---
+
+    PARAMETERS:
+    - `adjacency` (list[dict]): Remaining (not yet contracted) graph
+    - `node` (int): Node to contract
+    - `max_num_settled_nodes` (int): Settled node limit of each witness search \n
+      NOTE: If a witness search is cut short, the shortcut is added anyway (this keeps queries exact, at the cost of some redundant shortcuts)
+
+    RETURNS:
+    - (list[tuple[int, int, int]]): Shortcuts as (neighbour 1, neighbour 2, weight)
+    '''
+
+    shortcuts = []
+    neighbours = list(adjacency[node].items())
+    for i, (u, weight_to_u) in enumerate(neighbours):
+        targets = {w: weight_to_u + weight_to_w for w, weight_to_w in neighbours[i + 1:]}
+        if len(targets) == 0:
+            continue
+        distances = get_witness_distances(adjacency, u, node, targets, max(targets.values()), max_num_settled_nodes)
+        for w, cost in targets.items():
+            if distances.get(w, np.inf) > cost:
+                shortcuts.append((u, w, cost))
+    return shortcuts
+
+#================================================
+# MAIN: Contraction hierarchy
+
+VALID_NODE_ORDERING_APPROACHES = ["edge_difference", "degree", "random"]
+
+class ContractionHierarchy:
+    '''
+    Contraction hierarchy (CH) over the free cells of a static grid
+    (4-connected, unit costs), for exact distance and path queries
+    without searching the raw grid.
+
+    Nodes (free cells) are contracted one by one in the chosen order;
+    contracting a node adds shortcut edges between its remaining
+    neighbours wherever it lies on their only shortest connection. A
+    query then runs Dijkstra's algorithm from both ends over "upward"
+    edges only (towards later contracted nodes), and the two searches
+    meet at the highest node of a shortest path.
+
+    ---
+
+    PARAMETERS:
+    - `environment` (BasicGridEnvironment): Environment (with a static grid)
+    - `node_ordering_approach` (str, optional): Order of contraction; must be one of the following:
+        - "edge_difference": Lowest (number of shortcuts added - number of edges removed + number of contracted neighbours) first, with lazy updates \n
+          NOTE: Slowest to build, but gives the fewest shortcuts and the fastest queries
+        - "degree": Lowest (number of remaining neighbours + number of contracted neighbours) first, with lazy updates
+        - "random": Random order
+    - `max_num_settled_nodes` (int, optional): Settled node limit of each witness search
+    - `search_space_cache_size` (int, optional): Number of upward search spaces kept in memory for reuse by later queries (0 to disable)
+    - `prng_seed` (int, optional): Seed for the "random" node ordering approach
+
+    ---
+
+    NOTE ON STORAGE:
+    The upward edges (original and shortcut) are stored in NumPy arrays
+    in compressed sparse row form: the upward edges of node i are at
+    indices `upward_offsets[i]` to `upward_offsets[i + 1]` of
+    `upward_targets`, `upward_weights` and `upward_middles`, where the
+    middle node of a shortcut (used to unpack it) is -1 for original
+    edges. Since the grid graph is undirected, the same upward edges
+    serve both search directions.
+
+    NOTE ON COSTS:
+    As in `CompressedPathDatabase`, paths are shortest in the number of
+    moves; turns are not penalised, unlike in `a_star`.
+
+    NOTE ON GRID CHANGES:
+    As with `CompressedPathDatabase`, the hierarchy subscribes to the
+    environment's grid changes, and its queries raise once any free cell
+    turns into an obstacle or vice versa (contraction is not incremental).
+    '''
+
+    def __init__(self, environment:BasicGridEnvironment, node_ordering_approach:str="edge_difference", max_num_settled_nodes:int=50, search_space_cache_size:int=10000, prng_seed:int=None):
+        if node_ordering_approach not in VALID_NODE_ORDERING_APPROACHES:
+            raise Exception(f"Node ordering approach \"{node_ordering_approach}\" is invalid: should be one of {VALID_NODE_ORDERING_APPROACHES}")
+
+        start_time = perf_counter()
+        is_free = ~np.isin(environment.grid, [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol])
+        self.environment = environment
+        self.is_free = is_free
+        self.grid_shape = is_free.shape
+        self.free_cell_indices, neighbour_indices = get_neighbour_indices(is_free)
+        self.cell_to_index = np.full(is_free.size, -1, dtype=np.int64)
+        self.cell_to_index[self.free_cell_indices] = np.arange(len(self.free_cell_indices))
+        num_nodes = len(self.free_cell_indices)
+
+        #------------------------------------
+        # Initialising the remaining graph:
+        adjacency = [{int(j): 1 for j in row if j >= 0} for row in neighbour_indices]
+        middles = {}
+        # NOTE: Keys: (lower node index, higher node index) of a shortcut; Items: Middle node
+        num_contracted_neighbours = np.zeros(num_nodes, dtype=np.int64)
+        prng = np.random.RandomState(seed=prng_seed)
+        random_priorities = prng.permutation(num_nodes)
+        def get_priority(node:int) -> int:
+            if node_ordering_approach == "edge_difference":
+                return len(get_shortcuts(adjacency, node, max_num_settled_nodes)) - len(adjacency[node]) + num_contracted_neighbours[node]
+            if node_ordering_approach == "degree":
+                return len(adjacency[node]) + num_contracted_neighbours[node]
+            return random_priorities[node]
+
+        #------------------------------------
+        # Contracting nodes in order of priority (lazily updated):
+        self.ranks = np.zeros(num_nodes, dtype=np.int64)
+        upward_edges = [None] * num_nodes
+        queue = [(get_priority(node), node) for node in range(num_nodes)]
+        queue.sort()
+        rank = 0
+        while queue:
+            _, node = heappop(queue)
+            if queue:
+                priority = get_priority(node)
+                if priority > queue[0][0]:
+                    heappush(queue, (priority, node))
+                    continue
+
+            for u, w, cost in get_shortcuts(adjacency, node, max_num_settled_nodes):
+                if cost < adjacency[u].get(w, np.inf):
+                    adjacency[u][w] = adjacency[w][u] = cost
+                    middles[(min(u, w), max(u, w))] = node
+            upward_edges[node] = [(neighbour, weight, middles.get((min(node, neighbour), max(node, neighbour)), -1)) for neighbour, weight in adjacency[node].items()]
+            for neighbour in adjacency[node]:
+                del adjacency[neighbour][node]
+                num_contracted_neighbours[neighbour] += 1
+            adjacency[node] = {}
+            self.ranks[node] = rank
+            rank += 1
+
+        #------------------------------------
+        # Storing the upward edges in NumPy arrays:
+        self.upward_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in upward_edges], out=self.upward_offsets[1:])
+        all_edges = np.array([edge for edges in upward_edges for edge in edges], dtype=np.int64).reshape(-1, 3)
+        self.upward_targets = all_edges[:, 0].astype(np.int32)
+        self.upward_weights = all_edges[:, 1].astype(np.int32)
+        self.upward_middles = all_edges[:, 2].astype(np.int32)
+        self.num_shortcuts = int(np.count_nonzero(self.upward_middles >= 0))
+        self.build_time = perf_counter() - start_time
+
+        # Python lists of (target, weight) per node, for fast Dijkstra steps in queries:
+        self.upward_lists = [list(zip(self.upward_targets[self.upward_offsets[i]:self.upward_offsets[i + 1]].tolist(), self.upward_weights[self.upward_offsets[i]:self.upward_offsets[i + 1]].tolist())) for i in range(num_nodes)]
+        self.search_space_cache_size = search_space_cache_size
+        self.search_spaces = {}
+        self.is_stale = False
+        environment.subscribe(self.on_grid_change)
+
+    def on_grid_change(self, event:GridChangeEvent):
+        if not self.is_stale and has_free_space_changed(event, self.environment, self.is_free):
+            self.is_stale = True
+
+    #------------------------------------
+    # Queries:
+
+    def get_node(self, position:tuple[int, int]) -> int:
+        if self.is_stale:
+            raise Exception("Contraction hierarchy is stale: the free space of its environment changed after it was built (build a new one)")
+        return int(self.cell_to_index[position[0] * self.grid_shape[1] + position[1]])
+
+    def get_upward_search_space(self, node:int) -> tuple[dict, dict]:
+        '''
+        Runs Dijkstra's algorithm from a node over upward edges only.
+
+        ---
+
+        PARAMETERS:
+        - `node` (int): Node index
+
+        RETURNS:
+        - (dict): Distances of the reached nodes
+        - (dict): Parents of the reached nodes
+        '''
+
+        if node in self.search_spaces:
+            return self.search_spaces[node]
+        distances, parents = {node: 0}, {node: -1}
+        frontier = [(0, node)]
+        upward_lists = self.upward_lists
+        while frontier:
+            distance, current_node = heappop(frontier)
+            if distance > distances[current_node]:
+                continue
+            for neighbour, weight in upward_lists[current_node]:
+                new_distance = distance + weight
+                if new_distance < distances.get(neighbour, np.inf):
+                    distances[neighbour] = new_distance
+                    parents[neighbour] = current_node
+                    heappush(frontier, (new_distance, neighbour))
+        if self.search_space_cache_size > 0:
+            if len(self.search_spaces) >= self.search_space_cache_size:
+                # Evicting the oldest search space:
+                del self.search_spaces[next(iter(self.search_spaces))]
+            self.search_spaces[node] = (distances, parents)
+        return distances, parents
+
+    def get_meeting_node(self, start_node:int, end_node:int) -> tuple[int, int, dict, dict]:
+        forward_distances, forward_parents = self.get_upward_search_space(start_node)
+        backward_distances, backward_parents = self.get_upward_search_space(end_node)
+        if len(backward_distances) < len(forward_distances):
+            smaller_distances, larger_distances = backward_distances, forward_distances
+        else:
+            smaller_distances, larger_distances = forward_distances, backward_distances
+        best_distance, meeting_node = -1, -1
+        for node, distance in smaller_distances.items():
+            other_distance = larger_distances.get(node, None)
+            if other_distance is not None and (best_distance < 0 or distance + other_distance < best_distance):
+                best_distance, meeting_node = distance + other_distance, node
+        return best_distance, meeting_node, forward_parents, backward_parents
+
+    def get_distance(self, start_position:tuple[int, int], end_position:tuple[int, int]) -> int:
+        '''
+        Gets the shortest distance (number of moves) between 2 positions.
+
+        ---
+
+        PARAMETERS:
+        - `start_position` (tuple[int, int]): Start position
+        - `end_position` (tuple[int, int]): End position
+
+        RETURNS:
+        - (int): Distance; -1 if `end_position` is unreachable (or either position is not free)
+        '''
+
+        start_node, end_node = self.get_node(start_position), self.get_node(end_position)
+        if start_node < 0 or end_node < 0:
+            return -1
+        return self.get_meeting_node(start_node, end_node)[0]
+
+    def get_middle(self, u:int, w:int) -> int:
+        # The edge is stored among the upward edges of its lower ranked end:
+        lower, higher = (u, w) if self.ranks[u] < self.ranks[w] else (w, u)
+        for i in range(self.upward_offsets[lower], self.upward_offsets[lower + 1]):
+            if self.upward_targets[i] == higher:
+                return int(self.upward_middles[i])
+        raise Exception(f"No edge between nodes {u} and {w}")
+
+    def unpack_edge(self, u:int, w:int) -> list[int]:
+        '''Unpacks an (original or shortcut) edge into the nodes of the underlying grid path, from `u` to `w`.'''
+
+        middle = self.get_middle(u, w)
+        if middle < 0:
+            return [u, w]
+        return self.unpack_edge(u, middle)[:-1] + self.unpack_edge(middle, w)
+
+    def get_path(self, start_position:tuple[int, int], end_position:tuple[int, int]) -> list[tuple[int, int]]:
+        '''
+        Gets a shortest path between 2 positions, with shortcuts unpacked.
+
+        ---
+
+        PARAMETERS:
+        - `start_position` (tuple[int, int]): Start position
+        - `end_position` (tuple[int, int]): End position
+
+        RETURNS:
+        - (list[tuple[int, int]]): Path (in the same format as `a_star`); empty if `end_position` is unreachable
+        '''
+
+        start_node, end_node = self.get_node(start_position), self.get_node(end_position)
+        if start_node < 0 or end_node < 0:
+            return []
+        distance, meeting_node, forward_parents, backward_parents = self.get_meeting_node(start_node, end_node)
+        if distance < 0:
+            return []
+
+        # Chaining the upward edges of both searches through the meeting node:
+        nodes = [meeting_node]
+        while forward_parents[nodes[0]] >= 0:
+            nodes.insert(0, forward_parents[nodes[0]])
+        while backward_parents[nodes[-1]] >= 0:
+            nodes.append(backward_parents[nodes[-1]])
+
+        path_nodes = [start_node]
+        for u, w in zip(nodes[:-1], nodes[1:]):
+            path_nodes.extend(self.unpack_edge(u, w)[1:])
+        rows, columns = np.divmod(self.free_cell_indices[path_nodes], self.grid_shape[1])
+        return list(zip(rows.tolist(), columns.tolist()))
+
+    #------------------------------------
+    # Reporting:
+
+    def get_report(self) -> dict:
+        '''Gets the build time and size of the hierarchy, as a dict with the keys "num_nodes", "num_upward_edges", "num_shortcuts", "size_in_bytes" and "build_time_in_seconds".'''
+
+        return {
+            "num_nodes": len(self.free_cell_indices),
+            "num_upward_edges": len(self.upward_targets),
+            "num_shortcuts": self.num_shortcuts,
+            "size_in_bytes": self.upward_offsets.nbytes + self.upward_targets.nbytes + self.upward_weights.nbytes + self.upward_middles.nbytes,
+            "build_time_in_seconds": self.build_time
+        }
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from algorithm_a_star import a_star
+
+    print("Map size | Ordering | Build time (s) | Shortcuts | a_star query (us) | CH query, uncached (us) | CH query, cached (us)")
+    for grid_length_in_cells in [50, 100]:
+        environment = BasicGridEnvironment(10, grid_length_in_cells, prng_seed=3)
+        environment.generate_random_grid()
+        agent = Agent(grid_length_in_cells, grid_length_in_cells)
+        free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+        prng = np.random.RandomState(seed=0)
+        queries = [tuple(tuple(free_space_positions[k]) for k in prng.choice(len(free_space_positions), size=2, replace=False)) for _ in range(200)]
+        distance_fields = get_distance_fields([end_position for _, end_position in queries], [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol], environment.grid)
+
+        start_time = perf_counter()
+        for start_position, end_position in queries[:20]:
+            a_star(end_position, start_position, agent, environment)
+        a_star_query_time = (perf_counter() - start_time) / 20
+
+        for node_ordering_approach in VALID_NODE_ORDERING_APPROACHES:
+            contraction_hierarchy = ContractionHierarchy(environment, node_ordering_approach, prng_seed=0)
+            query_times = []
+            for _ in range(2):
+                start_time = perf_counter()
+                distances = [contraction_hierarchy.get_distance(start_position, end_position) for start_position, end_position in queries]
+                query_times.append((perf_counter() - start_time) / len(queries))
+
+            # Checking distances and path lengths against exact distances:
+            for (start_position, end_position), distance, distance_field in zip(queries, distances, distance_fields):
+                assert distance == distance_field[start_position]
+                path = contraction_hierarchy.get_path(start_position, end_position)
+                assert len(path) - 1 == distance and all(get_manhattan_distance(a, b) == 1 for a, b in zip(path[:-1], path[1:])) or (path == [] and distance == -1)
+            report = contraction_hierarchy.get_report()
+            print(f"{grid_length_in_cells} x {grid_length_in_cells} | {node_ordering_approach} | {report['build_time_in_seconds']:.2f} | {report['num_shortcuts']} | {a_star_query_time * 1e6:.0f} | {query_times[0] * 1e6:.0f} | {query_times[1] * 1e6:.0f}")
@@ -0,0 +1,449 @@
+from heapq import heappush, heappop
+from helpers import *
+from compressed_path_database import get_neighbour_indices
+
+#================================================
+# HELPER: Corridor reservations
+
+class CorridorReservationTable:
+    '''
+    Reservation table over a `CorridorGraph`, where each corridor is a
+    single reservation unit: an agent reserves a whole corridor for the
+    interval it spends in it, instead of one cell per time stamp.
+
+    ---
+
+    PARAMETERS:
+    - `corridor_graph` (CorridorGraph): Graph whose junctions and corridors are reserved
+
+    ---
+
+    RESERVATIONS:
+    - `.junctions`: Keys: (junction index, time stamp); Items: Index of the reserving agent
+    - `.corridors`: Keys: Corridor index; Items: List of (first time stamp, last time stamp, index of the reserving agent)
+
+    A corridor interval spans from the time stamp at which the agent
+    leaves a junction to enter the corridor until the time stamp at which
+    it reaches the next junction (both inclusive). Hence, 2 agents can
+    never be in the same corridor at once, which rules out head-on and
+    swap conflicts in narrow aisles (at the cost of agents not following
+    each other through a corridor).
+    '''
+
+    def __init__(self, corridor_graph):
+        self.corridor_graph = corridor_graph
+        self.junctions = {}
+        self.corridors = {}
+        self.horizon = -1
+
+    def is_junction_free(self, junction_index:int, time_stamp:int, agent_index:int=None) -> bool:
+        reserving_agent_index = self.junctions.get((junction_index, time_stamp), None)
+        return reserving_agent_index is None or reserving_agent_index == agent_index
+
+    def is_corridor_free(self, corridor_index:int, first_time_stamp:int, last_time_stamp:int, agent_index:int=None) -> bool:
+        for reserved_first_time_stamp, reserved_last_time_stamp, reserving_agent_index in self.corridors.get(corridor_index, []):
+            if reserved_first_time_stamp <= last_time_stamp and first_time_stamp <= reserved_last_time_stamp and reserving_agent_index != agent_index:
+                return False
+        return True
+
+    def reserve_junction(self, junction_index:int, time_stamp:int, agent_index:int):
+        self.junctions[(junction_index, time_stamp)] = agent_index
+        self.horizon = max(self.horizon, time_stamp)
+
+    def reserve_corridor(self, corridor_index:int, first_time_stamp:int, last_time_stamp:int, agent_index:int):
+        self.corridors.setdefault(corridor_index, []).append((first_time_stamp, last_time_stamp, agent_index))
+        self.horizon = max(self.horizon, last_time_stamp)
+
+    def reserve_path(self, path:list[tuple[int, int, int]], agent_index:int):
+        '''
+        Reserves the junctions and corridors of a path with time stamps
+        (such as one given by `CorridorGraph.find_path_across_time`).
+
+        ---
+
+        PARAMETERS:
+        - `path` (list[tuple[int, int, int]]): Path with time stamps
+        - `agent_index` (int): Index of the agent following the path
+        '''
+
+        corridor_graph = self.corridor_graph
+        corridor_index, first_time_stamp = -1, None
+        for i, (r, c, t) in enumerate(path):
+            junction_index = corridor_graph.cell_to_junction[r, c]
+            if junction_index >= 0:
+                self.reserve_junction(junction_index, t, agent_index)
+                if corridor_index >= 0:
+                    # Leaving a corridor (the interval includes the arrival at the junction):
+                    self.reserve_corridor(corridor_index, first_time_stamp, t, agent_index)
+                    corridor_index = -1
+                elif i > 0 and path[i - 1][:2] != (r, c):
+                    # Direct move between adjacent junctions:
+                    self.reserve_corridor(corridor_graph.get_corridor_between(corridor_graph.cell_to_junction[path[i - 1][0], path[i - 1][1]], junction_index), t - 1, t, agent_index)
+            elif corridor_index < 0:
+                # Entering a corridor (the interval includes the departure from the junction, if any):
+                corridor_index = corridor_graph.cell_to_corridor[r, c]
+                first_time_stamp = t - 1 if i > 0 else t
+        if corridor_index >= 0:
+            # The path ends inside a corridor:
+            self.reserve_corridor(corridor_index, first_time_stamp, path[-1][2], agent_index)
+
+#================================================
+# MAIN: Corridor/junction graph
+
+class CorridorGraph:
+    '''
+    Topological graph of the free space of a grid: junction nodes (free
+    cells with other than 2 free neighbours) and weighted corridor edges
+    (chains of free cells with exactly 2 free neighbours each, between 2
+    junctions). Aisles of warehouse-like layouts thus become single
+    edges, and both spatial and space-time searches run over far fewer
+    nodes than the grid has free cells.
+
+    ---
+
+    PARAMETERS:
+    - `environment` (BasicGridEnvironment): Environment (with a static grid)
+
+    ---
+
+    MAPPINGS:
+    - `.junction_cells` (np.ndarray): Cell of each junction, of the shape (number of junctions, 2)
+    - `.corridor_ends` (np.ndarray): Junction indices at both ends of each corridor, of the shape (number of corridors, 2)
+    - `.corridor_weights` (np.ndarray): Number of moves from one end of each corridor to the other
+    - `.corridor_cells` (list[list[tuple[int, int]]]): Cells inside each corridor, ordered from its 1st end to its 2nd end (empty for adjacent junctions)
+    - `.cell_to_junction` (np.ndarray): Grid-shaped array of junction indices (-1 elsewhere)
+    - `.cell_to_corridor` (np.ndarray): Grid-shaped array of corridor indices (-1 elsewhere)
+    - `.cell_to_corridor_offset` (np.ndarray): Grid-shaped array of each corridor cell's index in `corridor_cells` (-1 elsewhere)
+    - `.adjacency` (list[list[tuple[int, int]]]): (neighbouring junction index, corridor index) pairs of each junction
+
+    NOTE: A closed loop of corridor cells (without any junction) gets one of its cells as a junction.
+
+    ---
+
+    NOTE ON COSTS:
+    Costs are numbers of moves (time steps), without turning costs, as
+    in `ContractionHierarchy`; agents wait only at junctions.
+
+    NOTE ON GRID CHANGES:
+    As with `ContractionHierarchy`, the graph subscribes to the
+    environment's grid changes, and its searches raise once any free
+    cell turns into an obstacle or vice versa (corridor indices held by
+    reservation tables would not survive a rebuild).
+    '''
+
+    def __init__(self, environment:BasicGridEnvironment):
+        is_free = ~np.isin(environment.grid, [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol])
+        self.environment = environment
+        self.is_free = is_free
+        self.grid_shape = is_free.shape
+        free_cell_indices, neighbour_indices = get_neighbour_indices(is_free)
+        self.num_free_cells = len(free_cell_indices)
+        rows, columns = np.divmod(free_cell_indices, self.grid_shape[1])
+        neighbour_lists = [[j for j in row if j >= 0] for row in neighbour_indices.tolist()]
+        is_junction = np.array([len(neighbours) != 2 for neighbours in neighbour_lists], dtype=bool)
+        is_traced = is_junction.copy()
+
+        #------------------------------------
+        # Tracing the corridors leaving each junction:
+        junction_indices = {}
+        corridor_ends, corridor_weights, corridor_cells = [], [], []
+        def trace_from(junction:int):
+            for neighbour in neighbour_lists[junction]:
+                if is_junction[neighbour]:
+                    if junction < neighbour:
+                        corridor_ends.append((junction, neighbour))
+                        corridor_cells.append([])
+                    continue
+                if is_traced[neighbour]:
+                    continue
+                previous, current, chain = junction, neighbour, []
+                while not is_junction[current]:
+                    chain.append(current)
+                    is_traced[current] = True
+                    previous, current = current, next((j for j in neighbour_lists[current] if j != previous), previous)
+                corridor_ends.append((junction, current))
+                corridor_cells.append(chain)
+        for junction in np.flatnonzero(is_junction).tolist():
+            trace_from(junction)
+        for cell in range(self.num_free_cells):
+            # Closed loops of corridor cells:
+            if not is_traced[cell]:
+                is_junction[cell] = is_traced[cell] = True
+                trace_from(cell)
+
+        #------------------------------------
+        # Building the mappings:
+        junction_cell_ids = np.flatnonzero(is_junction)
+        cell_id_to_junction = np.full(self.num_free_cells, -1, dtype=np.int64)
+        cell_id_to_junction[junction_cell_ids] = np.arange(len(junction_cell_ids))
+        self.junction_cells = np.stack([rows[junction_cell_ids], columns[junction_cell_ids]], axis=1)
+        self.cell_to_junction = np.full(self.grid_shape, -1, dtype=np.int64)
+        self.cell_to_junction[self.junction_cells[:, 0], self.junction_cells[:, 1]] = np.arange(len(junction_cell_ids))
+
+        self.corridor_ends = cell_id_to_junction[np.array(corridor_ends, dtype=np.int64).reshape(-1, 2)]
+        self.corridor_weights = np.array([len(chain) + 1 for chain in corridor_cells], dtype=np.int64)
+        self.corridor_cells = [list(zip(rows[chain].tolist(), columns[chain].tolist())) for chain in corridor_cells]
+        self.cell_to_corridor = np.full(self.grid_shape, -1, dtype=np.int64)
+        self.cell_to_corridor_offset = np.full(self.grid_shape, -1, dtype=np.int64)
+        for corridor_index, chain in enumerate(corridor_cells):
+            self.cell_to_corridor[rows[chain], columns[chain]] = corridor_index
+            self.cell_to_corridor_offset[rows[chain], columns[chain]] = np.arange(len(chain))
+
+        self.adjacency = [[] for _ in range(len(junction_cell_ids))]
+        self.direct_corridors = {}
+        for corridor_index, (u, v) in enumerate(self.corridor_ends.tolist()):
+            self.adjacency[u].append((v, corridor_index))
+            if u != v:
+                self.adjacency[v].append((u, corridor_index))
+            if len(corridor_cells[corridor_index]) == 0:
+                self.direct_corridors[(min(u, v), max(u, v))] = corridor_index
+        self.is_stale = False
+        environment.subscribe(self.on_grid_change)
+
+    def on_grid_change(self, event:GridChangeEvent):
+        if not self.is_stale and has_free_space_changed(event, self.environment, self.is_free):
+            self.is_stale = True
+
+    #------------------------------------
+    # Helpers:
+
+    def get_corridor_between(self, u:int, v:int) -> int:
+        '''Gets the corridor (without inner cells) between 2 adjacent junctions.'''
+
+        return self.direct_corridors[(min(u, v), max(u, v))]
+
+    def get_corridor_entries(self, position:tuple[int, int]) -> list[tuple[int, int, int]]:
+        '''
+        Gets how a position connects to the junction graph.
+
+        ---
+
+        PARAMETERS:
+        - `position` (tuple[int, int]): Free cell
+
+        RETURNS:
+        - (list[tuple[int, int, int]]): (junction index, corridor index, number of moves) triples; for a junction, only (its index, -1, 0)
+        '''
+
+        if self.is_stale:
+            raise Exception("Corridor graph is stale: the free space of its environment changed after it was built (build a new one)")
+        junction_index = self.cell_to_junction[position[0], position[1]]
+        if junction_index >= 0:
+            return [(int(junction_index), -1, 0)]
+        corridor_index = int(self.cell_to_corridor[position[0], position[1]])
+        if corridor_index < 0:
+            return []
+        offset = int(self.cell_to_corridor_offset[position[0], position[1]])
+        u, v = self.corridor_ends[corridor_index].tolist()
+        return [(u, corridor_index, offset + 1), (v, corridor_index, len(self.corridor_cells[corridor_index]) - offset)]
+
+    def get_cells_between(self, corridor_index:int, from_offset:int, to_offset:int) -> list[tuple[int, int]]:
+        '''
+        Gets the cells of a corridor strictly after `from_offset` and up to
+        `to_offset` (inclusive), in the order of travel; offsets -1 and the
+        number of corridor cells stand for the 1st and 2nd end junctions.
+        '''
+
+        cells = self.corridor_cells[corridor_index]
+        u, v = self.corridor_ends[corridor_index].tolist()
+        get_cell = lambda offset: tuple(self.junction_cells[u].tolist()) if offset < 0 else tuple(self.junction_cells[v].tolist()) if offset >= len(cells) else cells[offset]
+        step = 1 if to_offset > from_offset else -1
+        return [get_cell(offset) for offset in range(from_offset + step, to_offset + step, step)]
+
+    def get_report(self) -> dict:
+        '''Gets the node counts of the graph, as a dict with the keys "num_free_cells", "num_junctions", "num_corridors" and "node_reduction" (free cells per junction).'''
+
+        return {
+            "num_free_cells": self.num_free_cells,
+            "num_junctions": len(self.junction_cells),
+            "num_corridors": len(self.corridor_ends),
+            "node_reduction": self.num_free_cells / max(len(self.junction_cells), 1)
+        }
+
+    #------------------------------------
+    # Searches:
+
+    def find_path_across_time(self, end_position:tuple[int, int], start_position:tuple[int, int], reservation_table:CorridorReservationTable=None, start_time_stamp:int=0, agent_index:int=None) -> list[tuple[int, int, int]]:
+        '''
+        A* search over (junction, time stamp) states that respects junction
+        and corridor reservations; an agent waits only at junctions, and
+        traverses a corridor only if no other agent is in it meanwhile.
+
+        ---
+
+        PARAMETERS:
+        - `end_position` (tuple[int, int]): Position to be reached
+        - `start_position` (tuple[int, int]): Agent start position
+        - `reservation_table` (CorridorReservationTable, optional): Reservations of other agents; if `None`, the search is purely spatial
+        - `start_time_stamp` (int, optional): Time stamp at which the agent is at `start_position`
+        - `agent_index` (int, optional): Index of the agent (its own reservations are ignored)
+
+        RETURNS:
+        - (list[tuple[int, int, int]]): Path with time stamps, cell by cell (as in `a_star_across_time`); empty if no path is found
+
+        NOTE: An agent starting inside a corridor must be able to leave it
+        (or reach its goal in it) at once, since it cannot wait there.
+        '''
+
+        start_position, end_position = tuple(start_position), tuple(end_position)
+        if start_position == end_position:
+            return [(start_position[0], start_position[1], start_time_stamp)]
+        if reservation_table is None:
+            reservation_table = CorridorReservationTable(self)
+        start_entries, end_entries = self.get_corridor_entries(start_position), self.get_corridor_entries(end_position)
+        if len(start_entries) == 0 or len(end_entries) == 0:
+            return []
+        end_entries_by_junction = {}
+        for junction_index, corridor_index, distance in end_entries:
+            end_entries_by_junction.setdefault(junction_index, []).append((corridor_index, distance))
+        GOAL = -1
+
+        #------------------------------------
+        # Initialising the frontier with the ways out of the start position:
+        parents = {}
+        # NOTE: Keys: (junction index or GOAL, time stamp); Items: (previous state, corridor index used or -1 for waiting or starting, corridor offsets travelled from and to)
+        # NOTE: Offsets -1 and the number of corridor cells stand for the 1st and 2nd end junctions of a corridor
+        frontier = []
+        def push(state:tuple[int, int], previous_state:tuple[int, int], corridor_index:int, from_offset:int=0, to_offset:int=0):
+            if state in parents:
+                return
+            parents[state] = (previous_state, corridor_index, from_offset, to_offset)
+            heuristic_cost = 0 if state[0] == GOAL else get_manhattan_distance(self.junction_cells[state[0]], end_position)
+            heappush(frontier, (state[1] - start_time_stamp + heuristic_cost, state))
+
+        start_corridor_index = -1 if start_entries[0][1] < 0 else start_entries[0][1]
+        if start_corridor_index >= 0:
+            # Starting inside a corridor: leaving through either end, or going straight to a goal in the same corridor
+            start_offset = int(self.cell_to_corridor_offset[start_position])
+            for (junction_index, corridor_index, distance), end_offset in zip(start_entries, [-1, len(self.corridor_cells[start_corridor_index])]):
+                t = start_time_stamp + distance
+                if reservation_table.is_corridor_free(corridor_index, start_time_stamp, t, agent_index) and reservation_table.is_junction_free(junction_index, t, agent_index):
+                    push((junction_index, t), None, corridor_index, start_offset, end_offset)
+            if self.cell_to_corridor[end_position] == start_corridor_index:
+                end_offset = int(self.cell_to_corridor_offset[end_position])
+                t = start_time_stamp + abs(end_offset - start_offset)
+                if reservation_table.is_corridor_free(start_corridor_index, start_time_stamp, t, agent_index):
+                    push((GOAL, t), None, start_corridor_index, start_offset, end_offset)
+        else:
+            push((start_entries[0][0], start_time_stamp), None, -1)
+
+        #------------------------------------
+        # Exploring the frontier until it is empty...
+        is_expanded = set()
+        goal_state = None
+        while frontier:
+            _, state = heappop(frontier)
+            if state[0] == GOAL:
+                goal_state = state
+                break
+            if state in is_expanded:
+                continue
+            is_expanded.add(state)
+            junction_index, t = state
+
+            # Reaching the goal (at this junction, or inside an adjacent corridor):
+            for corridor_index, distance in end_entries_by_junction.get(junction_index, []):
+                if corridor_index < 0:
+                    goal_state = state
+                    break
+                if reservation_table.is_corridor_free(corridor_index, t, t + distance, agent_index):
+                    from_offset = -1 if distance == int(self.cell_to_corridor_offset[end_position]) + 1 and self.corridor_ends[corridor_index][0] == junction_index else len(self.corridor_cells[corridor_index])
+                    push((GOAL, t + distance), state, corridor_index, from_offset, int(self.cell_to_corridor_offset[end_position]))
+            if goal_state is not None:
+                break
+
+            # Waiting (only useful before the reservation horizon):
+            if t < reservation_table.horizon and reservation_table.is_junction_free(junction_index, t + 1, agent_index):
+                push((junction_index, t + 1), state, -1)
+
+            # Traversing corridors:
+            for neighbour, corridor_index in self.adjacency[junction_index]:
+                arrival_time_stamp = t + int(self.corridor_weights[corridor_index])
+                if reservation_table.is_corridor_free(corridor_index, t, arrival_time_stamp, agent_index) and reservation_table.is_junction_free(neighbour, arrival_time_stamp, agent_index):
+                    num_corridor_cells = len(self.corridor_cells[corridor_index])
+                    is_forward = self.corridor_ends[corridor_index][0] == junction_index
+                    push((neighbour, arrival_time_stamp), state, corridor_index, -1 if is_forward else num_corridor_cells, num_corridor_cells if is_forward else -1)
+
+        if goal_state is None:
+            return []
+
+        #------------------------------------
+        # Expanding the junction-level plan into cells:
+        states = [goal_state]
+        while parents[states[0]][0] is not None:
+            states.insert(0, parents[states[0]][0])
+        path = [(start_position[0], start_position[1], start_time_stamp)]
+        for state in states:
+            _, corridor_index, from_offset, to_offset = parents[state]
+            if corridor_index < 0:
+                # Waiting (or starting at a junction):
+                if state[1] > path[-1][2]:
+                    junction_cell = self.junction_cells[state[0]].tolist()
+                    path.append((junction_cell[0], junction_cell[1], state[1]))
+                continue
+            t = path[-1][2]
+            path.extend((r, c, t + i + 1) for i, (r, c) in enumerate(self.get_cells_between(corridor_index, from_offset, to_offset)))
+        return path
+
+    def find_path(self, end_position:tuple[int, int], start_position:tuple[int, int]) -> list[tuple[int, int]]:
+        '''
+        Spatial shortest path search over the junction graph.
+
+        ---
+
+        PARAMETERS:
+        - `end_position` (tuple[int, int]): Position to be reached
+        - `start_position` (tuple[int, int]): Agent start position
+
+        RETURNS:
+        - (list[tuple[int, int]]): Path (in the same format as `a_star`); empty if no path is found
+        '''
+
+        return [position[:2] for position in self.find_path_across_time(end_position, start_position)]
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from algorithm_a_star import a_star
+    from solution_validation import is_conflict_free
+
+    # Warehouse-like layout: shelves (2 cells wide) separated by 1-cell aisles, with cross aisles:
+    grid_length_in_cells = 60
+    environment = BasicGridEnvironment(10, grid_length_in_cells, prng_seed=0)
+    with environment.batched_changes():
+        for r in range(1, grid_length_in_cells - 1):
+            if r % 15 == 0:
+                continue
+            for c in range(1, grid_length_in_cells - 2, 3):
+                environment.set_region(r, r + 1, c, c + 2, environment.permanent_obstacle_symbol)
+    agent = Agent(grid_length_in_cells, grid_length_in_cells)
+
+    corridor_graph = CorridorGraph(environment)
+    print(f"REPORT\n{corridor_graph.get_report()}\n")
+
+    # Spatial queries against a_star and exact distances:
+    free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+    prng = np.random.RandomState(seed=0)
+    queries = [tuple(tuple(free_space_positions[k]) for k in prng.choice(len(free_space_positions), size=2, replace=False)) for _ in range(50)]
+    distance_fields = get_distance_fields([end_position for _, end_position in queries], [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol], environment.grid)
+    timings = []
+    for search_function in [lambda end_position, start_position: a_star(end_position, start_position, agent, environment), corridor_graph.find_path]:
+        start_time = perf_counter()
+        paths = [search_function(end_position, start_position) for start_position, end_position in queries]
+        timings.append(perf_counter() - start_time)
+    for path, (start_position, end_position), distance_field in zip(paths, queries, distance_fields):
+        assert path[0] == start_position and path[-1] == end_position and len(path) - 1 == distance_field[start_position]
+        assert all(get_manhattan_distance(a, b) == 1 for a, b in zip(path[:-1], path[1:]))
+    print(f"a_star: {timings[0]:.3f} s, corridor graph: {timings[1]:.3f} s (for {len(queries)} queries)\n")
+
+    # Space-time queries with corridor reservations:
+    reservation_table = CorridorReservationTable(corridor_graph)
+    paths = []
+    for agent_index, (start_position, end_position) in enumerate(queries[:20]):
+        path = corridor_graph.find_path_across_time(end_position, start_position, reservation_table, agent_index=agent_index)
+        reservation_table.reserve_path(path, agent_index)
+        paths.append(path)
+    print(f"Planned {sum(path != [] for path in paths)} of {len(paths)} agents; conflict-free: {is_conflict_free(paths)}")
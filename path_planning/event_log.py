@@ -0,0 +1,377 @@
+import os
+from contextlib import contextmanager
+from time import perf_counter
+from helpers import *
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa, pq = None, None
+
+#================================================
+# EVENTS
+
+EVENT_TYPES = ["move", "wait", "arrival", "replan", "planner_timing"]
+# NOTE: Events are stored with the index of their type in `EVENT_TYPES` (as "event_type")
+EVENT_TYPE_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+EVENT_RECORD = np.dtype([("time_stamp", "<i8"), ("event_type", "u1"), ("agent_index", "<i4"), ("row", "<i4"), ("column", "<i4"), ("value", "<f8")])
+'''
+NOTE ON EVENT FIELDS:
+- "time_stamp": Simulation time stamp of the event
+- "event_type": Index of the event type in `EVENT_TYPES`
+- "agent_index": Agent concerned (-1 if none)
+- "row", "column": Position of the agent after the event (-1 if none)
+- "value": Event-specific value; the new path length for "replan", and the planning time in seconds for "planner_timing"
+'''
+
+def get_event_type_code(event_type:str) -> int:
+    try:
+        return EVENT_TYPE_CODES[event_type]
+    except KeyError:
+        raise Exception(f"Event type \"{event_type}\" is invalid: should be one of {EVENT_TYPES}")
+
+#================================================
+# LOG FORMATS
+
+VALID_LOG_FORMATS = ["auto", "arrow", "parquet", "binary"]
+'''
+NOTE ON LOG FORMATS:
+- "arrow": Arrow IPC file, 1 record batch per chunk; memory-mapped on reading, with no copies (needs `pyarrow`)
+- "parquet": Parquet file, 1 row group per chunk; compressed, hence the smallest, but decoded on reading (needs `pyarrow`)
+- "binary": A 16-byte header (see `BINARY_EVENT_LOG_HEADER`) followed by the events as `EVENT_RECORD` records; memory-mapped on reading with `np.memmap` (needs only NumPy)
+- "auto": "arrow" if `pyarrow` is installed, else "binary"
+
+NumPy's own `.npz` archives are zip files, which cannot be appended to
+or memory-mapped, hence the plain "binary" fallback: chunks are simply
+appended to the file, and a log cut short (e.g. by a crash) can still
+be read up to its last complete chunk.
+'''
+
+BINARY_EVENT_LOG_MAGIC = b"EVLG"
+BINARY_EVENT_LOG_HEADER = np.dtype([("magic", "S4"), ("version", "<u4"), ("record_size", "<u4"), ("reserved", "<u4")])
+
+def get_arrow_schema():
+    return pa.schema([(name, pa.from_numpy_dtype(EVENT_RECORD.fields[name][0])) for name in EVENT_RECORD.names])
+
+#================================================
+# MAIN: Streaming event log writer
+
+class EventLogWriter:
+    '''
+    Streaming recorder of simulation events (agent moves, waits,
+    arrivals, replans and planner timings). Events are buffered in a
+    fixed-size record array and written to the file 1 chunk at a time,
+    so memory use stays bounded however long the run is.
+
+    ---
+
+    PARAMETERS:
+    - `file_path` (str): Path of the log file to be written
+    - `log_format` (str, optional): Log format; must be one of `VALID_LOG_FORMATS`
+    - `chunk_size` (int, optional): Number of events buffered before being written as 1 chunk
+    '''
+
+    def __init__(self, file_path:str, log_format:str="auto", chunk_size:int=65536):
+        if log_format not in VALID_LOG_FORMATS:
+            raise Exception(f"Log format \"{log_format}\" is invalid: should be one of {VALID_LOG_FORMATS}")
+        if log_format == "auto":
+            log_format = "binary" if pa is None else "arrow"
+        if log_format != "binary" and pa is None:
+            raise Exception(f"Log format \"{log_format}\" needs `pyarrow`, which is not installed; use \"binary\" instead")
+
+        self.file_path = file_path
+        self.log_format = log_format
+        self.buffer = np.zeros(chunk_size, dtype=EVENT_RECORD)
+        self.num_buffered_events = 0
+        self.counters = {"num_events": 0, "num_chunks": 0}
+
+        if log_format == "arrow":
+            self.sink = pa.OSFile(file_path, "wb")
+            self.writer = pa.ipc.new_file(self.sink, get_arrow_schema())
+        elif log_format == "parquet":
+            self.writer = pq.ParquetWriter(file_path, get_arrow_schema())
+        else:
+            self.writer = open(file_path, "wb")
+            self.writer.write(np.array([(BINARY_EVENT_LOG_MAGIC, 1, EVENT_RECORD.itemsize, 0)], dtype=BINARY_EVENT_LOG_HEADER).tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    #================================================
+    # RECORDING
+
+    def record(self, event_type:str, time_stamp:int, agent_index:int=-1, position:tuple[int, int]=(-1, -1), value:float=0.0):
+        '''Records a single event (see `EVENT_RECORD` for the fields).'''
+
+        if self.num_buffered_events == len(self.buffer):
+            self.flush()
+        self.buffer[self.num_buffered_events] = (time_stamp, get_event_type_code(event_type), agent_index, position[0], position[1], value)
+        self.num_buffered_events += 1
+
+    def record_many(self, event_type:str, time_stamp:int, agent_indices:np.ndarray, positions:np.ndarray=None, values:np.ndarray=None):
+        '''
+        Records events of the same type and time stamp for many agents at
+        once (e.g. all moves of a time step).
+
+        ---
+
+        PARAMETERS:
+        - `event_type` (str): Event type; must be one of `EVENT_TYPES`
+        - `time_stamp` (int): Time stamp of the events
+        - `agent_indices` (np.ndarray): Agents concerned
+        - `positions` (np.ndarray, optional): Positions of shape (number of agents, 2); defaults to (-1, -1)
+        - `values` (np.ndarray, optional): Event-specific values; default to 0
+        '''
+
+        event_type_code = get_event_type_code(event_type)
+        agent_indices = np.asarray(agent_indices)
+        start = 0
+        while start < len(agent_indices):
+            if self.num_buffered_events == len(self.buffer):
+                self.flush()
+            # Filling the buffer chunk by chunk:
+            end = min(len(agent_indices), start + len(self.buffer) - self.num_buffered_events)
+            events = self.buffer[self.num_buffered_events:self.num_buffered_events + end - start]
+            events["time_stamp"] = time_stamp
+            events["event_type"] = event_type_code
+            events["agent_index"] = agent_indices[start:end]
+            if positions is None:
+                events["row"], events["column"] = -1, -1
+            else:
+                events["row"], events["column"] = positions[start:end, 0], positions[start:end, 1]
+            events["value"] = 0.0 if values is None else values[start:end]
+            self.num_buffered_events += end - start
+            start = end
+
+    def record_timeline_step(self, timeline, t:int):
+        '''
+        Records the moves, waits and arrivals of all planned agents of a
+        `PlanTimeline` at time stamp `t` (agents which already arrived
+        are not recorded, and at time stamp 0, all agents wait at their
+        start positions).
+        '''
+
+        positions, previous_positions = timeline.get_positions(t), timeline.get_positions(t - 1)
+        is_active = timeline.is_planned & ~timeline.get_finished(t - 1)
+        has_moved = np.any(positions != previous_positions, axis=1)
+        for event_type, is_recorded in [("move", is_active & has_moved), ("wait", is_active & ~has_moved)]:
+            agent_indices = np.flatnonzero(is_recorded)
+            self.record_many(event_type, t, agent_indices, positions[agent_indices])
+        agent_indices = timeline.get_newly_finished_agent_indices(t)
+        self.record_many("arrival", t, agent_indices, positions[agent_indices])
+
+    @contextmanager
+    def time_planner(self, time_stamp:int, agent_index:int=-1):
+        '''Records the time taken by the code within the `with` block as a "planner_timing" event.'''
+
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.record("planner_timing", time_stamp, agent_index, value=perf_counter() - start_time)
+
+    #================================================
+    # WRITING
+
+    def flush(self):
+        '''Writes the buffered events as 1 chunk.'''
+
+        if self.num_buffered_events == 0:
+            return
+        events = self.buffer[:self.num_buffered_events]
+        if self.log_format == "binary":
+            self.writer.write(events.tobytes())
+            self.writer.flush()
+        else:
+            batch = pa.record_batch([pa.array(events[name]) for name in EVENT_RECORD.names], schema=get_arrow_schema())
+            if self.log_format == "arrow":
+                self.writer.write_batch(batch)
+            else:
+                self.writer.write_table(pa.Table.from_batches([batch]))
+        self.counters["num_events"] += self.num_buffered_events
+        self.counters["num_chunks"] += 1
+        self.num_buffered_events = 0
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        if self.log_format == "arrow":
+            self.sink.close()
+        self.writer = None
+
+    def get_report(self) -> dict:
+        '''Gets the counters ("num_events", "num_chunks"; written so far), plus "log_format" and "num_buffered_events".'''
+
+        return dict(self.counters, log_format=self.log_format, num_buffered_events=self.num_buffered_events)
+
+#================================================
+# MAIN: Event log reader
+
+class EventLogReader:
+    '''
+    Reader of event logs written by `EventLogWriter` (of any format,
+    detected from the file), for offline analysis and replay.
+
+    ---
+
+    PARAMETERS:
+    - `file_path` (str): Path of the log file
+
+    ---
+
+    NOTE ON MEMORY MAPPING:
+    "binary" and "arrow" logs are memory-mapped: opening a log of any
+    size is immediate, and its columns are only read from disk when
+    accessed. "parquet" logs are decoded 1 row group (chunk) at a time
+    by `iter_chunks`, and in full by `get_columns`.
+    '''
+
+    def __init__(self, file_path:str):
+        self.file_path = file_path
+        with open(file_path, "rb") as file:
+            magic = file.read(6)
+        if magic[:4] == BINARY_EVENT_LOG_MAGIC:
+            self.log_format = "binary"
+            header = np.fromfile(file_path, dtype=BINARY_EVENT_LOG_HEADER, count=1)[0]
+            if int(header["record_size"]) != EVENT_RECORD.itemsize:
+                raise Exception(f"File \"{file_path}\" has records of {int(header["record_size"])} bytes: expected {EVENT_RECORD.itemsize}")
+            # NOTE: Ignoring a trailing incomplete record (e.g. from a run cut short while writing)
+            num_events = (os.path.getsize(file_path) - BINARY_EVENT_LOG_HEADER.itemsize) // EVENT_RECORD.itemsize
+            if num_events > 0:
+                self.records = np.memmap(file_path, dtype=EVENT_RECORD, mode="r", offset=BINARY_EVENT_LOG_HEADER.itemsize, shape=(num_events,))
+            else:
+                self.records = np.zeros(0, dtype=EVENT_RECORD)
+        elif magic == b"ARROW1" or magic[:4] == b"PAR1":
+            if pa is None:
+                raise Exception(f"File \"{file_path}\" is an Arrow/Parquet event log, which needs `pyarrow` to be read")
+            if magic == b"ARROW1":
+                self.log_format = "arrow"
+                self.reader = pa.ipc.open_file(pa.memory_map(file_path, "r"))
+            else:
+                self.log_format = "parquet"
+                self.reader = pq.ParquetFile(file_path, memory_map=True)
+        else:
+            raise Exception(f"File \"{file_path}\" is not an event log")
+
+    def get_num_events(self) -> int:
+        if self.log_format == "binary":
+            return len(self.records)
+        if self.log_format == "arrow":
+            return sum(self.reader.get_batch(i).num_rows for i in range(self.reader.num_record_batches))
+        return self.reader.metadata.num_rows
+
+    def iter_chunks(self, chunk_size:int=65536):
+        '''
+        Iterates over the log chunk by chunk, as dictionaries of columns
+        (NumPy arrays, keyed as in `EVENT_RECORD`); `chunk_size` only
+        applies to "binary" logs, whose chunks are not marked in the file
+        (the chunks of the other formats are those written).
+        '''
+
+        if self.log_format == "binary":
+            for start in range(0, len(self.records), chunk_size):
+                chunk = self.records[start:start + chunk_size]
+                yield {name: chunk[name] for name in EVENT_RECORD.names}
+        else:
+            batches = (self.reader.get_batch(i) for i in range(self.reader.num_record_batches)) if self.log_format == "arrow" else self.reader.iter_batches()
+            for batch in batches:
+                yield {name: batch.column(name).to_numpy() for name in EVENT_RECORD.names}
+
+    def get_columns(self) -> dict[str, np.ndarray]:
+        '''Gets the whole log as a dictionary of columns (views of the memory-mapped file for "binary" logs).'''
+
+        if self.log_format == "binary":
+            return {name: self.records[name] for name in EVENT_RECORD.names}
+        chunks = list(self.iter_chunks())
+        if len(chunks) == 0:
+            return {name: np.zeros(0, dtype=EVENT_RECORD.fields[name][0]) for name in EVENT_RECORD.names}
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in EVENT_RECORD.names}
+
+    #================================================
+    # ANALYSIS AND REPLAY
+
+    def get_events(self, event_type:str=None, agent_index:int=None) -> dict[str, np.ndarray]:
+        '''Gets the columns of the events of a given type and/or agent (all events if neither is given).'''
+
+        columns = self.get_columns()
+        is_selected = np.ones(len(columns["time_stamp"]), dtype=bool)
+        if not (event_type is None):
+            is_selected &= columns["event_type"] == get_event_type_code(event_type)
+        if not (agent_index is None):
+            is_selected &= columns["agent_index"] == agent_index
+        return {name: column[is_selected] for name, column in columns.items()}
+
+    def get_arrival_times(self, num_agents:int) -> np.ndarray:
+        '''Gets the time stamp at which each agent arrived (-1 for agents with no arrival).'''
+
+        arrivals = self.get_events("arrival")
+        arrival_times = np.full(num_agents, -1, dtype=np.int64)
+        arrival_times[arrivals["agent_index"]] = arrivals["time_stamp"]
+        return arrival_times
+
+    def get_positions_at(self, t:int, num_agents:int) -> np.ndarray:
+        '''
+        Replays the log up to time stamp `t`: gets the last recorded
+        position of each agent at or before `t`.
+
+        ---
+
+        PARAMETERS:
+        - `t` (int): Time stamp
+        - `num_agents` (int): Number of agents
+
+        RETURNS:
+        - (np.ndarray): Positions of shape (`num_agents`, 2); (-1, -1) for agents with no recorded position yet
+        '''
+
+        columns = self.get_columns()
+        is_selected = (columns["time_stamp"] <= t) & (columns["row"] >= 0) & (columns["agent_index"] >= 0)
+        positions = np.full((num_agents, 2), -1, dtype=np.int64)
+        # NOTE: Events are in time order, and with repeated indices, the last assignment is kept
+        positions[columns["agent_index"][is_selected]] = np.stack([columns["row"][is_selected], columns["column"][is_selected]], axis=1)
+        return positions
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from tempfile import TemporaryDirectory
+    from plan_timeline import PlanTimeline
+
+    # Random walks of many agents, as a stand-in for a long simulation:
+    num_agents, num_time_stamps = 2000, 300
+    prng = np.random.RandomState(seed=0)
+    moves = np.array([(1, 0), (0, -1), (-1, 0), (0, 1), (0, 0)])[prng.randint(5, size=(num_time_stamps, num_agents))]
+    positions = np.clip(prng.randint(0, 200, size=(num_agents, 2))[None] + np.cumsum(moves, axis=0), 0, 199)
+    lengths = prng.randint(1, num_time_stamps + 1, size=num_agents)
+    timeline = PlanTimeline([positions[:length, i].tolist() for i, length in enumerate(lengths.tolist())])
+
+    log_formats = ["binary"] if pa is None else ["binary", "arrow", "parquet"]
+    with TemporaryDirectory() as directory:
+        for log_format in log_formats:
+            file_path = os.path.join(directory, f"events.{log_format}")
+            start_time = perf_counter()
+            with EventLogWriter(file_path, log_format, chunk_size=16384) as writer:
+                for t in range(num_time_stamps):
+                    if t % 100 == 0:
+                        with writer.time_planner(t):
+                            sum(range(10000))
+                        writer.record("replan", t, 0, tuple(timeline.get_positions(t)[0]), value=len(timeline))
+                    writer.record_timeline_step(timeline, t)
+            writing_time = perf_counter() - start_time
+            report = writer.get_report()
+
+            reader = EventLogReader(file_path)
+            assert reader.get_num_events() == report["num_events"]
+            assert np.array_equal(reader.get_arrival_times(num_agents), timeline.finish_times)
+            for t in [0, 50, num_time_stamps - 1]:
+                assert np.array_equal(reader.get_positions_at(t, num_agents), timeline.get_positions(t))
+            print(f"{log_format}: {report["num_events"]} events in {report["num_chunks"]} chunks, {os.path.getsize(file_path) / 2 ** 20:.2f} MiB, written in {writing_time * 1e3:.0f} ms")
+            print(f"Planner timings: {reader.get_events("planner_timing")["value"]}")
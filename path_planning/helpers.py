@@ -1,3 +1,4 @@
+from weakref import WeakKeyDictionary
 from basic_grid_environment import *
 from agent import *
 
@@ -105,6 +106,236 @@ def get_free_space_positions(free_space_symbol, grid:np.ndarray) -> np.ndarray:
 
     return np.argwhere(grid == free_space_symbol).tolist()
 
+#================================================
+# RESERVATIONS
+
+class ReservationTable(dict):
+    '''
+    Reservation table indicating reserved cells across time stamps, in
+    the same format as a plain reservation table dictionary:
+    - Keys: (row index, column index, time stamp)
+    - Items: Index of the agent which has reserved the above position in the above time stamp
+
+    Additionally, it maintains an index of reserved moves, so that
+    checking whether a move crosses a reserved move takes O(1) time:
+    - Keys: (from row index, from column index, to row index, to column index, time stamp of departure)
+    - Items: Index of the agent which has reserved the above move
+
+    ---
+
+    NOTE ON POPULATING THE MOVE INDEX:
+    Moves are derived from the positions that the same agent reserves at
+    consecutive time stamps, regardless of the order in which they are
+    reserved. Hence, existing code that reserves positions one by one
+    (`reservation_table[position_with_time_stamp] = agent_index`) keeps
+    working unchanged; `.reserve_path` and `.reserve_paths` are
+    conveniences for reserving committed paths in bulk. Every other
+    mutating `dict` method (`pop`, `popitem`, `setdefault`, `update`,
+    `|=`, `clear`) goes through the same bookkeeping, and `copy` copies
+    the move index too, so none of them can bypass it.
+
+    ---
+
+    PARAMETERS:
+    - `reservations` (dict, optional): Initial reservations (e.g. a plain reservation table dictionary)
+    '''
+
+    def __init__(self, reservations:dict=None):
+        super().__init__()
+        self.moves = {}
+        self.agent_positions = {}
+        # NOTE: Keys: (agent index, time stamp); Items: (row index, column index)
+        self.horizon = -1
+        # NOTE: Latest reserved time stamp; it is not lowered by deletions, so it is an upper bound
+        if reservations is not None:
+            self.update(reservations)
+
+    #------------------------------------
+    def add_move(self, from_cell:tuple[int, int], to_cell:tuple[int, int], time_stamp:int, agent_index:int):
+        # Waiting is not a move, and cannot cross other moves:
+        if from_cell != to_cell:
+            self.moves[(from_cell[0], from_cell[1], to_cell[0], to_cell[1], time_stamp)] = agent_index
+
+    def remove_move(self, from_cell:tuple[int, int], to_cell:tuple[int, int], time_stamp:int):
+        self.moves.pop((from_cell[0], from_cell[1], to_cell[0], to_cell[1], time_stamp), None)
+
+    def __setitem__(self, key:tuple[int, int, int], agent_index:int):
+        previous_agent_index = dict.get(self, key, None)
+        if previous_agent_index is not None and previous_agent_index != agent_index:
+            self.__delitem__(key)
+        dict.__setitem__(self, key, agent_index)
+        cell, time_stamp = key[:2], key[2]
+        self.agent_positions[(agent_index, time_stamp)] = cell
+        if time_stamp > self.horizon:
+            self.horizon = time_stamp
+        previous_cell = self.agent_positions.get((agent_index, time_stamp - 1), None)
+        if previous_cell is not None:
+            self.add_move(previous_cell, cell, time_stamp - 1, agent_index)
+        next_cell = self.agent_positions.get((agent_index, time_stamp + 1), None)
+        if next_cell is not None:
+            self.add_move(cell, next_cell, time_stamp, agent_index)
+
+    def __delitem__(self, key:tuple[int, int, int]):
+        agent_index = dict.pop(self, key)
+        cell, time_stamp = key[:2], key[2]
+        if self.agent_positions.get((agent_index, time_stamp), None) == cell:
+            del self.agent_positions[(agent_index, time_stamp)]
+        previous_cell = self.agent_positions.get((agent_index, time_stamp - 1), None)
+        if previous_cell is not None:
+            self.remove_move(previous_cell, cell, time_stamp - 1)
+        next_cell = self.agent_positions.get((agent_index, time_stamp + 1), None)
+        if next_cell is not None:
+            self.remove_move(cell, next_cell, time_stamp)
+
+    def pop(self, key:tuple[int, int, int], *default):
+        if key in self:
+            agent_index = dict.__getitem__(self, key)
+            self.__delitem__(key)
+            return agent_index
+        if len(default) > 0:
+            return default[0]
+        raise KeyError(key)
+
+    def popitem(self) -> tuple[tuple[int, int, int], int]:
+        if len(self) == 0:
+            raise KeyError("popitem(): reservation table is empty")
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key:tuple[int, int, int], default:int=None) -> int:
+        if not (key in self):
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, agent_index in dict(*args, **kwargs).items():
+            self[key] = agent_index
+
+    def __ior__(self, other:dict):
+        self.update(other)
+        return self
+
+    def clear(self):
+        dict.clear(self)
+        self.moves.clear()
+        self.agent_positions.clear()
+        self.horizon = -1
+
+    def copy(self):
+        reservation_table = type(self)()
+        dict.update(reservation_table, self)
+        reservation_table.moves = dict(self.moves)
+        reservation_table.agent_positions = dict(self.agent_positions)
+        reservation_table.horizon = self.horizon
+        return reservation_table
+
+    #------------------------------------
+    def reserve_path(self, path:list[tuple[int, int, int]], agent_index:int):
+        '''
+        Reserves all positions (and hence moves) of a path for an agent.
+
+        ---
+
+        PARAMETERS:
+        - `path` (list[tuple[int, int, int]]): Path with time stamps
+        - `agent_index` (int): Index of the agent following the path
+        '''
+
+        for position_with_time_stamp in path:
+            self[position_with_time_stamp] = agent_index
+
+    def reserve_paths(self, paths:list[list[tuple[int, int, int]]]):
+        '''
+        Reserves all positions (and hence moves) of committed paths, where
+        path i is followed by agent i.
+
+        ---
+
+        PARAMETERS:
+        - `paths` (list[list[tuple[int, int, int]]]): Paths with time stamps
+        '''
+
+        for agent_index, path in enumerate(paths):
+            self.reserve_path(path, agent_index)
+
+    #------------------------------------
+    def is_move_crossed(self, from_cell:tuple[int, int], to_cell:tuple[int, int], time_stamp:int) -> bool:
+        '''
+        Checks in O(1) time if any reserved move crosses the given move,
+        for both 4-connected and 8-connected motion.
+
+        - Axis-aligned and diagonal moves are crossed by reserved moves in the opposite direction (position swaps)
+        - Diagonal moves are also crossed by reserved moves along the other diagonal of the same 2 x 2 block (cross-overs)
+
+        ---
+
+        PARAMETERS:
+        - `from_cell` (tuple[int, int]): Position at `time_stamp`
+        - `to_cell` (tuple[int, int]): Position at `time_stamp + 1`
+        - `time_stamp` (int): Time stamp of departure
+
+        RETURNS:
+        - (bool): Crossed or not
+        '''
+
+        moves = self.moves
+        if (to_cell[0], to_cell[1], from_cell[0], from_cell[1], time_stamp) in moves:
+            return True
+        if abs(to_cell[0] - from_cell[0]) == 1 and abs(to_cell[1] - from_cell[1]) == 1:
+            # The other diagonal of the block runs between (from row, to column) and (to row, from column):
+            if (from_cell[0], to_cell[1], to_cell[0], from_cell[1], time_stamp) in moves:
+                return True
+            if (to_cell[0], from_cell[1], from_cell[0], to_cell[1], time_stamp) in moves:
+                return True
+        return False
+
+    #------------------------------------
+    def get_horizon(self) -> float:
+        '''Gets the latest time stamp at which anything may be reserved (apart from static obstacles).'''
+
+        return self.horizon
+
+    def get_static_obstacles(self) -> frozenset:
+        '''Gets the positions that stay reserved beyond the horizon (none for a plain reservation table).'''
+
+        return frozenset()
+
+def as_reservation_table(reservation_table:dict=None) -> ReservationTable:
+    '''
+    Gets `reservation_table` as a `ReservationTable`: a new empty table
+    if `None`, the table itself if already one, and otherwise a copy of
+    the plain dictionary (with its move index built once).
+    '''
+
+    if reservation_table is None:
+        return ReservationTable()
+    if isinstance(reservation_table, ReservationTable):
+        return reservation_table
+    return ReservationTable(reservation_table)
+
+def get_reservation_horizon(reservation_table:dict) -> float:
+    '''
+    Gets the reservation horizon, i.e. the latest time stamp at which
+    any position may be reserved; beyond it, pathfinding across time is
+    purely spatial again.
+
+    ---
+
+    PARAMETERS:
+    - `reservation_table` (ReservationTable | dict): Table indicating reserved cells across time stamps
+
+    RETURNS:
+    - (float): Reservation horizon; -1 if nothing is reserved, and `np.inf` if reservations never end
+
+    ---
+
+    NOTE: For a `ReservationTable`, this takes O(1) time; for a plain dictionary, all keys are scanned.
+    '''
+
+    if isinstance(reservation_table, ReservationTable):
+        return reservation_table.get_horizon()
+    return max((key[2] for key in reservation_table), default=-1)
+
 #================================================
 # SURROUNDING CELL SEARCH
 
@@ -150,7 +381,7 @@ def get_open_neighbours(cell:tuple[int, int], obstacle_symbols:list, grid:np.nda
     return open_neighbours
 
 #------------------------------------
-def get_open_neighbours_at_time_stamp(cell:tuple[int, int, int], obstacle_symbols:list, grid:np.ndarray, reservation_table:dict, do_include_current_cell_if_free=False) -> list[tuple[int, int, int]]:
+def get_open_neighbours_at_time_stamp(cell:tuple[int, int, int], obstacle_symbols:list, grid:np.ndarray, reservation_table:ReservationTable, do_include_current_cell_if_free=False) -> list[tuple[int, int, int]]:
     '''
     Gets the cell's open neighours (with time stamp) in time stamp.
     
@@ -164,7 +395,7 @@ def get_open_neighbours_at_time_stamp(cell:tuple[int, int, int], obstacle_symbol
     - `cell` (tuple[int, int, int]): Cell denoting the current/referenced grid position, along with time stamp as the 3rd dimension
     - `obstacle_symbols` (list): List of symbols denoting obstacles in the grid
     - `grid` (np.ndarray): 2D grid denoting the grid environment
-    - `reservation_table` (dict): Table indicating reserved cells across time stamp; must be in the format:
+    - `reservation_table` (ReservationTable): Table indicating reserved cells across time stamp (plain dictionaries can be converted with `as_reservation_table`); must be in the format:
         - Keys: (row index, column index, time stamp)
         - Items: Index of the agent which has reserved the above position in the above time stamp
 
@@ -183,14 +414,8 @@ def get_open_neighbours_at_time_stamp(cell:tuple[int, int, int], obstacle_symbol
     would lead to collisions, despite the positions being "free" in the
     next time stamp.
 
-    Currently, we are only checking for position swapping, which is a
-    specific type of cross-over. For use-cases with strictly right-angle
-    turns, this is sufficient. However, if we introduce turns in other
-    angles, we need to also check for cross-overs to avoid collisions
-    with dynamic obstacles; implementing this efficiently (without
-    excessive loops) would require implementing more efficient data
-    structures to store and retrieve data about reserved positions
-    across time stamps.
+    Both cases are checked in O(1) time using the index of reserved
+    moves of `reservation_table`.
     '''
     
     open_neighbours_with_time_stamp = []
@@ -201,14 +426,8 @@ def get_open_neighbours_at_time_stamp(cell:tuple[int, int, int], obstacle_symbol
 
         # If the neighbour is free in the next time stamp:
         if reserving_agent_index is None:
-            # Checking for position swapping (the dynamic obstacle and the agent at the current cell cannot realistically swap positions within 1 time step without colliding):
-            # NOTE: TO DO (FUTURE): Logic to prevent cross-overs; currently, we are only checking for position swaps
-            
-            a = reservation_table.get((cell[0], cell[1], cell[2] + 1), None)
-            b = reservation_table.get((pon[0], pon[1], cell[2]), None)
-
-            # Add the free position as an open neighbour only if there is no position swapping:
-            if a is None or b is None or a != b:
+            # Checking for swaps and cross-overs (the dynamic obstacle and the agent at the current cell cannot realistically cross within 1 time step without colliding):
+            if not reservation_table.is_move_crossed(cell[:2], pon, cell[2]):
                 open_neighbours_with_time_stamp.append((pon[0], pon[1], cell[2] + 1))
 
     # Remove current cell as an open cell if all neighbouring cells do not contain dynamic obstacles:
@@ -291,6 +510,146 @@ def is_adjacent(cell1:tuple[int, int], cell2:tuple[int, int]) -> bool:
         return True
     return False
 
+#================================================
+# DISTANCE FIELDS
+
+def get_distance_fields(goal_positions:list[tuple[int, int]], obstacle_symbols:list, grid:np.ndarray) -> np.ndarray:
+    '''
+    Computes the exact (4-connected) distance from each goal position to
+    every cell of the grid, for all goal positions in one batch.
+
+    ---
+
+    PARAMETERS:
+    - `goal_positions` (list[tuple[int, int]]): Goal positions
+    - `obstacle_symbols` (list): List of symbols denoting obstacles in the grid
+    - `grid` (np.ndarray): 2D grid denoting the grid environment
+
+    RETURNS:
+    - (np.ndarray): Distance fields of the shape (number of goals, number of rows, number of columns); -1 marks unreachable cells
+
+    ---
+
+    NOTE ON BATCHING:
+    Rather than running one breadth-first search per goal, all the
+    wavefronts are expanded together, one distance level per iteration,
+    by shifting a boolean array of shape (goals, rows, columns) in the
+    4 directions. The number of Python-level iterations is hence only the
+    largest distance, regardless of the number of goals.
+    '''
+
+    is_free = ~np.isin(grid, obstacle_symbols)
+    distance_fields = np.full((len(goal_positions),) + grid.shape, -1, dtype=np.int32)
+    if len(goal_positions) == 0:
+        return distance_fields
+
+    goal_positions = np.asarray(goal_positions, dtype=np.int64).reshape(-1, 2)
+    frontier = np.zeros(distance_fields.shape, dtype=bool)
+    frontier[np.arange(len(goal_positions)), goal_positions[:, 0], goal_positions[:, 1]] = True
+    frontier &= is_free
+    is_explored = frontier.copy()
+
+    distance = 0
+    while frontier.any():
+        distance_fields[frontier] = distance
+        next_frontier = np.zeros_like(frontier)
+        next_frontier[:, 1:, :] |= frontier[:, :-1, :]  # Up
+        next_frontier[:, :-1, :] |= frontier[:, 1:, :]  # Down
+        next_frontier[:, :, 1:] |= frontier[:, :, :-1]  # Right
+        next_frontier[:, :, :-1] |= frontier[:, :, 1:]  # Left
+        next_frontier &= is_free
+        next_frontier &= ~is_explored
+        is_explored |= next_frontier
+        frontier = next_frontier
+        distance += 1
+
+    return distance_fields
+
+class DistanceFieldCache:
+    '''
+    Cache of per-goal distance fields over an environment; fields missing
+    from the cache are computed together in one batch. Fields are keyed
+    by the environment's grid version, so the cache empties itself after
+    any grid change (a change anywhere may alter any distance), and by
+    any static obstacles they were computed around.
+
+    ---
+
+    PARAMETERS:
+    - `environment` (BasicGridEnvironment): Environment whose free space the fields are computed over
+    - `max_num_fields` (int, optional): Maximum number of fields held (the least recently used are evicted first); unbounded if `None`
+    '''
+
+    def __init__(self, environment:BasicGridEnvironment, max_num_fields:int=None):
+        self.environment = environment
+        self.max_num_fields = max_num_fields
+        self.obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+        self.distance_fields = {}
+        self.grid_version = environment.grid_version
+
+    def get(self, goal_positions:list[tuple[int, int]], static_obstacles:frozenset=frozenset()) -> list[np.ndarray]:
+        # NOTE: `static_obstacles` are extra positions treated as obstacles (e.g. endpoint reservations that never end); fields are keyed on them too
+        if self.grid_version != self.environment.grid_version:
+            self.clear()
+        goal_positions = [tuple(goal_position) for goal_position in goal_positions]
+        keys = goal_positions if len(static_obstacles) == 0 else [(goal_position, static_obstacles) for goal_position in goal_positions]
+        missing_goal_positions = {key: goal_position for key, goal_position in zip(keys, goal_positions) if not (key in self.distance_fields)}
+        if len(missing_goal_positions) > 0:
+            grid = self.environment.grid
+            if len(static_obstacles) > 0:
+                grid = grid.copy()
+                for position in static_obstacles:
+                    grid[position] = self.obstacle_symbols[0]
+            for key, distance_field in zip(missing_goal_positions, get_distance_fields(list(missing_goal_positions.values()), self.obstacle_symbols, grid)):
+                self.distance_fields[key] = distance_field
+        distance_fields = [self.distance_fields[key] for key in keys]
+        if self.max_num_fields is not None:
+            # Marking the requested fields as the most recently used (dictionaries keep insertion order), then evicting:
+            for key in dict.fromkeys(keys):
+                self.distance_fields[key] = self.distance_fields.pop(key)
+            while len(self.distance_fields) > self.max_num_fields:
+                del self.distance_fields[next(iter(self.distance_fields))]
+        return distance_fields
+
+    def clear(self):
+        self.distance_fields = {}
+        self.grid_version = self.environment.grid_version
+
+SHARED_DISTANCE_FIELD_CACHES = WeakKeyDictionary()
+# NOTE: Keys: Environments; Items: Their shared `DistanceFieldCache` (dropped along with the environment)
+
+def get_shared_distance_field_cache(environment:BasicGridEnvironment, max_num_fields:int=16) -> DistanceFieldCache:
+    '''
+    Gets a `DistanceFieldCache` shared by all callers over an environment
+    (e.g. by successive `a_star_across_time` searches), created with
+    `max_num_fields` on first use.
+    '''
+
+    try:
+        return SHARED_DISTANCE_FIELD_CACHES[environment]
+    except KeyError:
+        SHARED_DISTANCE_FIELD_CACHES[environment] = DistanceFieldCache(environment, max_num_fields)
+        return SHARED_DISTANCE_FIELD_CACHES[environment]
+
+def has_free_space_changed(event:GridChangeEvent, environment:BasicGridEnvironment, is_free:np.ndarray) -> bool:
+    '''
+    Checks whether a grid change turned any free cell into an obstacle or
+    vice versa (only the dirty regions of the change are compared).
+
+    ---
+
+    PARAMETERS:
+    - `event` (GridChangeEvent): Grid change
+    - `environment` (BasicGridEnvironment): Changed environment
+    - `is_free` (np.ndarray): Boolean grid of the cells free before (e.g. when a structure over the free space was built)
+
+    RETURNS:
+    - (bool): Has the free space changed or not
+    '''
+
+    obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+    return any(not np.array_equal(~np.isin(environment.grid[i_1:i_2, j_1:j_2], obstacle_symbols), is_free[i_1:i_2, j_1:j_2]) for i_1, i_2, j_1, j_2 in event.dirty_regions)
+
 #================================================
 # ADDITIONAL HELPERS
 
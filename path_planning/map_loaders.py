@@ -0,0 +1,181 @@
+from helpers import *
+
+#================================================
+# MOVINGAI MAPS AND SCENARIOS
+
+# Passable terrain symbols of the MovingAI format ('.': ground, 'G': ground, 'S': swamp); all others ('@', 'O', 'T', 'W') are obstacles:
+MOVINGAI_PASSABLE_SYMBOLS = ['.', 'G', 'S']
+
+def load_movingai_map(file_path:str, cell_length_in_meters:float=0.5) -> BasicGridEnvironment:
+    '''
+    Loads a map in the MovingAI `.map` format (as used by the standard
+    MAPF benchmarks) as an environment.
+
+    ---
+
+    PARAMETERS:
+    - `file_path` (str): Path of the `.map` file
+    - `cell_length_in_meters` (float, optional): Length of a cell in meters
+
+    RETURNS:
+    - (BasicGridEnvironment): Environment with the (possibly rectangular) loaded grid
+
+    ---
+
+    NOTE ON ROW ORDER:
+    The 1st line of a MovingAI map is its top row (y = 0), whereas the
+    grid here has its origin at the bottom left (see
+    `BasicGridEnvironment.display_grid_as_text`). Hence, the rows are
+    flipped, so that the grid displays as the map file reads, and the
+    MovingAI cell (x, y) is the grid position (height - 1 - y, x).
+    '''
+
+    with open(file_path, "rb") as file:
+        lines = file.read().splitlines()
+
+    # Parsing the header ("type", "height", "width", then "map"):
+    header = {}
+    i = 0
+    while lines[i].strip().lower() != b"map":
+        key, value = lines[i].decode().split()
+        header[key.lower()] = value
+        i += 1
+    num_rows, num_columns = int(header["height"]), int(header["width"])
+    rows = [line[:num_columns] for line in lines[i + 1:i + 1 + num_rows]]
+    if len(rows) != num_rows or any(len(row) != num_columns for row in rows):
+        raise Exception(f"Map \"{file_path}\" is invalid: expected {num_rows} rows of {num_columns} cells")
+
+    # Converting the symbols in one vectorised pass:
+    symbols = np.frombuffer(b"".join(rows), dtype="S1").reshape(num_rows, num_columns)[::-1]
+    environment = BasicGridEnvironment(cell_length_in_meters * num_columns, num_columns, num_rows=num_rows)
+    is_passable = np.isin(symbols, [symbol.encode() for symbol in MOVINGAI_PASSABLE_SYMBOLS])
+    environment.set_grid(np.where(is_passable, environment.free_space_symbol, environment.permanent_obstacle_symbol))
+    return environment
+
+def load_movingai_scenario(file_path:str) -> tuple[list[tuple[int, int]], list[tuple[int, int]], np.ndarray]:
+    '''
+    Loads a scenario in the MovingAI `.scen` format (version 1: one
+    tab-separated line per agent, with its bucket, map name, map width,
+    map height, start x, start y, goal x, goal y and optimal length).
+
+    ---
+
+    PARAMETERS:
+    - `file_path` (str): Path of the `.scen` file
+
+    RETURNS:
+    - (list[tuple[int, int]]): Start positions (as grid positions of the map loaded by `load_movingai_map`)
+    - (list[tuple[int, int]]): End positions (likewise)
+    - (np.ndarray): Optimal (8-connected, as given in the file) path lengths; useful only as a reference
+    '''
+
+    with open(file_path) as file:
+        lines = [line.split() for line in file.read().splitlines()[1:] if line.strip() != ""]
+    # NOTE: Map names have no whitespace, so splitting on any whitespace gives the same 9 fields as splitting on tabs
+    if any(len(fields) != 9 for fields in lines):
+        raise Exception(f"Scenario \"{file_path}\" is invalid: each line should have 9 fields")
+
+    values = np.array([fields[2:8] for fields in lines], dtype=np.int64).reshape(-1, 6)
+    heights, start_xs, start_ys, end_xs, end_ys = values[:, 1], values[:, 2], values[:, 3], values[:, 4], values[:, 5]
+    start_positions = list(zip((heights - 1 - start_ys).tolist(), start_xs.tolist()))
+    end_positions = list(zip((heights - 1 - end_ys).tolist(), end_xs.tolist()))
+    optimal_lengths = np.array([float(fields[8]) for fields in lines])
+    return start_positions, end_positions, optimal_lengths
+
+#================================================
+# BINARY GRIDS
+
+BINARY_GRID_MAGIC = b"GRID"
+BINARY_GRID_HEADER = np.dtype([("magic", "S4"), ("num_rows", "<u4"), ("num_columns", "<u4"), ("cell_length_in_meters", "<f4")])
+'''
+NOTE ON THE BINARY GRID FORMAT:
+A 16-byte header (see `BINARY_GRID_HEADER`) followed by the grid itself
+in row-major order, with the same symbols and dtype as `.grid` (Unicode
+characters of 4 bytes each). Since no conversion is needed on loading,
+the grid is opened as a `np.memmap`: loading takes about the same time
+for any map size, cells are only read from disk when accessed, and the
+OS page cache shares them between all processes opening the same file.
+'''
+
+def save_binary_grid(environment:BasicGridEnvironment, file_path:str):
+    '''
+    Saves the grid of an environment in the binary grid format.
+
+    ---
+
+    PARAMETERS:
+    - `environment` (BasicGridEnvironment): Environment whose grid is saved
+    - `file_path` (str): Path of the file to be written
+    '''
+
+    header = np.array([(BINARY_GRID_MAGIC, environment.num_rows, environment.num_columns, environment.cell_length_in_meters)], dtype=BINARY_GRID_HEADER)
+    with open(file_path, "wb") as file:
+        file.write(header.tobytes())
+        file.write(np.ascontiguousarray(environment.grid, dtype="<U1").tobytes())
+
+def load_binary_grid(file_path:str, mode:str="c") -> BasicGridEnvironment:
+    '''
+    Loads an environment saved by `save_binary_grid`, with a memory-mapped
+    grid.
+
+    ---
+
+    PARAMETERS:
+    - `file_path` (str): Path of the file
+    - `mode` (str, optional): Memory map mode (as in `np.memmap`); must be one of the following:
+        - "c": Copy-on-write (changes to the grid, e.g. temporary obstacles, stay in memory and are private to the process)
+        - "r": Read-only
+        - "r+": Read and write (changes to the grid are written to the file)
+
+    RETURNS:
+    - (BasicGridEnvironment): Environment whose `.grid` is a `np.memmap` of the file
+    '''
+
+    VALID_MODES = ["c", "r", "r+"]
+    if mode not in VALID_MODES:
+        raise Exception(f"Memory map mode \"{mode}\" is invalid: should be one of {VALID_MODES}")
+
+    header = np.fromfile(file_path, dtype=BINARY_GRID_HEADER, count=1)[0]
+    if header["magic"] != BINARY_GRID_MAGIC:
+        raise Exception(f"File \"{file_path}\" is not a binary grid")
+    num_rows, num_columns = int(header["num_rows"]), int(header["num_columns"])
+    grid = np.memmap(file_path, dtype="<U1", mode=mode, offset=BINARY_GRID_HEADER.itemsize, shape=(num_rows, num_columns))
+    return BasicGridEnvironment(float(header["cell_length_in_meters"]) * num_columns, grid=grid)
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    import os
+    from tempfile import TemporaryDirectory
+    from time import perf_counter
+    from algorithm_a_star_with_headings import a_star_with_headings
+
+    with TemporaryDirectory() as directory:
+        # A small MovingAI map and scenario (8 x 5 cells, rectangular):
+        map_path, scenario_path = os.path.join(directory, "example.map"), os.path.join(directory, "example.scen")
+        with open(map_path, "w") as file:
+            file.write("type octile\nheight 5\nwidth 8\nmap\n........\n.@@@.TT.\n....G...\n.WW.@@@.\n........\n")
+        with open(scenario_path, "w") as file:
+            file.write("version 1\n0\texample.map\t8\t5\t0\t0\t7\t4\t11\n0\texample.map\t8\t5\t7\t0\t0\t4\t11.82842712\n")
+
+        environment = load_movingai_map(map_path)
+        start_positions, end_positions, optimal_lengths = load_movingai_scenario(scenario_path)
+        print(f"MAP ({environment.num_rows} x {environment.num_columns})")
+        environment.display_grid_as_text()
+        agent = Agent(environment.num_columns, environment.num_rows)
+        for start_position, end_position in zip(start_positions, end_positions):
+            print(f"{start_position} -> {end_position}: {a_star_with_headings(end_position, start_position, agent, environment)}")
+
+        # Binary grid round trip and loading times for a large map:
+        environment = BasicGridEnvironment(1000, 2000, num_rows=1000, prng_seed=0)
+        environment.generate_random_grid(p=0.001)
+        grid_path = os.path.join(directory, "large.grid")
+        save_binary_grid(environment, grid_path)
+        start_time = perf_counter()
+        loaded_environment = load_binary_grid(grid_path)
+        loading_time = perf_counter() - start_time
+        assert np.array_equal(loaded_environment.grid, environment.grid) and loaded_environment.cell_length_in_meters == environment.cell_length_in_meters
+        print(f"\nLoaded a {loaded_environment.num_rows} x {loaded_environment.num_columns} binary grid ({os.path.getsize(grid_path) / 2 ** 20:.1f} MiB) in {loading_time * 1e3:.2f} ms")
+        del loaded_environment
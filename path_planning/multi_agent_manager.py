@@ -1,8 +1,13 @@
 from agent import *
 class MultiAgentManager:
-    def __init__(self, agents:list[Agent], environment:BasicGridEnvironment):
+    def __init__(self, agents:list[Agent], environment:BasicGridEnvironment, path_cache_size:int=1024):
         self.agents = agents
         self.environment = environment
+        self.path_cache_size = path_cache_size
+        self.path_caches = {}
+        # NOTE: Keys: A* variants; Items: Their `PathCache` (created on first use)
+        self.task_assigners = {}
+        # NOTE: Keys: Assignment approaches; Items: Their `TaskAssigner` (created on first use, keeping its distance fields and last assignment)
     
     #================================================
     def get_agent(self, agent_index):
@@ -15,8 +20,24 @@ class MultiAgentManager:
     # BASIC A* IMPLEMENTATION
     # NOTE: This is mainly for testing the simulation framework initially
 
-    def a_star(self, end_position, start_position, agent_index) -> list[tuple[int, int]]:
-        from algorithm_a_star import a_star
+    VALID_A_STAR_VARIANTS = ["basic", "headings", "bounded_memory", "bidirectional"]
+
+    def a_star(self, end_position, start_position, agent_index, a_star_variant="basic", use_path_cache=False) -> list[tuple[int, int]]:
+        if a_star_variant == "basic":
+            from algorithm_a_star import a_star
+        elif a_star_variant == "headings":
+            from algorithm_a_star_with_headings import a_star_with_headings as a_star
+        elif a_star_variant == "bounded_memory":
+            from algorithm_sma_star import bounded_memory_a_star as a_star
+        elif a_star_variant == "bidirectional":
+            from algorithm_bidirectional_a_star import bidirectional_a_star as a_star
+        else:
+            raise Exception(f"A* variant \"{a_star_variant}\" is invalid: should be one of {self.VALID_A_STAR_VARIANTS}")
+        if use_path_cache:
+            from path_cache import PathCache
+            if not (a_star_variant in self.path_caches):
+                self.path_caches[a_star_variant] = PathCache(a_star, self.path_cache_size)
+            a_star = self.path_caches[a_star_variant]
         return a_star(end_position, start_position, self.get_agent(agent_index), self.environment)
 
     #================================================
@@ -41,13 +62,13 @@ class MultiAgentManager:
             agents = [self.get_agent(agent_index) for agent_index in agent_indices]
         return windowed_equal_speed_ca_star_v1(end_positions, start_positions, agents, self.environment, window_size=window_size, reprioritisation_approach=reprioritisation_approach), agents
 
-    def windowed_equal_speed_ca_star_v2(self, end_positions, start_positions, agent_indices=None, window_size=10) -> tuple[list[tuple[int, int, int]], list[Agent]]:
+    def windowed_equal_speed_ca_star_v2(self, end_positions, start_positions, agent_indices=None, window_size=10, window_size_controller=None) -> tuple[list[tuple[int, int, int]], list[Agent]]:
         from algorithm_windowed_equal_speed_ca_star_v2 import windowed_equal_speed_ca_star_v2
         if agent_indices is None:
             agents = self.agents
         else:
             agents = [self.get_agent(agent_index) for agent_index in agent_indices]
-        return windowed_equal_speed_ca_star_v2(end_positions, start_positions, agents, self.environment, window_size=window_size), agents
+        return windowed_equal_speed_ca_star_v2(end_positions, start_positions, agents, self.environment, window_size=window_size, window_size_controller=window_size_controller), agents
 
     def windowed_equal_speed_ca_star_v3(self, agent_indices=None, window_size=10, num_time_steps_before_return=30, prng_seed=None) -> tuple[list[tuple[int, int, int]], list[Agent]]:
         from algorithm_windowed_equal_speed_ca_star_v3 import windowed_equal_speed_ca_star_v3
@@ -56,3 +77,35 @@ class MultiAgentManager:
         else:
             agents = [self.get_agent(agent_index) for agent_index in agent_indices]
         return windowed_equal_speed_ca_star_v3(agents, self.environment, window_size=window_size, num_time_steps_before_return=num_time_steps_before_return, prng_seed=prng_seed), agents
+
+
+    #================================================
+    # MAPF-LNS POST-OPTIMISATION
+
+    def mapf_lns(self, paths, end_positions, agent_indices=None, time_budget=1.0, neighbourhood_size=4, neighbourhood_approach="random", prng_seed=None) -> tuple[list[tuple[int, int, int]], list[tuple[float, int]], list[Agent]]:
+        from algorithm_mapf_lns import mapf_lns
+        if agent_indices is None:
+            agents = self.agents
+        else:
+            agents = [self.get_agent(agent_index) for agent_index in agent_indices]
+        paths, cost_history = mapf_lns(paths, end_positions, agents, self.environment, time_budget=time_budget, neighbourhood_size=neighbourhood_size, neighbourhood_approach=neighbourhood_approach, prng_seed=prng_seed, do_get_cost_history=True)
+        return paths, cost_history, agents
+
+    #================================================
+    # TASK ASSIGNMENT
+
+    def assign_tasks(self, task_positions, agent_indices=None, assignment_approach="hungarian") -> tuple[list[int], list[Agent]]:
+        from task_assignment import TaskAssigner
+        if agent_indices is None:
+            agents = self.agents
+        else:
+            agents = [self.get_agent(agent_index) for agent_index in agent_indices]
+        if not (assignment_approach in self.task_assigners):
+            self.task_assigners[assignment_approach] = TaskAssigner(self.environment, assignment_approach)
+        return self.task_assigners[assignment_approach].assign([agent.position for agent in agents], task_positions), agents
+
+    def update_tasks(self, task_indices, task_positions, assignment_approach="hungarian") -> list[int]:
+        # NOTE: Re-solves the last `assign_tasks` call of this approach incrementally, so the assignment refers to the same agents
+        if not (assignment_approach in self.task_assigners):
+            raise Exception(f"No \"{assignment_approach}\" assignment to update; call `.assign_tasks` first")
+        return self.task_assigners[assignment_approach].update_tasks(task_indices, task_positions)
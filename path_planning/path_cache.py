@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from helpers import *
+from algorithm_a_star import a_star
+
+#================================================
+# MAIN: LRU path cache
+
+class PathCache:
+    '''
+    Memoisation layer in front of a spatial planner (any function with
+    the interface of `a_star`), for fleets that repeatedly ask for the
+    same routes (e.g. dock to aisle N).
+
+    Paths are kept in least-recently-used order, under the key (start,
+    goal, heuristic, penalise_turns, grid version), and the cache is
+    emptied as soon as the environment's grid version changes (or a
+    different environment is given). Besides exact hits, a query from B
+    to C is served by any cached path to C (with the same options) that
+    goes through B, as the suffix of that path from B.
+
+    ---
+
+    PARAMETERS:
+    - `planner` (function, optional): Spatial planner with the interface of `a_star`
+    - `max_num_entries` (int, optional): Maximum number of cached paths
+    - `do_reuse_sub_paths` (bool, optional): Serve queries with suffixes of cached paths or not
+
+    ---
+
+    NOTE ON SUB-PATH OPTIMALITY:
+    Without turning costs, every suffix of a shortest path is a shortest
+    path. With turning costs, a suffix may cost 1 more than the cheapest
+    path from B, since the first move from B counts as a turn when B is
+    a start, but did not in the cached path if it went straight through B.
+    '''
+
+    def __init__(self, planner=a_star, max_num_entries:int=1024, do_reuse_sub_paths:bool=True):
+        self.planner = planner
+        self.max_num_entries = max_num_entries
+        self.do_reuse_sub_paths = do_reuse_sub_paths
+        self.entries = OrderedDict()
+        # NOTE: Keys: (start position, end position, heuristic, penalise_turns, grid version); Items: Paths
+        self.sub_path_index = {}
+        # NOTE: Keys: (end position, heuristic, penalise_turns, grid version); Items: Dictionaries of {position on a cached path: (its entry key, its index in the path)}
+        self.environment = None
+        self.grid_version = None
+        self.counters = {"hits": 0, "sub_path_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def clear(self):
+        self.entries.clear()
+        self.sub_path_index.clear()
+
+    def get_path(self, end_position:tuple[int, int], start_position:tuple[int, int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True) -> list[tuple[int, int]]:
+        '''
+        Gets a path from the cache, or from the planner (caching it); same
+        interface and return format as `a_star`.
+        '''
+
+        if start_position == "agent":
+            start_position = agent.position
+        start_position, end_position = tuple(start_position), tuple(end_position)
+
+        # Invalidating all entries once the grid (or the environment) changes:
+        if environment is not self.environment or environment.grid_version != self.grid_version:
+            if len(self.entries) > 0:
+                self.counters["invalidations"] += 1
+            self.clear()
+            self.environment, self.grid_version = environment, environment.grid_version
+
+        key = (start_position, end_position, heuristic_cost, penalise_turns, self.grid_version)
+        try:
+            path = self.entries[key]
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return list(path)
+        except KeyError:
+            pass
+
+        sub_path_key = key[1:]
+        if self.do_reuse_sub_paths:
+            try:
+                entry_key, index = self.sub_path_index[sub_path_key][start_position]
+                self.entries.move_to_end(entry_key)
+                self.counters["sub_path_hits"] += 1
+                return self.entries[entry_key][index:]
+            except KeyError:
+                pass
+
+        self.counters["misses"] += 1
+        path = self.planner(end_position, start_position, agent, environment, heuristic_cost, penalise_turns)
+        path = [tuple(position) for position in path]
+        self.entries[key] = path
+        if self.do_reuse_sub_paths and len(path) > 0:
+            positions = self.sub_path_index.setdefault(sub_path_key, {})
+            for index, position in enumerate(path):
+                positions[position] = (key, index)
+
+        # Evicting the least recently used entries:
+        while len(self.entries) > self.max_num_entries:
+            evicted_key, evicted_path = self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
+            positions = self.sub_path_index.get(evicted_key[1:], {})
+            for position in evicted_path:
+                if positions.get(position, (None,))[0] == evicted_key:
+                    del positions[position]
+            if len(positions) == 0:
+                self.sub_path_index.pop(evicted_key[1:], None)
+        return list(path)
+
+    def __call__(self, end_position:tuple[int, int], start_position:tuple[int, int], agent:Agent, environment:BasicGridEnvironment, heuristic_cost=get_manhattan_distance, penalise_turns=True) -> list[tuple[int, int]]:
+        return self.get_path(end_position, start_position, agent, environment, heuristic_cost, penalise_turns)
+
+    def get_report(self) -> dict:
+        '''Gets the counters ("hits", "sub_path_hits", "misses", "evictions", "invalidations"), plus "num_entries" and "hit_rate".'''
+
+        num_queries = self.counters["hits"] + self.counters["sub_path_hits"] + self.counters["misses"]
+        return dict(self.counters, num_entries=len(self.entries), hit_rate=(num_queries - self.counters["misses"]) / max(num_queries, 1))
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    environment = BasicGridEnvironment(10, 100, prng_seed=3)
+    environment.generate_random_grid(p=0.01)
+    agent = Agent(100, 100)
+    free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+    prng = np.random.RandomState(seed=0)
+
+    # Fleet-like queries: few docks and aisle ends, so routes repeat
+    docks = [tuple(free_space_positions[k]) for k in prng.choice(len(free_space_positions), size=5, replace=False)]
+    aisle_ends = [tuple(free_space_positions[k]) for k in prng.choice(len(free_space_positions), size=20, replace=False)]
+    queries = [(docks[prng.randint(len(docks))], aisle_ends[prng.randint(len(aisle_ends))]) for _ in range(300)]
+
+    path_cache = PathCache(a_star, max_num_entries=64)
+    timings = []
+    for search_function in [a_star, path_cache]:
+        start_time = perf_counter()
+        paths = [search_function(end_position, start_position, agent, environment) for start_position, end_position in queries]
+        timings.append(perf_counter() - start_time)
+    print(f"a_star: {timings[0]:.3f} s, cached: {timings[1]:.3f} s ({len(queries)} queries)\n{path_cache.get_report()}")
+
+    # Sub-path reuse (from a point along a cached path) and invalidation:
+    path = path_cache(queries[0][1], queries[0][0], agent, environment)
+    middle_position = path[len(path) // 2]
+    assert path_cache(queries[0][1], middle_position, agent, environment) == path[len(path) // 2:]
+    environment.set_cell(middle_position, environment.temporary_obstacle_symbol)
+    new_path = path_cache(queries[0][1], queries[0][0], agent, environment)
+    assert not (middle_position in new_path) and path_cache.get_report()["num_entries"] == 1
+    print(f"\nAfter the grid change:\n{path_cache.get_report()}")
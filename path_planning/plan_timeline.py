@@ -0,0 +1,169 @@
+from helpers import *
+from solution_validation import pack_paths
+
+#================================================
+# MAIN: Precomputed plan timeline
+
+class PlanTimeline:
+    '''
+    A multi-agent plan compiled into arrays, so that the state of all
+    agents at any time stamp is a slice instead of a loop over paths.
+
+    ---
+
+    PARAMETERS:
+    - `paths` (list[list[tuple[int]]]): List of paths, each corresponding to an agent (as returned by the CA* functions); the i-th position in a path is taken to be at time stamp i
+
+    ---
+
+    ATTRIBUTES:
+    - `positions` (np.ndarray): Positions of shape (number of time stamps, number of agents, 2), padded with the end positions; agents without a path hold (-1, -1)
+    - `finish_times` (np.ndarray): Time stamp at which each agent reaches its end position; -1 for agents without a path
+    - `is_planned` (np.ndarray): Boolean array; does each agent have a path or not
+
+    ---
+
+    NOTE ON SEEKING:
+    Time stamps beyond the last one are clamped to it (every agent has
+    finished by then and stays put), so any time stamp can be looked up
+    in O(1), in any order, e.g. for scrubbing back and forth through a
+    replay. Each frame is contiguous in memory (time is the 1st axis).
+    '''
+
+    def __init__(self, paths:list[list[tuple[int]]]):
+        self.positions = np.ascontiguousarray(pack_paths(paths, do_agents_disappear_at_goal=False).transpose(1, 0, 2))
+        self.num_time_stamps, self.num_agents = self.positions.shape[:2]
+        lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=len(paths))
+        self.finish_times = lengths - 1
+        self.is_planned = lengths > 0
+
+    def __len__(self) -> int:
+        return self.num_time_stamps
+
+    def clamp_time_stamp(self, t:int) -> int:
+        return min(max(t, 0), self.num_time_stamps - 1)
+
+    #================================================
+    # FRAME STATE
+
+    def get_positions(self, t:int) -> np.ndarray:
+        '''Gets the positions of all agents at time stamp `t` (a view of shape (number of agents, 2)).'''
+
+        return self.positions[self.clamp_time_stamp(t)]
+
+    def get_finished(self, t:int) -> np.ndarray:
+        '''Gets a boolean array; has each agent finished its path by time stamp `t` or not (agents without a path have not).'''
+
+        return self.is_planned & (self.finish_times <= t)
+
+    def get_newly_finished_agent_indices(self, t:int) -> np.ndarray:
+        '''Gets the indices of the agents which reach their end positions exactly at time stamp `t`.'''
+
+        return np.flatnonzero(self.is_planned & (self.finish_times == t))
+
+    def get_makespan(self) -> int:
+        '''Gets the time stamp at which the last agent finishes (-1 if no agent has a path).'''
+
+        return int(self.finish_times.max()) if self.num_agents > 0 else -1
+
+    def get_occupancy(self, t:int, grid_shape:tuple[int, int], agent_indices=None) -> np.ndarray:
+        '''
+        Gets an occupancy snapshot at time stamp `t`.
+
+        ---
+
+        PARAMETERS:
+        - `t` (int): Time stamp
+        - `grid_shape` (tuple[int, int]): Shape of the environment grid
+        - `agent_indices` (np.ndarray, optional): Agents to include; defaults to all agents with a path
+
+        RETURNS:
+        - (np.ndarray): Boolean grid; is each cell occupied by an agent or not
+        '''
+
+        agent_indices = np.flatnonzero(self.is_planned) if agent_indices is None else agent_indices
+        positions = self.get_positions(t)[agent_indices]
+        occupancy = np.zeros(grid_shape, dtype=bool)
+        occupancy[positions[:, 0], positions[:, 1]] = True
+        return occupancy
+
+    def draw_frame(self, t:int, grid:np.ndarray, agent_symbols:np.ndarray, finished_symbol=None, free_space_symbol=None, frame:np.ndarray=None) -> np.ndarray:
+        '''
+        Draws the agents at time stamp `t` onto a copy of the grid.
+
+        ---
+
+        PARAMETERS:
+        - `t` (int): Time stamp
+        - `grid` (np.ndarray): Environment grid (left unchanged)
+        - `agent_symbols` (np.ndarray): Symbol of each agent
+        - `finished_symbol` (Any, optional): If given, finished agents are drawn with it instead of their own symbol, but only on free space (as in the simulation, where they may be regarded as free space)
+        - `free_space_symbol` (Any, optional): Symbol of free space within the grid (needed with `finished_symbol`)
+        - `frame` (np.ndarray, optional): Array of the grid's shape to draw into (reused between frames instead of allocating a new copy)
+
+        RETURNS:
+        - (np.ndarray): The frame
+        '''
+
+        if frame is None:
+            frame = grid.copy()
+        else:
+            np.copyto(frame, grid)
+        agent_symbols = np.asarray(agent_symbols)
+        positions = self.get_positions(t)
+        is_moving = self.is_planned & ~self.get_finished(t - 1) if finished_symbol is not None else self.is_planned
+        frame[positions[is_moving, 0], positions[is_moving, 1]] = agent_symbols[is_moving]
+        if finished_symbol is not None:
+            is_finished = self.get_finished(t - 1)
+            finished_positions = positions[is_finished]
+            is_on_free_space = frame[finished_positions[:, 0], finished_positions[:, 1]] == free_space_symbol
+            frame[finished_positions[is_on_free_space, 0], finished_positions[is_on_free_space, 1]] = finished_symbol
+        return frame
+
+#############################################################
+# BENCHMARKING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    # Small example: seeking and finished agents
+    paths = [[(0, 0, 0), (0, 1, 1), (0, 2, 2)], [], [(3, 3, 0)], [(2, 0, 0), (2, 1, 1), (2, 2, 2), (2, 3, 3)]]
+    timeline = PlanTimeline(paths)
+    assert timeline.get_positions(1).tolist() == [[0, 1], [-1, -1], [3, 3], [2, 1]]
+    assert timeline.get_positions(100).tolist() == [[0, 2], [-1, -1], [3, 3], [2, 3]]
+    assert timeline.get_finished(2).tolist() == [True, False, True, False] and timeline.get_makespan() == 3
+    grid = np.full((4, 4), '.')
+    print(timeline.draw_frame(3, grid, ['A', 'B', 'C', 'D'], '*', '.')[::-1])
+
+    # Many agents: per-frame loops over paths vs. timeline slices
+    num_agents, num_time_stamps, grid_length_in_cells = 5000, 200, 200
+    prng = np.random.RandomState(seed=0)
+    lengths = prng.randint(1, num_time_stamps, size=num_agents)
+    paths = [[(r, c, t) for t in range(length)] for r, c, length in zip(prng.randint(0, grid_length_in_cells, num_agents).tolist(), prng.randint(0, grid_length_in_cells, num_agents).tolist(), lengths.tolist())]
+    grid = np.full((grid_length_in_cells, grid_length_in_cells), '.')
+    agent_symbols = np.array([chr(ord('A') + i % 26) for i in range(num_agents)])
+
+    start_time = perf_counter()
+    for t in range(num_time_stamps):
+        frame = grid.copy()
+        for i in range(num_agents):
+            try:
+                position = paths[i][t][:2]
+                frame[position[0], position[1]] = agent_symbols[i]
+            except IndexError:
+                pass
+    loop_time = perf_counter() - start_time
+
+    start_time = perf_counter()
+    timeline = PlanTimeline(paths)
+    compile_time = perf_counter() - start_time
+    frame = grid.copy()
+    start_time = perf_counter()
+    for t in range(num_time_stamps):
+        timeline.draw_frame(t, grid, agent_symbols, '*', '.', frame)
+    timeline_time = perf_counter() - start_time
+
+    print(f"\n{num_agents} agents, {num_time_stamps} frames")
+    print(f"Loops over paths: {loop_time * 1e3 / num_time_stamps:.2f} ms per frame")
+    print(f"Timeline: {timeline_time * 1e3 / num_time_stamps:.2f} ms per frame (+ {compile_time * 1e3:.1f} ms to compile)")
@@ -0,0 +1,326 @@
+from heapq import heappush, heappop
+from helpers import *
+
+#================================================
+# MAIN: Region quadtree
+
+class OccupancyQuadtree:
+    '''
+    Region quadtree of the occupancy of a grid: the grid (padded with
+    obstacles to a power-of-2 square) is split recursively into 4
+    quadrants until each square is either all free or all obstacles.
+    Only these leaves are stored, so memory tracks the number of obstacle
+    boundaries rather than the area; free leaves are the nodes of a
+    leaf-level search, whose result is refined to a cell path.
+
+    ---
+
+    PARAMETERS:
+    - `environment` (BasicGridEnvironment): Environment whose grid is represented
+
+    ---
+
+    STORAGE:
+    - `.leaves` (dict): Keys: (bottom row index, left column index, side length); Items: Whether the leaf is free
+    - `.neighbour_cache` (dict): Keys: Free leaves; Items: Lists of their free neighbouring leaves (filled lazily and invalidated by updates)
+
+    The leaf containing a cell is found by checking, from the root size
+    down, whether the aligned square of each size around the cell is a
+    leaf (at most log2(side length) + 1 dictionary lookups).
+
+    NOTE: The quadtree subscribes to the environment's grid changes, and updates the cells of their dirty regions.
+    '''
+
+    def __init__(self, environment:BasicGridEnvironment):
+        self.environment = environment
+        self.obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+        self.grid_shape = environment.grid.shape
+        self.size = 1 << max(int(max(self.grid_shape) - 1).bit_length(), 0)
+        self.leaves = {}
+        self.neighbour_cache = {}
+
+        #------------------------------------
+        # Building top-down with a summed-area table of obstacles (so each square is checked in O(1)):
+        is_obstacle = np.ones((self.size, self.size), dtype=np.int64)
+        is_obstacle[:self.grid_shape[0], :self.grid_shape[1]] = np.isin(environment.grid, self.obstacle_symbols)
+        summed_area = np.zeros((self.size + 1, self.size + 1), dtype=np.int64)
+        summed_area[1:, 1:] = is_obstacle.cumsum(axis=0).cumsum(axis=1)
+        stack = [(0, 0, self.size)]
+        while stack:
+            r, c, size = stack.pop()
+            num_obstacles = summed_area[r + size, c + size] - summed_area[r, c + size] - summed_area[r + size, c] + summed_area[r, c]
+            if num_obstacles == 0 or num_obstacles == size * size:
+                self.leaves[(r, c, size)] = num_obstacles == 0
+            else:
+                half = size // 2
+                stack.extend([(r, c, half), (r + half, c, half), (r, c + half, half), (r + half, c + half, half)])
+        self.grid_version = environment.grid_version
+        environment.subscribe(self.on_grid_change)
+
+    #------------------------------------
+    # Leaf lookup and neighbours:
+
+    def get_leaf(self, position:tuple[int, int]) -> tuple[int, int, int]:
+        '''Gets the leaf containing a cell, or `None` if the cell is out of the grid.'''
+
+        r, c = position
+        if r < 0 or c < 0 or r >= self.size or c >= self.size:
+            return None
+        size = self.size
+        while size > 0:
+            leaf = (r - r % size, c - c % size, size)
+            if leaf in self.leaves:
+                return leaf
+            size //= 2
+        return None
+
+    def get_adjacent_leaves(self, leaf:tuple[int, int, int]) -> list[tuple[int, int, int]]:
+        # All leaves sharing an edge with `leaf` (free or not), found by walking along its 4 sides:
+        r, c, size = leaf
+        adjacent_leaves = []
+        for is_vertical_side, fixed, start in [(False, r + size, c), (False, r - 1, c), (True, c + size, r), (True, c - 1, r)]:
+            offset = start
+            while offset < start + size:
+                adjacent_leaf = self.get_leaf((offset, fixed) if is_vertical_side else (fixed, offset))
+                if adjacent_leaf is None:
+                    break
+                adjacent_leaves.append(adjacent_leaf)
+                offset = (adjacent_leaf[0] if is_vertical_side else adjacent_leaf[1]) + adjacent_leaf[2]
+        return adjacent_leaves
+
+    def get_free_neighbours(self, leaf:tuple[int, int, int]) -> list[tuple[int, int, int]]:
+        try:
+            return self.neighbour_cache[leaf]
+        except KeyError:
+            free_neighbours = [adjacent_leaf for adjacent_leaf in self.get_adjacent_leaves(leaf) if self.leaves[adjacent_leaf]]
+            self.neighbour_cache[leaf] = free_neighbours
+            return free_neighbours
+
+    #------------------------------------
+    # Incremental updates:
+
+    def update_cell(self, position:tuple[int, int]):
+        '''
+        Updates the quadtree after the cell at `position` has changed in
+        the environment's grid: the leaf containing it is split down to
+        the cell (if the cell's state differs from the leaf's), and
+        squares whose 4 quadrants have become leaves of the same state are
+        merged back, up to the root. Only the neighbour lists of the leaves
+        around the changed region are invalidated.
+
+        ---
+
+        PARAMETERS:
+        - `position` (tuple[int, int]): Grid position of the changed cell
+        '''
+
+        r, c = position
+        is_free = not (self.environment.grid[r, c] in self.obstacle_symbols)
+        leaf = self.get_leaf(position)
+        if self.leaves[leaf] == is_free:
+            return
+        removed_leaves = [leaf]
+        added_leaves = []
+
+        # Splitting down to the cell:
+        del self.leaves[leaf]
+        leaf_r, leaf_c, size = leaf
+        while size > 1:
+            size //= 2
+            for quadrant in [(leaf_r, leaf_c, size), (leaf_r + size, leaf_c, size), (leaf_r, leaf_c + size, size), (leaf_r + size, leaf_c + size, size)]:
+                if not (quadrant[0] <= r < quadrant[0] + size and quadrant[1] <= c < quadrant[1] + size):
+                    self.leaves[quadrant] = not is_free
+                    added_leaves.append(quadrant)
+                else:
+                    leaf_r, leaf_c = quadrant[:2]
+        self.leaves[(r, c, 1)] = is_free
+        added_leaves.append((r, c, 1))
+
+        # Merging back up while all 4 quadrants are leaves of the same state:
+        size = 1
+        affected_region = leaf
+        while size < self.size:
+            parent = (r - r % (2 * size), c - c % (2 * size), 2 * size)
+            quadrants = [(parent[0], parent[1], size), (parent[0] + size, parent[1], size), (parent[0], parent[1] + size, size), (parent[0] + size, parent[1] + size, size)]
+            if not all(quadrant in self.leaves and self.leaves[quadrant] == is_free for quadrant in quadrants):
+                break
+            for quadrant in quadrants:
+                del self.leaves[quadrant]
+                if quadrant in added_leaves:
+                    added_leaves.remove(quadrant)
+                else:
+                    removed_leaves.append(quadrant)
+            self.leaves[parent] = is_free
+            added_leaves.append(parent)
+            if parent[2] > affected_region[2]:
+                affected_region = parent
+            size *= 2
+
+        # Invalidating the neighbour lists referring to the changed region:
+        for changed_leaf in removed_leaves + added_leaves:
+            self.neighbour_cache.pop(changed_leaf, None)
+        for adjacent_leaf in self.get_adjacent_leaves(affected_region):
+            self.neighbour_cache.pop(adjacent_leaf, None)
+
+    def on_grid_change(self, event:GridChangeEvent):
+        for i_1, i_2, j_1, j_2 in event.dirty_regions:
+            for r in range(i_1, i_2):
+                for c in range(j_1, j_2):
+                    self.update_cell((r, c))
+        self.grid_version = event.grid_version
+
+    #------------------------------------
+    # Search:
+
+    def find_leaf_path(self, end_position:tuple[int, int], start_position:tuple[int, int]) -> list[tuple[int, int, int]]:
+        '''
+        A* search over free leaves, with Manhattan distances between leaf
+        centres (and the start and end cells themselves) as edge costs.
+
+        ---
+
+        PARAMETERS:
+        - `end_position` (tuple[int, int]): Position to be reached
+        - `start_position` (tuple[int, int]): Start position
+
+        RETURNS:
+        - (list[tuple[int, int, int]]): Leaves from the start leaf to the end leaf; empty if no path is found
+        '''
+
+        start_leaf, end_leaf = self.get_leaf(start_position), self.get_leaf(end_position)
+        if start_leaf is None or end_leaf is None or not (self.leaves[start_leaf] and self.leaves[end_leaf]):
+            return []
+        get_point = lambda leaf: start_position if leaf == start_leaf else end_position if leaf == end_leaf else (leaf[0] + (leaf[2] - 1) / 2, leaf[1] + (leaf[2] - 1) / 2)
+
+        path_costs = {start_leaf: 0}
+        parents = {start_leaf: None}
+        frontier = [(get_manhattan_distance(start_position, end_position), 0, start_leaf)]
+        is_expanded = set()
+        while frontier:
+            _, path_cost, leaf = heappop(frontier)
+            if leaf == end_leaf:
+                leaf_path = []
+                while leaf is not None:
+                    leaf_path.append(leaf)
+                    leaf = parents[leaf]
+                leaf_path.reverse()
+                return leaf_path
+            if leaf in is_expanded:
+                continue
+            is_expanded.add(leaf)
+            point = get_point(leaf)
+            for neighbour in self.get_free_neighbours(leaf):
+                neighbour_point = get_point(neighbour)
+                new_path_cost = path_cost + get_manhattan_distance(point, neighbour_point)
+                if new_path_cost < path_costs.get(neighbour, np.inf):
+                    path_costs[neighbour] = new_path_cost
+                    parents[neighbour] = leaf
+                    heappush(frontier, (new_path_cost + get_manhattan_distance(neighbour_point, end_position), new_path_cost, neighbour))
+        return []
+
+    def find_path(self, end_position:tuple[int, int], start_position:tuple[int, int]) -> list[tuple[int, int]]:
+        '''
+        Finds a cell path by refining a leaf path: since every free leaf is
+        an obstacle-free square, the path crosses each leaf in straight
+        moves, entering the next leaf at the point of their shared edge
+        closest to the current cell.
+
+        ---
+
+        PARAMETERS:
+        - `end_position` (tuple[int, int]): Position to be reached
+        - `start_position` (tuple[int, int]): Start position
+
+        RETURNS:
+        - (list[tuple[int, int]]): Path (in the same format as `a_star`, but without turning costs, and not necessarily shortest); empty if no path is found
+        '''
+
+        start_position, end_position = tuple(start_position), tuple(end_position)
+        leaf_path = self.find_leaf_path(end_position, start_position)
+        if leaf_path == []:
+            return []
+
+        path = [start_position]
+        def move_within_leaf(target:tuple[int, int]):
+            # Rows first, then columns (all cells in between are in the same free square):
+            r, c = path[-1]
+            while r != target[0]:
+                r += 1 if target[0] > r else -1
+                path.append((r, c))
+            while c != target[1]:
+                c += 1 if target[1] > c else -1
+                path.append((r, c))
+
+        for leaf, next_leaf in zip(leaf_path[:-1], leaf_path[1:]):
+            r, c = path[-1]
+            if next_leaf[0] == leaf[0] + leaf[2] or next_leaf[0] + next_leaf[2] == leaf[0]:
+                # Crossing a horizontal edge (the next leaf is above or below):
+                first_column, last_column = max(leaf[1], next_leaf[1]), min(leaf[1] + leaf[2], next_leaf[1] + next_leaf[2]) - 1
+                exit_cell = (leaf[0] + leaf[2] - 1 if next_leaf[0] > leaf[0] else leaf[0], min(max(c, first_column), last_column))
+                entry_cell = (next_leaf[0] if next_leaf[0] > leaf[0] else next_leaf[0] + next_leaf[2] - 1, exit_cell[1])
+            else:
+                # Crossing a vertical edge (the next leaf is to the right or left):
+                first_row, last_row = max(leaf[0], next_leaf[0]), min(leaf[0] + leaf[2], next_leaf[0] + next_leaf[2]) - 1
+                exit_cell = (min(max(r, first_row), last_row), leaf[1] + leaf[2] - 1 if next_leaf[1] > leaf[1] else leaf[1])
+                entry_cell = (exit_cell[0], next_leaf[1] if next_leaf[1] > leaf[1] else next_leaf[1] + next_leaf[2] - 1)
+            move_within_leaf(exit_cell)
+            path.append(entry_cell)
+        move_within_leaf(end_position)
+        return path
+
+    def get_report(self) -> dict:
+        '''Gets the size of the quadtree, as a dict with the keys "num_cells", "num_leaves" and "num_free_leaves".'''
+
+        return {
+            "num_cells": self.grid_shape[0] * self.grid_shape[1],
+            "num_leaves": len(self.leaves),
+            "num_free_leaves": sum(self.leaves.values())
+        }
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from algorithm_a_star import a_star
+
+    # The same obstacle layout (a few large rectangles) at increasing resolutions:
+    prng = np.random.RandomState(seed=0)
+    rectangles = [(prng.rand() * 0.9, prng.rand() * 0.9, 0.02 + prng.rand() * 0.1, 0.02 + prng.rand() * 0.1) for _ in range(15)]
+    print("Map size | Cells | Leaves | Free leaves | Build time (ms) | a_star (ms per query) | Quadtree (ms per query) | Mean path lengths")
+    for grid_length_in_cells in [64, 128, 256, 512]:
+        environment = BasicGridEnvironment(10, grid_length_in_cells)
+        with environment.batched_changes():
+            for r, c, height, width in rectangles:
+                environment.set_region(int(r * grid_length_in_cells), int((r + height) * grid_length_in_cells), int(c * grid_length_in_cells), int((c + width) * grid_length_in_cells), environment.permanent_obstacle_symbol)
+        agent = Agent(grid_length_in_cells, grid_length_in_cells)
+
+        start_time = perf_counter()
+        quadtree = OccupancyQuadtree(environment)
+        build_time = perf_counter() - start_time
+        report = quadtree.get_report()
+
+        free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+        queries = [tuple(tuple(free_space_positions[k]) for k in prng.choice(len(free_space_positions), size=2, replace=False)) for _ in range(5)]
+        timings, path_lengths = [], []
+        for search_function in [lambda end_position, start_position: a_star(end_position, start_position, agent, environment), quadtree.find_path]:
+            start_time = perf_counter()
+            paths = [search_function(end_position, start_position) for start_position, end_position in queries]
+            timings.append((perf_counter() - start_time) / len(queries))
+            path_lengths.append(np.mean([len(path) for path in paths]))
+        for path, (start_position, end_position) in zip(paths, queries):
+            assert path[0] == start_position and path[-1] == end_position
+            assert all(get_manhattan_distance(a, b) == 1 and environment.grid[b] == environment.free_space_symbol for a, b in zip(path[:-1], path[1:]))
+        print(f"{grid_length_in_cells} x {grid_length_in_cells} | {report['num_cells']} | {report['num_leaves']} | {report['num_free_leaves']} | {build_time * 1e3:.1f} | {timings[0] * 1e3:.2f} | {timings[1] * 1e3:.2f} | {path_lengths[0]:.1f}, {path_lengths[1]:.1f}")
+
+    # Incremental updates against rebuilding:
+    for _ in range(300):
+        r, c = prng.randint(grid_length_in_cells), prng.randint(grid_length_in_cells)
+        environment.set_cell((r, c), environment.temporary_obstacle_symbol if environment.grid[r, c] == environment.free_space_symbol else environment.free_space_symbol)
+        quadtree.find_path(*queries[0])
+    environment.set_region(0, 20, 0, 20, environment.permanent_obstacle_symbol)
+    rebuilt_quadtree = OccupancyQuadtree(environment)
+    assert quadtree.leaves == rebuilt_quadtree.leaves and quadtree.grid_version == environment.grid_version
+    assert all(sorted(neighbours) == sorted(rebuilt_quadtree.get_free_neighbours(leaf)) for leaf, neighbours in quadtree.neighbour_cache.items())
+    print("\nIncremental updates match rebuilding")
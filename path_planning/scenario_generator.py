@@ -0,0 +1,232 @@
+from helpers import *
+
+#================================================
+# CONNECTED COMPONENTS
+
+def get_connected_components(obstacle_symbols:list, grid:np.ndarray) -> np.ndarray:
+    '''
+    Labels the (4-connected) connected components of the free space.
+
+    ---
+
+    PARAMETERS:
+    - `obstacle_symbols` (list): List of symbols denoting obstacles in the grid
+    - `grid` (np.ndarray): 2D grid denoting the grid environment
+
+    RETURNS:
+    - (np.ndarray): Component labels of the grid's shape; 0, 1, 2, ... for free cells (in order of their 1st cell, row by row), -1 for obstacles
+
+    ---
+
+    NOTE ON VECTORISATION:
+    Rather than one flood fill per component, every free cell starts as
+    its own tree, and each iteration hooks the root of every tree onto
+    the smallest root adjacent to it (over all free adjacent pairs at
+    once), then flattens all trees. Each iteration at least halves the
+    number of trees within every component, so the number of Python-level
+    iterations is logarithmic in the component sizes, even for mazes.
+    '''
+
+    is_free = ~np.isin(grid, obstacle_symbols)
+    num_cells = is_free.size
+    labels = np.full(num_cells, -1, dtype=np.int64)
+    if not is_free.any():
+        return labels.reshape(grid.shape)
+
+    # Free adjacent pairs (as flat cell indices), horizontally and vertically:
+    cell_indices = np.arange(num_cells).reshape(grid.shape)
+    is_pair = [is_free[:, :-1] & is_free[:, 1:], is_free[:-1, :] & is_free[1:, :]]
+    first_cells = np.concatenate([cell_indices[:, :-1][is_pair[0]], cell_indices[:-1, :][is_pair[1]]])
+    second_cells = np.concatenate([cell_indices[:, 1:][is_pair[0]], cell_indices[1:, :][is_pair[1]]])
+
+    parents = np.arange(num_cells)
+    while True:
+        first_roots, second_roots = parents[first_cells], parents[second_cells]
+        is_unmerged = first_roots != second_roots
+        if not is_unmerged.any():
+            break
+        # Hooking the larger root onto the smaller one (roots only ever decrease, so no cycles form):
+        np.minimum.at(parents, np.maximum(first_roots, second_roots)[is_unmerged], np.minimum(first_roots, second_roots)[is_unmerged])
+        # Flattening all trees (pointer jumping):
+        while True:
+            grandparents = parents[parents]
+            if np.array_equal(grandparents, parents):
+                break
+            parents = grandparents
+
+    # Relabelling the roots as 0, 1, 2, ... (roots are the smallest cell index of their component):
+    free_cell_indices = np.flatnonzero(is_free)
+    _, labels[free_cell_indices] = np.unique(parents[free_cell_indices], return_inverse=True)
+    return labels.reshape(grid.shape)
+
+#================================================
+# MAIN: Scenario generator
+
+class ScenarioGenerator:
+    '''
+    Generator of random multi-agent scenarios (start and end positions)
+    over an environment, where:
+    - All start positions are distinct, and so are all end positions
+    - Each agent's end position differs from its start position
+    - Each agent's end position is in the same connected component as its start position (so every task is solvable on its own)
+
+    ---
+
+    PARAMETERS:
+    - `environment` (BasicGridEnvironment): Environment to generate scenarios within
+    - `prng_seed` (int, optional): Seed of the random streams; defaults to a random seed
+
+    ---
+
+    NOTE ON RANDOM STREAMS:
+    Start and end positions are drawn from 2 independent streams spawned
+    from the seed (with `np.random.SeedSequence`), so e.g. the end
+    positions of a seed are reproducible whatever was drawn before from
+    the other stream. `np.random.Generator` (rather than `RandomState`,
+    as elsewhere in the repository) is used, since it samples without
+    replacement in time proportional to the sample size rather than to
+    the number of cells.
+    '''
+
+    def __init__(self, environment:BasicGridEnvironment, prng_seed:int=None):
+        self.environment = environment
+        self.obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+        self.start_prng, self.end_prng = [np.random.default_rng(seed_sequence) for seed_sequence in np.random.SeedSequence(prng_seed).spawn(2)]
+        self.grid_version = None
+        self.update()
+
+    def update(self):
+        '''Recomputes the connected components (done automatically once the grid version changes).'''
+
+        labels = get_connected_components(self.obstacle_symbols, self.environment.grid).ravel()
+        free_cell_indices = np.flatnonzero(labels >= 0)
+        self.component_sizes = np.bincount(labels[free_cell_indices])
+        # Free cells grouped by component (component c's cells are `cells_by_component[component_offsets[c]:component_offsets[c + 1]]`):
+        self.cells_by_component = free_cell_indices[np.argsort(labels[free_cell_indices], kind="stable")]
+        self.component_offsets = np.concatenate([[0], np.cumsum(self.component_sizes)])
+        self.cell_labels = labels
+        # NOTE: A cell alone in its component cannot be a start position, since no end position can be reached from it
+        self.start_cell_indices = free_cell_indices[self.component_sizes[labels[free_cell_indices]] >= 2]
+        self.grid_version = self.environment.grid_version
+
+    def get_num_components(self) -> int:
+        return len(self.component_sizes)
+
+    #================================================
+    def generate(self, num_agents:int) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Generates a scenario.
+
+        ---
+
+        PARAMETERS:
+        - `num_agents` (int): Number of agents
+
+        RETURNS:
+        - (np.ndarray): Start positions, of shape (`num_agents`, 2)
+        - (np.ndarray): End positions, of shape (`num_agents`, 2)
+        '''
+
+        if self.grid_version != self.environment.grid_version:
+            self.update()
+        if num_agents > len(self.start_cell_indices):
+            raise Exception(f"{num_agents} agents were requested, but only {len(self.start_cell_indices)} free cells can be start positions")
+        num_columns = self.environment.grid.shape[1]
+
+        # Distinct start positions, in one draw without replacement:
+        start_cells = self.start_cell_indices[self.start_prng.choice(len(self.start_cell_indices), size=num_agents, replace=False)]
+        start_labels = self.cell_labels[start_cells]
+
+        # Distinct end positions, drawn within each component that has agents:
+        end_cells = np.empty(num_agents, dtype=np.int64)
+        agent_order = np.argsort(start_labels, kind="stable")
+        sorted_labels = start_labels[agent_order]
+        group_starts = np.flatnonzero(np.diff(sorted_labels, prepend=-1))
+        group_ends = np.append(group_starts[1:], num_agents)
+        for group_start, group_end, label in zip(group_starts.tolist(), group_ends.tolist(), sorted_labels[group_starts].tolist()):
+            agent_indices = agent_order[group_start:group_end]
+            component_cells = self.cells_by_component[self.component_offsets[label]:self.component_offsets[label + 1]]
+            num_group_agents = len(agent_indices)
+            # NOTE: 1 more cell than agents is drawn when possible, as a spare end position
+            drawn_cells = component_cells[self.end_prng.choice(len(component_cells), size=min(num_group_agents + 1, len(component_cells)), replace=False)]
+            group_end_cells = drawn_cells[:num_group_agents]
+
+            # Ensuring that no agent's end position is its own start position:
+            collided = np.flatnonzero(group_end_cells == start_cells[agent_indices])
+            if len(collided) >= 2:
+                # Rotating the end positions among the collided agents (each gets another collided agent's start position):
+                group_end_cells[collided] = np.roll(group_end_cells[collided], 1)
+            elif len(collided) == 1:
+                k = int(collided[0])
+                if len(drawn_cells) > num_group_agents:
+                    group_end_cells[k] = drawn_cells[-1]
+                else:
+                    # Every cell of the component is a start position; swapping with another agent's end position:
+                    other = (k + 1) % num_group_agents
+                    group_end_cells[k], group_end_cells[other] = group_end_cells[other], group_end_cells[k]
+            end_cells[agent_indices] = group_end_cells
+
+        start_positions = np.stack(np.divmod(start_cells, num_columns), axis=1)
+        end_positions = np.stack(np.divmod(end_cells, num_columns), axis=1)
+        return start_positions, end_positions
+
+#############################################################
+# BENCHMARKING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    def check_scenario(generator:ScenarioGenerator, start_positions:np.ndarray, end_positions:np.ndarray):
+        num_columns = generator.environment.grid.shape[1]
+        start_cells, end_cells = start_positions[:, 0] * num_columns + start_positions[:, 1], end_positions[:, 0] * num_columns + end_positions[:, 1]
+        assert len(np.unique(start_cells)) == len(start_cells) and len(np.unique(end_cells)) == len(end_cells)
+        assert np.all(start_cells != end_cells) and np.all(generator.cell_labels[start_cells] == generator.cell_labels[end_cells])
+        assert np.all(generator.cell_labels[start_cells] >= 0) and np.all(generator.cell_labels[end_cells] >= 0)
+
+    # Components against a batched breadth-first search (on a small grid with many pockets):
+    environment = BasicGridEnvironment(10, 30, prng_seed=3)
+    environment.generate_random_grid(p=0.3)
+    obstacle_symbols = [environment.permanent_obstacle_symbol, environment.temporary_obstacle_symbol]
+    labels = get_connected_components(obstacle_symbols, environment.grid)
+    free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+    is_reachable = get_distance_fields(free_space_positions, obstacle_symbols, environment.grid) >= 0
+    for position, reachable in zip(free_space_positions, is_reachable):
+        assert np.array_equal(reachable, labels == labels[position[0], position[1]])
+    generator = ScenarioGenerator(environment, prng_seed=0)
+    print(f"{generator.get_num_components()} components on a 30 x 30 grid")
+
+    # Scenarios filling a whole component (every start cell is also an end cell):
+    for num_agents in [1, 10, len(generator.start_cell_indices)]:
+        check_scenario(generator, *generator.generate(num_agents))
+
+    # Reproducibility:
+    assert all(np.array_equal(a, b) for a, b in zip(ScenarioGenerator(environment, 5).generate(50), ScenarioGenerator(environment, 5).generate(50)))
+
+    # Large fleets: the list-based sampling of the simulation vs. the generator
+    environment = BasicGridEnvironment(500, 1000, prng_seed=3)
+    environment.generate_random_grid(p=0.0002)
+    start_time = perf_counter()
+    generator = ScenarioGenerator(environment, prng_seed=0)
+    setup_time = perf_counter() - start_time
+    print(f"\n1000 x 1000 grid: {generator.get_num_components()} components, found in {setup_time * 1e3:.0f} ms")
+    for num_agents in [1000, 10000, 100000]:
+        start_time = perf_counter()
+        start_positions, end_positions = generator.generate(num_agents)
+        generator_time = perf_counter() - start_time
+        check_scenario(generator, start_positions, end_positions)
+
+        if num_agents <= 1000:
+            rand = np.random.RandomState(seed=0)
+            free_space_positions = get_free_space_positions(environment.free_space_symbol, environment.grid)
+            start_time = perf_counter()
+            for i in range(num_agents):
+                start_position = tuple(free_space_positions[rand.randint(0, len(free_space_positions))])
+                end_position = start_position
+                while start_position == end_position:
+                    end_position = tuple(free_space_positions[rand.randint(0, len(free_space_positions))])
+                free_space_positions.remove(list(start_position))
+            list_time = f"{(perf_counter() - start_time) * 1e3:.0f} ms"
+        else:
+            list_time = "(skipped)"
+        print(f"{num_agents} agents: list-based {list_time}, generator {generator_time * 1e3:.1f} ms")
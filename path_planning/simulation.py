@@ -1,7 +1,11 @@
 from os import system, name
-from time import sleep
-from sys import stdout, argv
+from time import perf_counter, sleep
+from sys import argv
 from multi_agent_manager import *
+from plan_timeline import PlanTimeline
+from event_log import EVENT_TYPE_CODES, EventLogReader, EventLogWriter
+from scenario_generator import ScenarioGenerator
+from terminal_renderer import TerminalRenderer
 from pandas import DataFrame
 
 def get_agent_symbols(agent_indices:list[int]) -> dict:
@@ -17,6 +21,30 @@ def get_agent_symbols(agent_indices:list[int]) -> dict:
     
     return agent_symbols
 
+def record_events(event_log_path:str, paths:list[list[tuple[int, int, int]]], planning_time:float):
+    '''
+    Records a planned simulation to an event log (see `EventLogWriter`):
+    the planning time, then the moves, waits and arrivals of all agents
+    at every time stamp until the last agent arrives. Does nothing if
+    `event_log_path` is `None`.
+
+    ---
+
+    PARAMETERS:
+    - `event_log_path` (str): Path of the log file to be written (its format is chosen automatically)
+    - `paths` (list[list[tuple[int, int, int]]]): Paths of all agents (as returned by the CA* functions)
+    - `planning_time` (float): Time taken to plan the paths (in seconds)
+    '''
+
+    if event_log_path is None:
+        return
+    timeline = PlanTimeline(paths)
+    with EventLogWriter(event_log_path) as writer:
+        writer.record("planner_timing", 0, value=planning_time)
+        for t in range(len(timeline)):
+            writer.record_timeline_step(timeline, t)
+    print(f"Recorded {writer.get_report()["num_events"]} events to \"{event_log_path}\" ({writer.log_format} log)\n")
+
 #############################################################
 # TEST CASE DEFINITIONS
 #############################################################
@@ -54,17 +82,15 @@ def test_a_star(end_position, start_position, manager:MultiAgentManager, time_st
     previous_position = None
     if user_input == 'y':
         total_time_elapsed = time_step_size
-        for current_position in path:
-            system(clear_command)
-            print('RUNNING THE SIMULATION\n\nO => Robot\n* => Path Trail')
-            grid[current_position[0], current_position[1]] = 'O'
-            if not (previous_position is None):
-                grid[previous_position[0], previous_position[1]] = '*'
-            previous_position = current_position
-            environment.display_grid_as_text(grid, color_map)
-            stdout.write(f'\rTime elapsed: {total_time_elapsed}')
-            sleep(time_step_size)
-            total_time_elapsed += time_step_size
+        with TerminalRenderer(color_map) as renderer:
+            for current_position in path:
+                grid[current_position[0], current_position[1]] = 'O'
+                if not (previous_position is None):
+                    grid[previous_position[0], previous_position[1]] = '*'
+                previous_position = current_position
+                renderer.render(grid, 'RUNNING THE SIMULATION\n\nO => Robot\n* => Path Trail\n', f'Time elapsed: {total_time_elapsed}')
+                sleep(time_step_size)
+                total_time_elapsed += time_step_size
     print("\n\nSimulation Ended\n")
 
 #================================================
@@ -130,33 +156,28 @@ def test_equal_speed_ca_star_one_path_per_agent(paths, start_positions, end_posi
     reached_agents_symbols = []
     timings = []
     if user_input == 'y':
+        timeline = PlanTimeline(paths)
+        symbols = np.array([agent_symbols[agent_index] for agent_index in agent_indices])
         t, total_time_elapsed = 0, time_step_size
-        while True:
-            system(clear_command)
-            print("RUNNING THE SIMULATION\n\n('*' = Goal position of agent which has reached its goal; may be regarded as free space)\n\n")
-            grid = environment.grid.copy()
-            for i in successful_agent_indices:
-                try:
-                    agents[i].position = paths[i][t][:2]
-                    grid[agents[i].position[0], agents[i].position[1]] = agent_symbols[agent_indices[i]]
-                except IndexError:
-                    if not (i in reached_agents_indices):
-                        reached_agents_indices.append(i)
-                        reached_agents_symbols.append(agent_symbols[i])
-                        timings.append(total_time_elapsed)
-                    if grid[agents[i].position[0], agents[i].position[1]] == environment.free_space_symbol:
-                        grid[agents[i].position[0], agents[i].position[1]] = '*'
-            environment.display_grid_as_text(grid, color_map)
-            stdout.write(f"\rTime elapsed: {total_time_elapsed}\n\n")
-            if len(reached_agents_symbols) > 0:
-                stdout.write(f"Agents who reached their goal:\n{", ".join(reached_agents_symbols)}")
+        with TerminalRenderer(color_map) as renderer:
+            while True:
+                timeline.draw_frame(t, environment.grid, symbols, '*', environment.free_space_symbol, grid)
+                # Agents which reached their goal at the previous time stamp:
+                for i in timeline.get_newly_finished_agent_indices(t - 1).tolist():
+                    reached_agents_indices.append(i)
+                    reached_agents_symbols.append(agent_symbols[i])
+                    timings.append(total_time_elapsed)
+                status_text = f"Time elapsed: {total_time_elapsed}\n\n"
+                if len(reached_agents_symbols) > 0:
+                    status_text += f"Agents who reached their goal:\n{", ".join(reached_agents_symbols)}"
+                renderer.render(grid, "RUNNING THE SIMULATION\n\n('*' = Goal position of agent which has reached its goal; may be regarded as free space)\n\n\n", status_text)
             
-            sleep(time_step_size)
-            total_time_elapsed += time_step_size
-            t += 1
+                sleep(time_step_size)
+                total_time_elapsed += time_step_size
+                t += 1
             
-            if len(reached_agents_indices) == len(successful_agent_indices):
-                break
+                if len(reached_agents_indices) == len(successful_agent_indices):
+                    break
     print("\n\nSimulation Ended\n")
     print('-' * 48)
 
@@ -219,34 +240,104 @@ def test_equal_speed_ca_star_ongoing(paths, agents, agent_indices, agent_symbols
     user_input = input("Enter y to continue with real-time simulation...\n")
     timings = []
     if user_input == 'y':
+        timeline = PlanTimeline(paths)
+        symbols = np.array([agent_symbols[agent_index] for agent_index in agent_indices])
         t, total_time_elapsed = 0, time_step_size
-        while True:
-            system(clear_command)
-            print("RUNNING THE SIMULATION\n\n('*' = Goal position of agent which has reached its goal; regarded as free space)\n\n")
-            grid = environment.grid.copy()
-            for i in agent_indices:
-                try:
-                    agents[i].position = paths[i][t][:2]
-                    grid[agents[i].position[0], agents[i].position[1]] = agent_symbols[agent_indices[i]]
-                except IndexError:
-                    if grid[agents[i].position[0], agents[i].position[1]] == environment.free_space_symbol:
-                        grid[agents[i].position[0], agents[i].position[1]] = '*'
-            environment.display_grid_as_text(grid, color_map)
-            stdout.write(f"\rTime elapsed: {total_time_elapsed}\n\n")
-            
-            sleep(time_step_size)
-            total_time_elapsed += time_step_size
-            t += 1
-    
+        with TerminalRenderer(color_map) as renderer:
+            while True:
+                timeline.draw_frame(t, environment.grid, symbols, '*', environment.free_space_symbol, grid)
+                renderer.render(grid, "RUNNING THE SIMULATION\n\n('*' = Goal position of agent which has reached its goal; regarded as free space)\n\n\n", f"Time elapsed: {total_time_elapsed}\n\n")
+                
+                sleep(time_step_size)
+                total_time_elapsed += time_step_size
+                t += 1
+
+#================================================
+# TEST CASE 4: REPLAY OF A RECORDED SIMULATION
+
+def test_replay(event_log_path, time_step_size=0.5):
+    reader = EventLogReader(event_log_path)
+    columns = reader.get_columns()
+    time_stamps, agent_indices_of_events = columns["time_stamp"], columns["agent_index"]
+    num_agents = int(agent_indices_of_events.max()) + 1 if len(agent_indices_of_events) > 0 else 0
+    agent_indices = list(range(num_agents))
+    agent_symbols = get_agent_symbols(agent_indices)
+
+    # Summary of the recorded simulation:
+    print(f"\nREPLAYING \"{event_log_path}\" ({reader.log_format} log, {reader.get_num_events()} events, {num_agents} agents)\n")
+    print(f"Planning time: {reader.get_events("planner_timing")["value"].sum():.3f} s\n")
+    arrival_times = reader.get_arrival_times(num_agents)
+    print(DataFrame(data={"Agent": [agent_symbols[i] for i in agent_indices], "Arrival time stamp": arrival_times}))
+    print('-' * 48)
+
+    # Defining color map:
+    color_map = {
+        environment.free_space_symbol: COLORS["blue"],
+        environment.permanent_obstacle_symbol: COLORS["red"],
+        environment.temporary_obstacle_symbol: COLORS["red"],
+        '*': COLORS["bright_blue"]
+    }
+    # Coloring the agents:
+    color_choices = [
+        "green",
+        "white",
+        "magenta",
+        "bright_black",
+        "yellow",
+        "bright_red",
+        "bright_green",
+        "bright_yellow",
+        "bright_magenta",
+        "bright_white"]
+    for i in agent_indices:
+        color_map[agent_symbols[i]] = COLORS[color_choices[i % len(color_choices)]]
+
+    # Replaying real-time:
+    user_input = input("Enter y to continue with the replay...\n")
+    if user_input == 'y' and len(time_stamps) > 0:
+        symbols = np.array([agent_symbols[i] for i in agent_indices])
+        has_position = (columns["row"] >= 0) & (agent_indices_of_events >= 0)
+        is_arrival = columns["event_type"] == EVENT_TYPE_CODES["arrival"]
+        positions = np.full((num_agents, 2), -1, dtype=np.int64)
+        has_arrived = np.zeros(num_agents, dtype=bool)
+        grid = environment.grid.copy()
+        total_time_elapsed = time_step_size
+        with TerminalRenderer(color_map) as renderer:
+            for t in range(int(time_stamps[-1]) + 1):
+                # Applying the events of time stamp t (events are in time order):
+                start, end = np.searchsorted(time_stamps, [t, t + 1])
+                is_selected = np.flatnonzero(has_position[start:end]) + start
+                positions[agent_indices_of_events[is_selected]] = np.stack([columns["row"][is_selected], columns["column"][is_selected]], axis=1)
+
+                # Drawing the agents (those which arrived before t as '*', on free space only, as in `PlanTimeline.draw_frame`):
+                np.copyto(grid, environment.grid)
+                is_moving = (positions[:, 0] >= 0) & ~has_arrived
+                grid[positions[is_moving, 0], positions[is_moving, 1]] = symbols[is_moving]
+                arrived_positions = positions[has_arrived]
+                is_on_free_space = grid[arrived_positions[:, 0], arrived_positions[:, 1]] == environment.free_space_symbol
+                grid[arrived_positions[is_on_free_space, 0], arrived_positions[is_on_free_space, 1]] = '*'
+                has_arrived[agent_indices_of_events[start:end][is_arrival[start:end]]] = True
+
+                renderer.render(grid, "REPLAYING THE SIMULATION\n\n('*' = Goal position of agent which has reached its goal)\n\n\n", f"Time stamp: {t}\nTime elapsed: {total_time_elapsed}\n\n")
+                sleep(time_step_size)
+                total_time_elapsed += time_step_size
+    print("\n\nReplay Ended\n")
+
 #############################################################
 # RUNNING TEST CASES
 #############################################################
 
 test_case = argv[1]
 if name == "nt":
-    clear_command = "cls"
-else:
-    clear_command = "clear"
+    # NOTE: Enables ANSI escape codes (used by `TerminalRenderer`) in the Windows console
+    system("")
+
+# Optional event log of the CA* test cases (e.g. `--event_log=events.arrow`), which the "replay" test case can play back:
+event_log_path = None
+for argument in argv[2:]:
+    if argument.startswith("--event_log="):
+        event_log_path = argument[len("--event_log="):]
+        argv.remove(argument)
 
 #================================================
 # A*
@@ -286,7 +377,9 @@ if test_case == "fixed_priorities_equal_speed_ca_star":
     # NOTE: The order in which agent indices were given determines agent priorities
     manager = MultiAgentManager(agents, environment)
     agent_indices = list(range(len(agents)))
+    start_time = perf_counter()
     paths, agents = manager.fixed_priority_equal_speed_ca_star(end_positions, start_positions, agent_indices)
+    record_events(event_log_path, paths, perf_counter() - start_time)
     agent_symbols = get_agent_symbols(agent_indices)
     test_equal_speed_ca_star_one_path_per_agent(paths, start_positions, end_positions, agents, agent_indices, agent_symbols, 0.5)
 
@@ -300,34 +393,17 @@ if test_case == "fixed_priorities_equal_speed_ca_star_randomised":
         num_agents = 3
     environment = BasicGridEnvironment(10, 20, prng_seed=3)
     environment.generate_random_grid()
-    free_space_positions = np.argwhere(environment.grid == environment.free_space_symbol).tolist()
-
-    prng_seed = 5
-    rand = np.random.RandomState(seed=prng_seed)
-
-    agents = []
-    start_positions = []
-    end_positions = []
-    for i in range(num_agents):
-        # Create a new agent:
-        agents.append(Agent(a, b))
-        
-        # Setting random start and end positions (making sure the end position is not the same as the start):
-        start_position = tuple(free_space_positions[rand.randint(0, len(free_space_positions))])
-        end_position = start_position
-        while start_position == end_position:
-            end_position = tuple(free_space_positions[rand.randint(0, len(free_space_positions))])
-        
-        # To make sure no other agent is given the same start position:
-        free_space_positions.remove(list(start_position))
-
-        # Add start and end positions for agent:
-        start_positions.append(start_position)
-        end_positions.append(end_position)
+    # Setting random start and end positions (all distinct, with each end position reachable from its start):
+    start_positions, end_positions = ScenarioGenerator(environment, prng_seed=5).generate(num_agents)
+    start_positions = [tuple(position) for position in start_positions.tolist()]
+    end_positions = [tuple(position) for position in end_positions.tolist()]
+    agents = [Agent(environment.grid.shape[0], environment.grid.shape[1]) for _ in range(num_agents)]
     
     manager = MultiAgentManager(agents, environment)
     agent_indices = list(range(len(agents)))
+    start_time = perf_counter()
     paths, agents = manager.fixed_priority_equal_speed_ca_star(end_positions, start_positions, agent_indices)
+    record_events(event_log_path, paths, perf_counter() - start_time)
     agent_symbols = get_agent_symbols(agent_indices)
     test_equal_speed_ca_star_one_path_per_agent(paths, start_positions, end_positions, agents, agent_indices, agent_symbols, 1)
 
@@ -350,34 +426,17 @@ if test_case == "windowed_equal_speed_ca_star":
     
     environment = BasicGridEnvironment(10, 20, prng_seed=3)
     environment.generate_random_grid()
-    free_space_positions = np.argwhere(environment.grid == environment.free_space_symbol).tolist()
-
-    prng_seed = 6
-    rand = np.random.RandomState(seed=prng_seed)
-
-    agents = []
-    start_positions = []
-    end_positions = []
-    for i in range(num_agents):
-        # Create a new agent:
-        agents.append(Agent(environment.grid.shape[0], environment.grid.shape[1]))
-        
-        # Setting random start and end positions (making sure the end position is not the same as the start):
-        start_position = tuple(free_space_positions[rand.randint(0, len(free_space_positions))])
-        end_position = start_position
-        while start_position == end_position:
-            end_position = tuple(free_space_positions[rand.randint(0, len(free_space_positions))])
-        
-        # To make sure no other agent is given the same start position:
-        free_space_positions.remove(list(start_position))
-
-        # Add start and end positions for agent:
-        start_positions.append(start_position)
-        end_positions.append(end_position)
+    # Setting random start and end positions (all distinct, with each end position reachable from its start):
+    start_positions, end_positions = ScenarioGenerator(environment, prng_seed=6).generate(num_agents)
+    start_positions = [tuple(position) for position in start_positions.tolist()]
+    end_positions = [tuple(position) for position in end_positions.tolist()]
+    agents = [Agent(environment.grid.shape[0], environment.grid.shape[1]) for _ in range(num_agents)]
     
     manager = MultiAgentManager(agents, environment)
     agent_indices = list(range(len(agents)))
+    start_time = perf_counter()
     paths, agents = manager.windowed_equal_speed_ca_star_v1(end_positions, start_positions, agent_indices, window_size=window_size, reprioritisation_approach=reprioritisation_approach)
+    record_events(event_log_path, paths, perf_counter() - start_time)
     agent_symbols = get_agent_symbols(agent_indices)
     test_equal_speed_ca_star_one_path_per_agent(paths, start_positions, end_positions, agents, agent_indices, agent_symbols, 1)
 
@@ -396,34 +455,17 @@ if test_case == "windowed_equal_speed_ca_star_variable_window_size":
     
     environment = BasicGridEnvironment(10, 20, prng_seed=3)
     environment.generate_random_grid()
-    free_space_positions = np.argwhere(environment.grid == environment.free_space_symbol).tolist()
-
-    prng_seed = 6
-    rand = np.random.RandomState(seed=prng_seed)
-
-    agents = []
-    start_positions = []
-    end_positions = []
-    for i in range(num_agents):
-        # Create a new agent:
-        agents.append(Agent(environment.grid.shape[0], environment.grid.shape[1]))
-        
-        # Setting random start and end positions (making sure the end position is not the same as the start):
-        start_position = tuple(free_space_positions[rand.randint(0, len(free_space_positions))])
-        end_position = start_position
-        while start_position == end_position or end_position in end_positions:
-            end_position = tuple(free_space_positions[rand.randint(0, len(free_space_positions))])
-        
-        # To make sure no other agent is given the same start position:
-        free_space_positions.remove(list(start_position))
-
-        # Add start and end positions for agent:
-        start_positions.append(start_position)
-        end_positions.append(end_position)
+    # Setting random start and end positions (all distinct, with each end position reachable from its start):
+    start_positions, end_positions = ScenarioGenerator(environment, prng_seed=6).generate(num_agents)
+    start_positions = [tuple(position) for position in start_positions.tolist()]
+    end_positions = [tuple(position) for position in end_positions.tolist()]
+    agents = [Agent(environment.grid.shape[0], environment.grid.shape[1]) for _ in range(num_agents)]
     
     manager = MultiAgentManager(agents, environment)
     agent_indices = list(range(len(agents)))
+    start_time = perf_counter()
     paths, agents = manager.windowed_equal_speed_ca_star_v2(end_positions, start_positions, agent_indices, window_size=window_size)
+    record_events(event_log_path, paths, perf_counter() - start_time)
     agent_symbols = get_agent_symbols(agent_indices)
     test_equal_speed_ca_star_one_path_per_agent(paths, start_positions, end_positions, agents, agent_indices, agent_symbols, 1)
 
@@ -446,6 +488,21 @@ if test_case == "windowed_equal_speed_ca_star_ongoing":
     agents = [Agent(environment.grid.shape[0], environment.grid.shape[1]) for _ in range(num_agents)]    
     manager = MultiAgentManager(agents, environment)
     agent_indices = list(range(len(agents)))
+    start_time = perf_counter()
     paths, agents = manager.windowed_equal_speed_ca_star_v3(agent_indices, window_size=window_size, num_time_steps_before_return=5, prng_seed=10)
+    record_events(event_log_path, paths, perf_counter() - start_time)
     agent_symbols = get_agent_symbols(agent_indices)
     test_equal_speed_ca_star_ongoing(paths, agents, agent_indices, agent_symbols, 1)
+
+#================================================
+# REPLAY OF A RECORDED SIMULATION
+
+if test_case == "replay":
+    # NOTE: Logs hold agent events only; the environment is rebuilt as in the CA* test cases above
+    environment = BasicGridEnvironment(10, 20, prng_seed=3)
+    environment.generate_random_grid()
+    try:
+        time_step_size = float(argv[3])
+    except IndexError:
+        time_step_size = 0.5
+    test_replay(argv[2], time_step_size)
@@ -0,0 +1,257 @@
+from itertools import chain
+from helpers import *
+
+#================================================
+# PACKING PATHS INTO A SINGLE ARRAY
+
+def pack_paths(paths:list[list[tuple[int]]], do_agents_disappear_at_goal:bool=True) -> np.ndarray:
+    '''
+    Packs all agent paths into a single integer array of the shape
+    (number of agents, number of time stamps, 2).
+
+    ---
+
+    PARAMETERS:
+    - `paths` (list[list[tuple[int]]]): List of paths, each corresponding to an agent; the i-th position in a path is taken to be at time stamp i
+    - `do_agents_disappear_at_goal` (bool, optional): Whether agents disappear after reaching their end positions (as in the CA* functions) or stay there
+
+    RETURNS:
+    - (np.ndarray): Packed paths; time stamps at which an agent is absent (empty path, or after disappearing) hold -1
+
+    ---
+
+    NOTE ON TIME STAMPS:
+    The time stamps stored in the paths are ignored, because windowed CA*
+    restarts them every window; the index within a path is the actual
+    time stamp.
+    '''
+
+    lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=len(paths))
+    num_agents, total_length = len(paths), int(lengths.sum())
+    max_length = int(lengths.max()) if num_agents > 0 else 0
+    packed = np.full((num_agents, max_length, 2), -1, dtype=np.int64)
+    if total_length == 0:
+        return packed
+
+    # Flattening all positions at once (rather than converting path by path):
+    position_length = len(next(path for path in paths if path != [])[0])
+    flat_positions = np.fromiter(chain.from_iterable(chain.from_iterable(paths)), dtype=np.int64, count=total_length * position_length).reshape(total_length, position_length)[:, :2]
+
+    # Scattering the positions into the packed array:
+    offsets = np.cumsum(lengths) - lengths
+    agent_ids = np.repeat(np.arange(num_agents), lengths)
+    time_ids = np.arange(total_length) - np.repeat(offsets, lengths)
+    packed[agent_ids, time_ids] = flat_positions
+
+    # Padding with end positions if agents stay at their goals:
+    if not do_agents_disappear_at_goal:
+        has_path = lengths > 0
+        final_positions = flat_positions[(offsets + lengths - 1)[has_path]]
+        is_padding = np.arange(max_length)[None, :] >= lengths[has_path, None]
+        packed[has_path] = np.where(is_padding[..., None], final_positions[:, None, :], packed[has_path])
+
+    return packed
+
+#================================================
+# CONFLICT DETECTION
+
+def get_duplicate_pairs(keys:np.ndarray, num_ignored_bits:int=0) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Sorts integer keys and gets all pairs of elements with equal keys,
+    i.e. every pair within each group of equal keys (3 elements with the
+    same key give 3 pairs).
+
+    ---
+
+    PARAMETERS:
+    - `keys` (np.ndarray): 1D integer keys
+    - `num_ignored_bits` (int, optional): Number of lowest bits ignored when comparing keys (they still take part in sorting)
+
+    RETURNS:
+    - (np.ndarray): Original indices of the 1st elements of the duplicate pairs
+    - (np.ndarray): Original indices of the 2nd elements of the duplicate pairs (each after the 1st one in sorted order)
+    '''
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order] >> num_ignored_bits
+    num_keys = len(sorted_keys)
+    # Number of later elements in the same group, for each element in sorted order:
+    is_group_start = np.ones(num_keys, dtype=bool)
+    is_group_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    group_ends = np.append(np.flatnonzero(is_group_start)[1:], num_keys)
+    num_later_elements = group_ends[np.cumsum(is_group_start) - 1] - np.arange(num_keys) - 1
+    # Pairing each element with every later element of its group:
+    first_positions = np.repeat(np.arange(num_keys), num_later_elements)
+    pair_offsets = np.cumsum(num_later_elements) - num_later_elements
+    second_positions = first_positions + 1 + np.arange(len(first_positions)) - np.repeat(pair_offsets, num_later_elements)
+    return order[first_positions], order[second_positions]
+
+def find_conflicts(packed_paths:np.ndarray, are_diagonal_moves_allowed:bool=False) -> dict[str, np.ndarray]:
+    '''
+    Finds all vertex, swap and crossing conflicts in packed paths using
+    sorting instead of nested loops over agents and time stamps, as well
+    as all invalid moves.
+
+    - Vertex conflict: 2 agents in the same cell at the same time stamp
+    - Swap conflict: 2 agents exchanging cells between 2 time stamps
+    - Crossing conflict: 2 agents moving across the 2 diagonals of the same 2 x 2 block between 2 time stamps
+    - Invalid move: 1 agent jumping between non-adjacent cells between 2 time stamps
+
+    ---
+
+    PARAMETERS:
+    - `packed_paths` (np.ndarray): Paths packed by `pack_paths`
+    - `are_diagonal_moves_allowed` (bool, optional): Whether moves may be diagonal (8-connected, i.e. Chebyshev length 1) or not (4-connected, i.e. Manhattan length 1)
+
+    RETURNS:
+    - (dict[str, np.ndarray]): Conflicts, keyed by "vertex", "swap", "crossing" and "invalid_move"; each item is an array of rows (time stamp, agent index 1, agent index 2), except for "invalid_move", whose rows are (time stamp, agent index, move length) \n
+      NOTE: For swap and crossing conflicts and invalid moves, the time stamp is the one at which the movement starts; move lengths are Chebyshev lengths if diagonal moves are allowed, else Manhattan lengths
+
+    ---
+
+    NOTE ON KEYS:
+    Each check packs (time stamp, cell, ...) into a single int64 key, so
+    that one `np.argsort` brings all conflicting elements next to each
+    other; this is much faster than sorting by several keys with
+    `np.lexsort`. Longer jumps than the allowed moves are reported as
+    invalid moves, and are not checked for swaps or crossings.
+    '''
+
+    num_agents, num_time_stamps, _ = packed_paths.shape
+    conflicts = {conflict_type: np.empty((0, 3), dtype=np.int64) for conflict_type in ["vertex", "swap", "crossing", "invalid_move"]}
+    if num_agents == 0 or num_time_stamps == 0:
+        return conflicts
+
+    #------------------------------------
+    # Invalid moves (jumps between non-adjacent cells, while present at both time stamps):
+    is_present = packed_paths[..., 0] >= 0
+    is_present_twice = is_present[:, :-1] & is_present[:, 1:]
+    move_components = np.abs(packed_paths[:, 1:].astype(np.int64) - packed_paths[:, :-1].astype(np.int64))
+    move_lengths = move_components.max(axis=2) if are_diagonal_moves_allowed else move_components.sum(axis=2)
+    invalid_agent_ids, invalid_time_ids = np.nonzero(is_present_twice & (move_lengths > 1))
+    conflicts["invalid_move"] = np.stack([invalid_time_ids, invalid_agent_ids, move_lengths[invalid_agent_ids, invalid_time_ids]], axis=1)
+
+    if num_agents < 2:
+        return conflicts
+
+    rows, columns = packed_paths[..., 0].astype(np.int64), packed_paths[..., 1].astype(np.int64)
+    # NOTE: At least 3 columns are assumed so that the cell differences of the 4 edge directions below are distinct
+    num_columns = max(int(columns.max()) + 1, 3)
+    num_cells = (int(rows.max()) + 1) * num_columns
+    cells = rows * num_columns + columns
+    agent_ids = np.broadcast_to(np.arange(num_agents)[:, None], rows.shape)
+    time_ids = np.broadcast_to(np.arange(num_time_stamps)[None, :], rows.shape)
+
+    #------------------------------------
+    # Vertex conflicts (same cell, same time stamp):
+    t, a = time_ids[is_present], agent_ids[is_present]
+    first, second = get_duplicate_pairs(t * num_cells + cells[is_present])
+    conflicts["vertex"] = np.stack([t[first], a[first], a[second]], axis=1)
+
+    if num_time_stamps < 2:
+        return conflicts
+
+    #------------------------------------
+    # Movements between consecutive time stamps:
+    is_moving = is_present_twice & (cells[:, :-1] != cells[:, 1:])
+    t = time_ids[:, :-1][is_moving]
+    a = agent_ids[:, :-1][is_moving]
+    from_cells, to_cells = cells[:, :-1][is_moving], cells[:, 1:][is_moving]
+
+    #------------------------------------
+    # Swap conflicts (same undirected edge, opposite directions):
+    # NOTE: An undirected edge is keyed by its lower cell and the direction (0 to 3) of its upper cell
+    lower_cells = np.minimum(from_cells, to_cells)
+    cell_differences = np.abs(to_cells - from_cells)
+    edge_directions = np.select([cell_differences == 1, cell_differences == num_columns, cell_differences == num_columns + 1, cell_differences == num_columns - 1], [0, 1, 2, 3], -1)
+    is_adjacent_move = edge_directions >= 0
+    first, second = get_duplicate_pairs(((t * num_cells + lower_cells) * 4 + edge_directions)[is_adjacent_move])
+    indices = np.flatnonzero(is_adjacent_move)
+    first, second = indices[first], indices[second]
+    # NOTE: Duplicates in the same direction are vertex conflicts, which were already found
+    is_swap = from_cells[first] != from_cells[second]
+    conflicts["swap"] = np.stack([t[first][is_swap], a[first][is_swap], a[second][is_swap]], axis=1)
+
+    #------------------------------------
+    # Crossing conflicts (both diagonals of the same 2 x 2 block):
+    # NOTE: A diagonal move is keyed by its block's lower left cell, with its diagonal type in the lowest bit
+    is_diagonal = (edge_directions == 2) | (edge_directions == 3)
+    if np.count_nonzero(is_diagonal) > 1:
+        t, a = t[is_diagonal], a[is_diagonal]
+        diagonal_types = (edge_directions[is_diagonal] == 2).astype(np.int64)
+        block_cells = lower_cells[is_diagonal] - (1 - diagonal_types)
+        first, second = get_duplicate_pairs((t * num_cells + block_cells) * 2 + diagonal_types, num_ignored_bits=1)
+        is_crossing = diagonal_types[first] != diagonal_types[second]
+        conflicts["crossing"] = np.stack([t[first][is_crossing], a[first][is_crossing], a[second][is_crossing]], axis=1)
+
+    return conflicts
+
+#================================================
+# MAIN: Solution validation
+
+def validate_paths(paths:list[list[tuple[int]]], do_agents_disappear_at_goal:bool=True, are_diagonal_moves_allowed:bool=False) -> dict[str, np.ndarray]:
+    '''
+    Validates a multi-agent solution by finding all of its vertex, swap
+    and crossing conflicts and invalid moves.
+
+    ---
+
+    PARAMETERS:
+    - `paths` (list[list[tuple[int]]]): List of paths, each corresponding to an agent
+    - `do_agents_disappear_at_goal` (bool, optional): Whether agents disappear after reaching their end positions (as in the CA* functions) or stay there
+    - `are_diagonal_moves_allowed` (bool, optional): Whether moves may be diagonal or not
+
+    RETURNS:
+    - (dict[str, np.ndarray]): Conflicts, as returned by `find_conflicts`
+    '''
+
+    return find_conflicts(pack_paths(paths, do_agents_disappear_at_goal), are_diagonal_moves_allowed)
+
+def is_conflict_free(paths:list[list[tuple[int]]], do_agents_disappear_at_goal:bool=True, are_diagonal_moves_allowed:bool=False) -> bool:
+    '''
+    Checks if a multi-agent solution has no conflicts (nor invalid moves).
+
+    ---
+
+    PARAMETERS:
+    - `paths` (list[list[tuple[int]]]): List of paths, each corresponding to an agent
+    - `do_agents_disappear_at_goal` (bool, optional): Whether agents disappear after reaching their end positions (as in the CA* functions) or stay there
+    - `are_diagonal_moves_allowed` (bool, optional): Whether moves may be diagonal or not
+
+    RETURNS:
+    - (bool): Conflict-free or not
+    '''
+
+    return all(len(conflicts) == 0 for conflicts in validate_paths(paths, do_agents_disappear_at_goal, are_diagonal_moves_allowed).values())
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    # Hand-made conflicts:
+    paths = [
+        [(0, 0, 0), (0, 1, 1), (0, 2, 2)],
+        [(0, 2, 0), (0, 1, 1)],            # Vertex conflict with agent 0 at time stamp 1
+        [(5, 5, 0), (5, 6, 1)],
+        [(5, 6, 0), (5, 5, 1)],            # Swap conflict with agent 2 at time stamp 0
+        [(8, 8, 0), (9, 9, 1)],
+        [(8, 9, 0), (9, 8, 1)],            # Crossing conflict with agent 4 at time stamp 0
+        [(12, 0, 0), (12, 1, 1), (12, 4, 2)],  # Invalid move (jump of 3 cells) at time stamp 1
+    ]
+    for conflict_type, conflicts in validate_paths(paths, are_diagonal_moves_allowed=True).items():
+        columns = "time stamp, agent index, move length" if conflict_type == "invalid_move" else "time stamp, agent index 1, agent index 2"
+        print(f"{conflict_type.upper().replace('_', ' ')} CONFLICTS ({columns}):\n{conflicts}\n")
+
+    # Timing on a large randomised plan:
+    num_agents, num_time_stamps, grid_length_in_cells = 10000, 200, 1000
+    prng = np.random.RandomState(seed=0)
+    steps = np.array([(0, 0), (1, 0), (0, -1), (-1, 0), (0, 1)])
+    starts = prng.randint(0, grid_length_in_cells, size=(num_agents, 1, 2))
+    packed_paths = np.clip(starts + np.cumsum(steps[prng.randint(0, len(steps), size=(num_agents, num_time_stamps))], axis=1), 0, grid_length_in_cells - 1)
+    start_time = perf_counter()
+    conflicts = find_conflicts(packed_paths)
+    print(f"Checked {num_agents} agents x {num_time_stamps} time stamps in {perf_counter() - start_time:.3f} s")
+    print({conflict_type: len(conflicts[conflict_type]) for conflict_type in conflicts})
@@ -0,0 +1,282 @@
+from helpers import *
+
+#================================================
+# ASSIGNMENT SOLVERS
+
+def hungarian_assignment(cost_matrix:np.ndarray) -> np.ndarray:
+    '''
+    Solves the (rectangular) linear assignment problem with the Hungarian
+    algorithm (shortest augmenting paths with potentials, O(n^2 m)).
+
+    ---
+
+    PARAMETERS:
+    - `cost_matrix` (np.ndarray): Cost matrix of the shape (number of agents, number of tasks)
+
+    RETURNS:
+    - (np.ndarray): Task index assigned to each agent (-1 if none, which happens only if there are more agents than tasks)
+    '''
+
+    num_rows, num_columns = cost_matrix.shape
+    if num_rows > num_columns:
+        # Solving the transposed problem (tasks choosing agents) and inverting the result:
+        column_assignment = hungarian_assignment(cost_matrix.T)
+        assignment = np.full(num_rows, -1, dtype=np.int64)
+        assignment[column_assignment] = np.arange(num_columns)
+        return assignment
+
+    cost_matrix = cost_matrix.astype(float)
+    # NOTE: Index 0 of columns is a dummy column; row i of the problem is row i - 1 of the cost matrix
+    u = np.zeros(num_rows + 1)
+    v = np.zeros(num_columns + 1)
+    column_rows = np.zeros(num_columns + 1, dtype=np.int64)
+    for i in range(1, num_rows + 1):
+        column_rows[0] = i
+        j0 = 0
+        min_slacks = np.full(num_columns + 1, np.inf)
+        previous_columns = np.zeros(num_columns + 1, dtype=np.int64)
+        is_used = np.zeros(num_columns + 1, dtype=bool)
+        while column_rows[j0] != 0:
+            is_used[j0] = True
+            i0 = column_rows[j0]
+            # Updating the slacks of all unused columns at once:
+            slacks = cost_matrix[i0 - 1] - u[i0] - v[1:]
+            is_unused = ~is_used[1:]
+            is_improved = is_unused & (slacks < min_slacks[1:])
+            min_slacks[1:][is_improved] = slacks[is_improved]
+            previous_columns[1:][is_improved] = j0
+            j1 = int(np.argmin(np.where(is_unused, min_slacks[1:], np.inf))) + 1
+            delta = min_slacks[j1]
+            # Updating the potentials:
+            u[column_rows[is_used]] += delta
+            v[is_used] -= delta
+            min_slacks[~is_used] -= delta
+            j0 = j1
+        # Augmenting along the found path:
+        while j0 != 0:
+            j1 = previous_columns[j0]
+            column_rows[j0] = column_rows[j1]
+            j0 = j1
+
+    assignment = np.full(num_rows, -1, dtype=np.int64)
+    is_assigned = column_rows[1:] != 0
+    assignment[column_rows[1:][is_assigned] - 1] = np.arange(num_columns)[is_assigned]
+    return assignment
+
+def auction_assignment(cost_matrix:np.ndarray, prices:np.ndarray=None, assignment:np.ndarray=None) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Solves the linear assignment problem with the (forward) auction
+    algorithm, in which unassigned agents bid for their most profitable
+    tasks; can be warm-started from previous prices and assignments.
+
+    ---
+
+    PARAMETERS:
+    - `cost_matrix` (np.ndarray): Integer cost matrix of the shape (number of agents, number of tasks), with no more agents than tasks
+    - `prices` (np.ndarray, optional): Initial task prices (warm start)
+    - `assignment` (np.ndarray, optional): Initial task index of each agent (-1 if none; warm start)
+
+    RETURNS:
+    - (np.ndarray): Task index assigned to each agent
+    - (np.ndarray): Final task prices (to warm-start later re-solving)
+
+    ---
+
+    NOTE ON OPTIMALITY:
+    The problem is made square by adding dummy agents with zero cost for
+    every task; the final bid increment (epsilon) is below 1 / number of
+    tasks, so the result is optimal for integer costs. Epsilon is scaled
+    down in phases, which greatly reduces the number of bids. Each phase
+    keeps the assignments that are still within epsilon of the best
+    choice at the current prices (epsilon-complementary slackness), so a
+    warm start only rebids for the agents affected by the changes.
+    '''
+
+    num_rows, num_columns = cost_matrix.shape
+    if num_rows > num_columns:
+        raise Exception(f"Auction assignment expects no more agents than tasks, but got {num_rows} agents and {num_columns} tasks")
+    benefits = np.zeros((num_columns, num_columns))
+    benefits[:num_rows] = -cost_matrix
+    final_epsilon = 1 / (num_columns + 1)
+
+    # Setting up epsilon phases:
+    epsilons = []
+    epsilon = (benefits.max() - benefits.min()) / 4
+    while epsilon > final_epsilon:
+        epsilons.append(epsilon)
+        epsilon /= 5
+    epsilons.append(final_epsilon)
+    prices = np.zeros(num_columns) if prices is None else prices.astype(float).copy()
+    full_assignment = np.full(num_columns, -1, dtype=np.int64)
+    if assignment is not None:
+        full_assignment[:num_rows] = assignment
+
+    for epsilon in epsilons:
+        # Unassigning agents violating epsilon-complementary slackness:
+        rows = np.flatnonzero(full_assignment >= 0)
+        if len(rows) > 0:
+            values = benefits[rows] - prices
+            is_violating = values[np.arange(len(rows)), full_assignment[rows]] < values.max(axis=1) - epsilon
+            full_assignment[rows[is_violating]] = -1
+        column_rows = np.full(num_columns, -1, dtype=np.int64)
+        column_rows[full_assignment[full_assignment >= 0]] = np.flatnonzero(full_assignment >= 0)
+
+        # Bidding until every agent is assigned:
+        unassigned_rows = list(np.flatnonzero(full_assignment < 0))
+        while len(unassigned_rows) > 0:
+            i = unassigned_rows.pop()
+            values = benefits[i] - prices
+            if num_columns == 1:
+                j, bid_increment = 0, epsilon
+            else:
+                best_two = np.argpartition(-values, 1)[:2]
+                j, k = (best_two[0], best_two[1]) if values[best_two[0]] >= values[best_two[1]] else (best_two[1], best_two[0])
+                bid_increment = values[j] - values[k] + epsilon
+            prices[j] += bid_increment
+            # The previous holder of the task (if any) is outbid:
+            if column_rows[j] >= 0:
+                full_assignment[column_rows[j]] = -1
+                unassigned_rows.append(column_rows[j])
+            column_rows[j] = i
+            full_assignment[i] = j
+
+    return full_assignment[:num_rows], prices
+
+#================================================
+# MAIN: Task assignment with incremental re-solving
+
+VALID_ASSIGNMENT_APPROACHES = ["hungarian", "auction"]
+
+class TaskAssigner:
+    '''
+    Assigns tasks (goal positions) to agents so that the total distance
+    from agents to their tasks is minimised, using a cost matrix built
+    from cached distance fields.
+
+    ---
+
+    PARAMETERS:
+    - `environment` (BasicGridEnvironment): Environment to navigate within
+    - `assignment_approach` (str, optional): Assignment solver to use
+        - "hungarian": Hungarian algorithm (re-solves from scratch, but reuses cached distance fields)
+        - "auction": Auction algorithm (re-solves incrementally from the previous prices and assignment)
+
+    ---
+
+    NOTE ON UNREACHABLE TASKS:
+    Unreachable tasks are given a cost larger than any reachable one, so
+    that they are only assigned when nothing else is possible; such
+    assignments are reported as -1.
+    '''
+
+    def __init__(self, environment:BasicGridEnvironment, assignment_approach:str="hungarian"):
+        if assignment_approach not in VALID_ASSIGNMENT_APPROACHES:
+            raise Exception(f"Assignment approach \"{assignment_approach}\" is invalid: should be one of {VALID_ASSIGNMENT_APPROACHES}")
+        self.environment = environment
+        self.assignment_approach = assignment_approach
+        self.distance_field_cache = DistanceFieldCache(environment)
+        self.unreachable_cost = environment.grid.size + 1
+
+        self.agent_positions = None
+        self.task_positions = None
+        self.cost_matrix = None
+        self.assignment = None
+        self.prices = None
+
+    #================================================
+    def get_cost_columns(self, task_positions:list[tuple[int, int]]) -> np.ndarray:
+        agent_positions = np.asarray(self.agent_positions, dtype=np.int64).reshape(-1, 2)
+        cost_columns = np.empty((len(agent_positions), len(task_positions)), dtype=np.int64)
+        for j, distance_field in enumerate(self.distance_field_cache.get(task_positions)):
+            cost_columns[:, j] = distance_field[agent_positions[:, 0], agent_positions[:, 1]]
+        cost_columns[cost_columns < 0] = self.unreachable_cost
+        return cost_columns
+
+    def solve(self) -> list[int]:
+        if self.assignment_approach == "hungarian" or self.cost_matrix.shape[0] > self.cost_matrix.shape[1]:
+            # NOTE: The auction solver expects no more agents than tasks, so the Hungarian solver handles the other case
+            self.assignment = hungarian_assignment(self.cost_matrix)
+            self.prices = None
+        else:
+            self.assignment, self.prices = auction_assignment(self.cost_matrix, self.prices, self.assignment)
+
+        assignment = self.assignment.copy()
+        is_assigned = assignment >= 0
+        is_unreachable = np.zeros(len(assignment), dtype=bool)
+        is_unreachable[is_assigned] = self.cost_matrix[np.flatnonzero(is_assigned), assignment[is_assigned]] >= self.unreachable_cost
+        assignment[is_unreachable] = -1
+        return [int(j) for j in assignment]
+
+    #================================================
+    def assign(self, agent_positions:list[tuple[int, int]], task_positions:list[tuple[int, int]]) -> list[int]:
+        '''
+        Assigns tasks to agents from scratch.
+
+        ---
+
+        PARAMETERS:
+        - `agent_positions` (list[tuple[int, int]]): Current agent positions
+        - `task_positions` (list[tuple[int, int]]): Task (goal) positions
+
+        RETURNS:
+        - (list[int]): Task index assigned to each agent (-1 if none)
+        '''
+
+        self.agent_positions = [tuple(position) for position in agent_positions]
+        self.task_positions = [tuple(position) for position in task_positions]
+        self.cost_matrix = self.get_cost_columns(self.task_positions)
+        self.assignment, self.prices = None, None
+        return self.solve()
+
+    def update_tasks(self, task_indices:list[int], task_positions:list[tuple[int, int]]) -> list[int]:
+        '''
+        Changes a few tasks and re-solves the assignment incrementally; only
+        the cost matrix columns of the changed tasks are recomputed.
+
+        ---
+
+        PARAMETERS:
+        - `task_indices` (list[int]): Indices of the changed tasks
+        - `task_positions` (list[tuple[int, int]]): New positions of the changed tasks
+
+        RETURNS:
+        - (list[int]): Task index assigned to each agent (-1 if none)
+        '''
+
+        if self.cost_matrix is None:
+            raise Exception("No assignment to update; call `.assign` first")
+        for j, task_position in zip(task_indices, task_positions):
+            self.task_positions[j] = tuple(task_position)
+        self.cost_matrix[:, task_indices] = self.get_cost_columns([tuple(task_position) for task_position in task_positions])
+        return self.solve()
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+    environment = BasicGridEnvironment(10, 50, prng_seed=3)
+    environment.generate_random_grid()
+    free_space_positions = [tuple(position) for position in get_free_space_positions(environment.free_space_symbol, environment.grid)]
+    prng = np.random.RandomState(seed=5)
+    chosen_indices = prng.choice(len(free_space_positions), size=200, replace=False)
+    agent_positions = [free_space_positions[k] for k in chosen_indices[:100]]
+    task_positions = [free_space_positions[k] for k in chosen_indices[100:]]
+    changed_task_indices = [0, 1, 2]
+    new_task_positions = [free_space_positions[k] for k in prng.choice(len(free_space_positions), size=3, replace=False)]
+
+    for assignment_approach in VALID_ASSIGNMENT_APPROACHES:
+        task_assigner = TaskAssigner(environment, assignment_approach)
+        start_time = perf_counter()
+        assignment = task_assigner.assign(agent_positions, task_positions)
+        total_cost = task_assigner.cost_matrix[np.arange(len(assignment)), assignment].sum()
+        print(f"{assignment_approach.upper()}: total distance = {total_cost} ({perf_counter() - start_time:.3f} s, distance fields included)")
+
+        start_time = perf_counter()
+        assignment = task_assigner.update_tasks(changed_task_indices, new_task_positions)
+        total_cost = task_assigner.cost_matrix[np.arange(len(assignment)), assignment].sum()
+        print(f"{assignment_approach.upper()}: total distance after changing 3 tasks = {total_cost} ({perf_counter() - start_time:.3f} s)")
+
+    random_cost = task_assigner.cost_matrix[np.arange(len(agent_positions)), prng.permutation(len(task_positions))].sum()
+    print(f"RANDOM: total distance = {random_cost}")
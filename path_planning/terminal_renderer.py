@@ -0,0 +1,212 @@
+from sys import stdout
+from time import perf_counter, sleep
+from helpers import *
+
+#================================================
+# ANSI ESCAPE CODES FOR THE TERMINAL
+
+CLEAR_SCREEN = "\033[2J"
+CLEAR_TO_END_OF_SCREEN = "\033[J"
+HIDE_CURSOR = "\033[?25l"
+SHOW_CURSOR = "\033[?25h"
+
+def move_cursor(line:int, column:int) -> str:
+    # NOTE: Lines and columns of the terminal are counted from 1, from the top left
+    return f"\033[{line};{column}H"
+
+#================================================
+# MAIN: Diff-based terminal renderer
+
+class TerminalRenderer:
+    '''
+    Renders grid frames (as shown by `display_grid_as_text`) to the
+    terminal in place: the 1st frame is drawn in full, and each later
+    frame only redraws the cells that changed since the previous one,
+    by moving the cursor to them. Each frame is written as 1 string.
+
+    ---
+
+    PARAMETERS:
+    - `color_map` (dict, optional): Color (ANSI escape code) of each symbol; other symbols are yellow
+    - `max_frame_rate` (float, optional): Maximum number of frames per second
+    - `do_skip_frames` (bool, optional): Whether frames given too soon are skipped (e.g. to keep up with a fast simulation) or waited for
+    - `stream` (file, optional): Text stream written to; defaults to `sys.stdout`
+
+    ---
+
+    NOTE ON BANDWIDTH:
+    A colored cell takes about 12 bytes, so a full 200 x 200 frame is
+    about 480 KB, which is too much to send over SSH several times a
+    second. Agents only change a few cells per time step, so each diff
+    frame is usually a few KB (cursor moves included), whatever the grid
+    size. Runs of changed cells along a row share 1 cursor move, and no
+    external process (e.g. `clear`) is spawned per frame.
+    '''
+
+    def __init__(self, color_map:dict={}, max_frame_rate:float=30, do_skip_frames:bool=False, stream=None):
+        self.color_map = color_map
+        self.max_frame_rate = max_frame_rate
+        self.do_skip_frames = do_skip_frames
+        self.stream = stdout if stream is None else stream
+        self.cell_strings = {}
+        # NOTE: Keys: Symbols; Items: Their colored strings (as in `get_grid_as_text`)
+        self.previous_frame = None
+        self.header_text = None
+        self.grid_line = 1
+        # NOTE: Terminal line of the top row of the grid (below the header)
+        self.last_render_time = -np.inf
+        self.counters = {"num_frames": 0, "num_full_frames": 0, "num_skipped_frames": 0, "num_changed_cells": 0, "num_characters": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    def reset(self):
+        '''Makes the next frame be drawn in full (e.g. after something else was printed).'''
+
+        self.previous_frame = None
+
+    def get_cell_string(self, symbol) -> str:
+        try:
+            return self.cell_strings[symbol]
+        except KeyError:
+            self.cell_strings[symbol] = f"{self.color_map.get(symbol, COLORS["yellow"])}{symbol}{COLORS["reset"]} "
+            return self.cell_strings[symbol]
+
+    #================================================
+    def get_full_frame_text(self, frame:np.ndarray, header_text:str) -> str:
+        self.grid_line = header_text.count("\n") + 1
+        return HIDE_CURSOR + CLEAR_SCREEN + move_cursor(1, 1) + header_text + get_grid_as_text(frame, self.color_map)
+
+    def get_diff_frame_text(self, frame:np.ndarray) -> str:
+        # Changed cells in display order (rows backwards), as flat indices:
+        num_rows, num_columns = frame.shape
+        changed_lines, changed_columns = np.nonzero((frame != self.previous_frame)[::-1])
+        self.counters["num_changed_cells"] += len(changed_lines)
+        if len(changed_lines) == 0:
+            return ""
+        flat_indices = changed_lines * num_columns + changed_columns
+        # Splitting into runs of consecutive cells along a line:
+        run_starts = np.flatnonzero(np.diff(flat_indices, prepend=-2) != 1)
+        run_ends = np.append(run_starts[1:], len(flat_indices))
+        symbols = frame[num_rows - 1 - changed_lines, changed_columns].tolist()
+        parts = []
+        for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+            # NOTE: A run may wrap to the next line (from the last column to the 1st), where the cursor is moved again
+            line, column = int(changed_lines[start]), int(changed_columns[start])
+            parts.append(move_cursor(self.grid_line + line, 2 * column + 1))
+            for k in range(start, end):
+                if k > start and changed_columns[k] == 0:
+                    parts.append(move_cursor(self.grid_line + int(changed_lines[k]), 1))
+                parts.append(self.get_cell_string(symbols[k]))
+        return "".join(parts)
+
+    def render(self, frame:np.ndarray, header_text:str="", status_text:str="") -> bool:
+        '''
+        Renders a frame (capped at `max_frame_rate`).
+
+        ---
+
+        PARAMETERS:
+        - `frame` (np.ndarray): Grid to be shown (e.g. with agent symbols drawn on it)
+        - `header_text` (str, optional): Text shown above the grid; the frame is drawn in full whenever it changes
+        - `status_text` (str, optional): Text shown below the grid (e.g. the elapsed time); redrawn every frame
+
+        RETURNS:
+        - (bool): Was the frame rendered or not (skipped)
+        '''
+
+        # Capping the frame rate:
+        waiting_time = self.last_render_time + 1 / self.max_frame_rate - perf_counter()
+        if waiting_time > 0:
+            if self.do_skip_frames:
+                self.counters["num_skipped_frames"] += 1
+                return False
+            sleep(waiting_time)
+
+        frame = np.asarray(frame)
+        if header_text != "" and not header_text.endswith("\n"):
+            header_text += "\n"
+        if self.previous_frame is None or self.previous_frame.shape != frame.shape or header_text != self.header_text:
+            text = self.get_full_frame_text(frame, header_text)
+            self.counters["num_full_frames"] += 1
+            self.previous_frame = frame.copy()
+            self.header_text = header_text
+        else:
+            text = self.get_diff_frame_text(frame)
+            np.copyto(self.previous_frame, frame)
+        text += move_cursor(self.grid_line + frame.shape[0], 1) + CLEAR_TO_END_OF_SCREEN + status_text
+
+        self.stream.write(text)
+        self.stream.flush()
+        self.last_render_time = perf_counter()
+        self.counters["num_frames"] += 1
+        self.counters["num_characters"] += len(text)
+        return True
+
+    def close(self):
+        '''Shows the cursor again, and moves it below the last frame.'''
+
+        self.stream.write(SHOW_CURSOR + "\n")
+        self.stream.flush()
+        self.reset()
+
+    def get_report(self) -> dict:
+        '''Gets the counters ("num_frames", "num_full_frames", "num_skipped_frames", "num_changed_cells", "num_characters"), plus "num_characters_per_frame".'''
+
+        return dict(self.counters, num_characters_per_frame=self.counters["num_characters"] / max(self.counters["num_frames"], 1))
+
+#############################################################
+# BENCHMARKING
+#############################################################
+
+if __name__ == "__main__":
+    from io import StringIO
+    from plan_timeline import PlanTimeline
+
+    # 200 x 200 grid with many moving agents: full redraws vs. diffs
+    environment = BasicGridEnvironment(100, 200, prng_seed=3)
+    environment.generate_random_grid(p=0.01)
+    color_map = {environment.free_space_symbol: COLORS["blue"], environment.permanent_obstacle_symbol: COLORS["red"], 'A': COLORS["green"]}
+    free_space_positions = np.array(get_free_space_positions(environment.free_space_symbol, environment.grid))
+    prng = np.random.RandomState(seed=0)
+    num_agents, num_time_stamps = 200, 100
+    # Random walks (not collision-free; only the number of changed cells matters here):
+    start_positions = free_space_positions[prng.choice(len(free_space_positions), size=num_agents, replace=False)]
+    moves = np.array([(1, 0), (0, -1), (-1, 0), (0, 1)])[prng.randint(4, size=(num_time_stamps, num_agents))]
+    positions = np.clip(start_positions[None] + np.cumsum(moves, axis=0), 0, 199)
+    timeline = PlanTimeline([positions[:, i].tolist() for i in range(num_agents)])
+    agent_symbols = np.full(num_agents, 'A')
+
+    frames = [timeline.draw_frame(t, environment.grid, agent_symbols) for t in range(num_time_stamps)]
+    full_stream, diff_stream = StringIO(), StringIO()
+    start_time = perf_counter()
+    for frame in frames:
+        full_stream.write(CLEAR_SCREEN + move_cursor(1, 1) + get_grid_as_text(frame, color_map))
+    full_time = perf_counter() - start_time
+    renderer = TerminalRenderer(color_map, max_frame_rate=np.inf, stream=diff_stream)
+    start_time = perf_counter()
+    for t, frame in enumerate(frames):
+        renderer.render(frame, "RUNNING THE SIMULATION\n", f"Time stamp: {t}")
+    diff_time = perf_counter() - start_time
+
+    # Replaying the diff stream on a simple virtual terminal must give the last frame:
+    import re
+    screen = {}
+    line, column = 1, 1
+    for match in re.finditer(r"\033\[(\d+);(\d+)H|\033\[[^H]*?[a-zA-Z]|(\n)|(.)", diff_stream.getvalue(), re.DOTALL):
+        if match.group(1):
+            line, column = int(match.group(1)), int(match.group(2))
+        elif match.group(3):
+            line, column = line + 1, 1
+        elif match.group(4):
+            screen[line, column] = match.group(4)
+            column += 1
+    shown_grid = np.array([[screen[renderer.grid_line + k, 2 * j + 1] for j in range(200)] for k in range(200)])[::-1]
+    assert np.array_equal(shown_grid, frames[-1])
+
+    print(f"200 x 200 grid, {num_agents} agents, {num_time_stamps} frames")
+    print(f"Full redraws: {full_time * 1e3 / num_time_stamps:.2f} ms, {len(full_stream.getvalue()) / num_time_stamps / 1e3:.1f} K characters per frame")
+    print(f"Diffs: {diff_time * 1e3 / num_time_stamps:.2f} ms, {renderer.get_report()["num_characters_per_frame"] / 1e3:.1f} K characters per frame")
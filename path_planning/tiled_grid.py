@@ -0,0 +1,275 @@
+import numpy as np
+
+#================================================
+# MAIN: Tiled grid
+
+class TiledGrid:
+    '''
+    Sparse 2D grid stored as fixed-size square tiles, for huge layouts
+    that are mostly free space (e.g. yards). Tiles that hold only the
+    fill symbol are not allocated: they all share one read-only tile,
+    and a tile is only allocated (copied from the shared one) when one of
+    its cells is first set to something else.
+
+    Supports the subset of the `np.ndarray` interface used on `.grid`
+    across this repository: `.shape`, `.ndim`, `.dtype`, `.size`,
+    `.copy()`, cell indexing (`grid[r, c]`, with negative indices as in
+    NumPy and `IndexError` out of bounds), slicing (`grid[i_1:i_2,
+    j_1:j_2]` gives a dense `np.ndarray`, as needed by
+    `spatial_querying`'s `query_obstacles`), assignment to cells and
+    slices, and conversion to a dense array (so `np.isin(grid, ...)`,
+    `grid == symbol` and the like work on grids that fit in memory).
+
+    ---
+
+    PARAMETERS:
+    - `shape` (tuple[int, int]): Number of rows and number of columns
+    - `fill_symbol` (Any): Symbol of all cells not set otherwise (normally the free space symbol)
+    - `tile_size` (int, optional): Side length of a tile in cells; rounded up to a power of 2
+    - `dtype` (optional): Data type of the cells
+
+    ---
+
+    NOTE ON HOT LOOPS:
+    Cell reads cost a few Python operations more than on a dense array:
+    the tile is found with bit shifts (the tile size being a power of 2)
+    and a dictionary lookup, and the last tile read is cached, so reading
+    the neighbours of a cell (which mostly fall in the same tile, even
+    next to tile boundaries) seldom needs the dictionary at all. In the
+    benchmark below, `get_open_neighbours` takes about twice as long as
+    on a dense array, and an `a_star` query about 35% to 75% longer
+    depending on the machine (e.g. 10.6 against 8.1 ms, and 13.1 against
+    7.5 ms).
+
+    NOTE ON DENSE CALLERS:
+    Only cell reads, slices and writes stay sparse. The following convert
+    the whole grid to a dense array (or build other grid-sized arrays),
+    so they still need memory proportional to the full map, and cannot
+    be used on maps that only fit in memory as tiles:
+    - `get_distance_fields` and hence `DistanceFieldCache`, which `a_star_across_time` uses past the reservation horizon
+    - `get_free_space_positions`, whose result lists every free cell anyway
+    - The structures built with `np.isin` over the grid: `CompressedPathDatabase`, `ContractionHierarchy`, `CorridorGraph`, `LandmarkHeuristic`, `OccupancyQuadtree` and `ScenarioGenerator`
+    Spatial searches (`a_star`, `a_star_with_headings` and
+    `bidirectional_a_star`) only read the cells they visit.
+    '''
+
+    def __init__(self, shape:tuple[int, int], fill_symbol, tile_size:int=64, dtype="<U1"):
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.ndim = 2
+        self.size = self.shape[0] * self.shape[1]
+        self.fill_symbol = fill_symbol
+        self.tile_shift = max(int(tile_size - 1).bit_length(), 0)
+        self.tile_size = 1 << self.tile_shift
+        self.tile_mask = self.tile_size - 1
+        self.fill_tile = np.full((self.tile_size, self.tile_size), fill_symbol, dtype=dtype)
+        self.fill_tile.flags.writeable = False
+        self.dtype = self.fill_tile.dtype
+        self.tiles = {}
+        # NOTE: Keys: (tile row index, tile column index); Items: Allocated tiles (tiles not in here hold only `fill_symbol`)
+        self.last_tile_key, self.last_tile = None, self.fill_tile
+
+    @classmethod
+    def from_array(cls, array:np.ndarray, fill_symbol, tile_size:int=64):
+        '''Builds a tiled grid from a dense array, allocating only the tiles with cells other than `fill_symbol`.'''
+
+        tiled_grid = cls(array.shape, fill_symbol, tile_size, array.dtype)
+        tiled_grid[:, :] = array
+        tiled_grid.compact()
+        return tiled_grid
+
+    #------------------------------------
+    # Cell access:
+
+    def normalise_index(self, index:int, axis:int) -> int:
+        if index < 0:
+            index += self.shape[axis]
+        if index < 0 or index >= self.shape[axis]:
+            raise IndexError(f"Index {index} is out of bounds for axis {axis} with size {self.shape[axis]}")
+        return index
+
+    def get_cell(self, r:int, c:int):
+        tile_key = (r >> self.tile_shift, c >> self.tile_shift)
+        if tile_key != self.last_tile_key:
+            self.last_tile_key, self.last_tile = tile_key, self.tiles.get(tile_key, self.fill_tile)
+        return self.last_tile[r & self.tile_mask, c & self.tile_mask]
+
+    def get_writeable_tile(self, tile_key:tuple[int, int]) -> np.ndarray:
+        tile = self.tiles.get(tile_key, None)
+        if tile is None:
+            tile = self.tiles[tile_key] = self.fill_tile.copy()
+            if tile_key == self.last_tile_key:
+                self.last_tile = tile
+        return tile
+
+    #------------------------------------
+    # Slice access:
+
+    def get_ranges(self, key) -> tuple[tuple[int, int], tuple[int, int], bool, bool]:
+        # Converts an index (of ints and step-1 slices) to row and column ranges, and whether each axis is dropped:
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        ranges, is_dropped = [], []
+        for axis, index in enumerate(key):
+            if isinstance(index, slice):
+                start, stop, step = index.indices(self.shape[axis])
+                if step != 1:
+                    raise IndexError("Only slices with a step of 1 are supported")
+                ranges.append((start, max(start, stop)))
+                is_dropped.append(False)
+            else:
+                index = self.normalise_index(int(index), axis)
+                ranges.append((index, index + 1))
+                is_dropped.append(True)
+        return ranges[0], ranges[1], is_dropped[0], is_dropped[1]
+
+    def get_tile_blocks(self, row_range:tuple[int, int], column_range:tuple[int, int]):
+        # Yields (tile key, slices within the tile, slices within the requested block) for all tiles overlapping the block:
+        if row_range[1] <= row_range[0] or column_range[1] <= column_range[0]:
+            return
+        for tile_row in range(row_range[0] >> self.tile_shift, ((row_range[1] - 1) >> self.tile_shift) + 1):
+            tile_r = tile_row << self.tile_shift
+            r_1, r_2 = max(row_range[0], tile_r), min(row_range[1], tile_r + self.tile_size)
+            for tile_column in range(column_range[0] >> self.tile_shift, ((column_range[1] - 1) >> self.tile_shift) + 1):
+                tile_c = tile_column << self.tile_shift
+                c_1, c_2 = max(column_range[0], tile_c), min(column_range[1], tile_c + self.tile_size)
+                yield (tile_row, tile_column), (slice(r_1 - tile_r, r_2 - tile_r), slice(c_1 - tile_c, c_2 - tile_c)), (slice(r_1 - row_range[0], r_2 - row_range[0]), slice(c_1 - column_range[0], c_2 - column_range[0]))
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple) and len(key) == 2 and not isinstance(key[0], slice) and not isinstance(key[1], slice):
+            r, c = key
+            if r < 0 or r >= self.shape[0]:
+                r = self.normalise_index(r, 0)
+            if c < 0 or c >= self.shape[1]:
+                c = self.normalise_index(c, 1)
+            # NOTE: Same as `get_cell`, inlined since this is the hot path
+            tile_shift = self.tile_shift
+            tile_key = (r >> tile_shift, c >> tile_shift)
+            if tile_key != self.last_tile_key:
+                self.last_tile_key, self.last_tile = tile_key, self.tiles.get(tile_key, self.fill_tile)
+            return self.last_tile[r & self.tile_mask, c & self.tile_mask]
+
+        row_range, column_range, is_row_dropped, is_column_dropped = self.get_ranges(key)
+        block = np.empty((row_range[1] - row_range[0], column_range[1] - column_range[0]), dtype=self.dtype)
+        for tile_key, tile_slices, block_slices in self.get_tile_blocks(row_range, column_range):
+            block[block_slices] = self.tiles.get(tile_key, self.fill_tile)[tile_slices]
+        if is_row_dropped:
+            block = block[0]
+        if is_column_dropped:
+            block = block[..., 0]
+        return block
+
+    def __setitem__(self, key, value):
+        if isinstance(key, tuple) and len(key) == 2 and not isinstance(key[0], slice) and not isinstance(key[1], slice):
+            r, c = self.normalise_index(int(key[0]), 0), self.normalise_index(int(key[1]), 1)
+            tile_key = (r >> self.tile_shift, c >> self.tile_shift)
+            if tile_key in self.tiles or value != self.fill_symbol:
+                self.get_writeable_tile(tile_key)[r & self.tile_mask, c & self.tile_mask] = value
+            return
+
+        row_range, column_range, is_row_dropped, is_column_dropped = self.get_ranges(key)
+        # Broadcasting the value to the indexed block (as NumPy does, with integer-indexed axes dropped):
+        block_shape = (row_range[1] - row_range[0], column_range[1] - column_range[0])
+        indexed_shape = tuple(n for n, is_dropped in zip(block_shape, (is_row_dropped, is_column_dropped)) if not is_dropped)
+        value = np.broadcast_to(np.asarray(value, dtype=self.dtype), indexed_shape).reshape(block_shape)
+        is_uniform_fill = value.size > 0 and value.flat[0] == self.fill_symbol and np.all(value == self.fill_symbol)
+        for tile_key, tile_slices, block_slices in self.get_tile_blocks(row_range, column_range):
+            if is_uniform_fill and not (tile_key in self.tiles):
+                continue
+            self.get_writeable_tile(tile_key)[tile_slices] = value[block_slices]
+
+    #------------------------------------
+    # Whole-grid operations:
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[:, :]
+        return array if dtype is None else array.astype(dtype)
+
+    def __eq__(self, other):
+        return np.asarray(self) == other
+
+    def __ne__(self, other):
+        return np.asarray(self) != other
+
+    def copy(self):
+        '''Copies the grid; allocated tiles are copied, the shared fill tile stays shared.'''
+
+        tiled_grid = TiledGrid(self.shape, self.fill_symbol, self.tile_size, self.dtype)
+        tiled_grid.tiles = {tile_key: tile.copy() for tile_key, tile in self.tiles.items()}
+        return tiled_grid
+
+    def compact(self):
+        '''Frees the allocated tiles that hold only the fill symbol again.'''
+
+        for tile_key in [tile_key for tile_key, tile in self.tiles.items() if np.all(tile == self.fill_symbol)]:
+            del self.tiles[tile_key]
+        self.last_tile_key, self.last_tile = None, self.fill_tile
+
+    def get_report(self) -> dict:
+        '''Gets the memory use of the grid, as a dict with the keys "num_tiles", "num_allocated_tiles", "num_bytes" and "dense_num_bytes".'''
+
+        num_tiles = (-(-self.shape[0] // self.tile_size)) * (-(-self.shape[1] // self.tile_size))
+        return {
+            "num_tiles": num_tiles,
+            "num_allocated_tiles": len(self.tiles),
+            "num_bytes": (len(self.tiles) + 1) * self.fill_tile.nbytes,
+            "dense_num_bytes": self.size * self.dtype.itemsize
+        }
+
+#############################################################
+# TESTING
+#############################################################
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from basic_grid_environment import BasicGridEnvironment
+    from helpers import get_open_neighbours
+    from algorithm_a_star import a_star
+    from agent import Agent
+
+    # Consistency with a dense grid (cell and slice reads and writes, also across tile boundaries):
+    prng = np.random.RandomState(seed=0)
+    dense_grid = np.full((150, 230), '.')
+    tiled_grid = TiledGrid(dense_grid.shape, '.', tile_size=32)
+    for _ in range(200):
+        r, c = prng.randint(150), prng.randint(230)
+        dense_grid[r, c] = tiled_grid[r, c] = '#'
+        i_1, j_1 = prng.randint(150), prng.randint(230)
+        i_2, j_2 = i_1 + prng.randint(40), j_1 + prng.randint(40)
+        dense_grid[i_1:i_2, j_1:j_2] = tiled_grid[i_1:i_2, j_1:j_2] = prng.choice(['.', '#', '+'])
+    dense_grid[5, :] = tiled_grid[5, :] = '+'
+    dense_grid[:, -3] = tiled_grid[:, -3] = '.'
+    assert np.array_equal(np.asarray(tiled_grid), dense_grid) and np.array_equal(tiled_grid[20:100, 31:97], dense_grid[20:100, 31:97])
+    assert tiled_grid[-1, -1] == dense_grid[-1, -1] and np.array_equal(tiled_grid[7], dense_grid[7]) and np.array_equal(tiled_grid[:, 64], dense_grid[:, 64])
+    print("Consistent with a dense grid")
+
+    # Memory of a huge, mostly empty yard (50k x 50k cells) with a few buildings:
+    yard = TiledGrid((50000, 50000), '.', tile_size=64)
+    for _ in range(200):
+        r, c = prng.randint(0, 49900), prng.randint(0, 49900)
+        yard[r:r + prng.randint(10, 100), c:c + prng.randint(10, 100)] = '#'
+    report = yard.get_report()
+    print(f"50k x 50k yard: {report['num_allocated_tiles']} of {report['num_tiles']} tiles allocated, {report['num_bytes'] / 2 ** 20:.1f} MiB (dense: {report['dense_num_bytes'] / 2 ** 30:.1f} GiB)")
+    print(f"Obstacles in yard[1000:1200, 1000:1200]: {int(np.count_nonzero(yard[1000:1200, 1000:1200] == '#'))}")
+
+    # Hot loop cost (neighbour reads and A*) against a dense grid:
+    environment = BasicGridEnvironment(10, 200, prng_seed=3)
+    environment.generate_random_grid(p=0.01)
+    tiled_environment = BasicGridEnvironment(10, 200, prng_seed=3, grid_backend="tiled")
+    tiled_environment.generate_random_grid(p=0.01)
+    assert np.array_equal(np.asarray(tiled_environment.grid), environment.grid)
+    agent = Agent(200, 200)
+    cells = [tuple(cell) for cell in prng.randint(0, 200, size=(20000, 2))]
+    free_space_positions = np.argwhere(environment.grid == '.')
+    queries = [(tuple(free_space_positions[prng.randint(len(free_space_positions))]), tuple(free_space_positions[prng.randint(len(free_space_positions))])) for _ in range(5)]
+    for name, grid_environment in [("dense", environment), ("tiled", tiled_environment)]:
+        # Best of several repetitions (the 1st of which also warms up caches):
+        neighbour_time, a_star_time = np.inf, np.inf
+        for _ in range(5):
+            start_time = perf_counter()
+            for cell in cells:
+                get_open_neighbours(cell, ['#', '+'], grid_environment.grid)
+            neighbour_time = min(neighbour_time, (perf_counter() - start_time) / len(cells))
+            start_time = perf_counter()
+            paths = [a_star(end_position, start_position, agent, grid_environment) for start_position, end_position in queries]
+            a_star_time = min(a_star_time, (perf_counter() - start_time) / len(queries))
+        print(f"{name}: {neighbour_time * 1e6:.2f} us per get_open_neighbours call, {a_star_time * 1e3:.1f} ms per a_star query")